@@ -1,73 +1,257 @@
 # EarthQuake_detection_fixed.py
-import pandas as pd
-import joblib, json
+import joblib, json, io, os, sys, time
 import numpy as np
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import RandomizedSearchCV, train_test_split
 from sklearn.pipeline import Pipeline
 from sklearn.compose import ColumnTransformer
 from sklearn.impute import SimpleImputer
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
+from sklearn.preprocessing import StandardScaler, OneHotEncoder, OrdinalEncoder, FunctionTransformer
 from sklearn.ensemble import HistGradientBoostingClassifier
 from sklearn.metrics import classification_report, accuracy_score
+from threadpoolctl import threadpool_limits
 
-# ---- Load and basic clean ----
-df = pd.read_csv("Earthquake_1995-2023.csv", low_memory=False)
-# normalize column names
-df.columns = [c.strip().replace(" ", "_") for c in df.columns]
+from artifacts import dump_shared, shared_path, write_manifest
+from data_prep import load_clean
+from drift import build_reference, reference_path, save_reference
+from earthquake_features import compact_features, compact_column_groups, N_HASH_BUCKETS
+from geo_index import NEIGHBOUR_COLS, EventIndex, NeighbourFeatures
+from timing import PhaseTimer
 
-# Fill categorical NaNs for common cols (if present)
-for col in ("alert", "continent", "country"):
-    if col in df.columns:
-        df[col] = df[col].fillna(df[col].mode().iloc[0])
+DATA_PATH = "earthquake_1995-2023.csv"     # change if different
+MODEL_PATH = "Earthquake_model.pkl"
+FEATURE_PATH = "feature_order_earthquake.json"
+TARGET = "tsunami"
 
-# Fill numeric NaNs with median
-num_cols_all = df.select_dtypes(include=[np.number]).columns.tolist()
-for c in num_cols_all:
-    df[c] = df[c].fillna(df[c].median())
+# Cleaning (data_prep.load_clean) and hold-out split; generate_report.py reuses both so it
+# evaluates on exactly the rows training held out.
+PREP_PARAMS = {"mode_cols": ("alert", "continent", "country")}
+SPLIT_PARAMS = {"test_size": 0.2, "random_state": 42}
 
-# ---- Target & features ----
-target = "tsunami"
-if target not in df.columns:
-    raise ValueError(f"Target column '{target}' not found in CSV. Columns: {df.columns.tolist()}")
+# --neighbours: k nearest training events (haversine) summarised as extra numeric features
+NEIGHBOURS_K = int(os.environ.get("EQ_NEIGHBOURS_K", "10"))
 
-X = df.drop(columns=[target])
-y = df[target].astype(int)
+# Drift reference (drift.py): quantile bins for the unbounded numerics, heavy hitters for the
+# low-cardinality categoricals the API's /drift endpoint reports on.
+DRIFT_QUANTILE_COLS = ["magnitude", "depth", "sig"]
+DRIFT_CATEGORICAL_COLS = ["alert", "net", "magType", "continent", "country"]
 
-# ---- Train/test split ----
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.2, stratify=y, random_state=42
-)
+# Candidate boosters for --search (same step name "clf" in the one-hot and compact pipelines).
+SEARCH_SPACE = {
+    "clf__learning_rate": [0.05, 0.1, 0.2],
+    "clf__max_iter": [150, 300, 500],
+    "clf__max_leaf_nodes": [15, 31, 63],
+    "clf__l2_regularization": [0.0, 0.1, 1.0],
+}
 
-# ---- Column lists ----
-num_cols = X_train.select_dtypes(include=[np.number]).columns.tolist()
-cat_cols = X_train.select_dtypes(exclude=[np.number]).columns.tolist()
 
-# ---- Preprocessing pipeline ----
-num_pipe = Pipeline([("imputer", SimpleImputer(strategy="median")), ("scaler", StandardScaler())])
-cat_pipe = Pipeline([
-    ("imputer", SimpleImputer(strategy="most_frequent")),
-    ("ohe", OneHotEncoder(handle_unknown="ignore", sparse_output=False))
-])
+def neighbour_steps(enabled):
+    """Leading pipeline step(s) for --neighbours (a fresh transformer per pipeline)."""
+    return [("neighbours", NeighbourFeatures(k=NEIGHBOURS_K))] if enabled else []
 
 
-preproc = ColumnTransformer([("num", num_pipe, num_cols), ("cat", cat_pipe, cat_cols)], remainder="drop")
+# ---- Compact variant (optional) ----
+def profile(pipe, X_eval, y_eval, repeats=50):
+    """Feature width, pickled size, single-row / batch latency and accuracy for a fitted pipeline."""
+    buf = io.BytesIO()
+    joblib.dump(pipe, buf)
+    width = pipe[:-1].transform(X_eval.iloc[:1]).shape[1]
 
-# ---- Model pipeline ----
-clf = HistGradientBoostingClassifier(max_iter=300, random_state=42)
-pipeline = Pipeline([("preproc", preproc), ("clf", clf)])
+    one = X_eval.iloc[:1]
+    pipe.predict(one)  # warm-up
+    single = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        pipe.predict(one)
+        single.append(time.perf_counter() - t0)
 
-# ---- Fit ----
-pipeline.fit(X_train, y_train)
+    t0 = time.perf_counter()
+    preds = pipe.predict(X_eval)
+    batch_s = time.perf_counter() - t0
 
-# ---- Evaluate ----
-y_pred = pipeline.predict(X_test)
-print("Accuracy:", accuracy_score(y_test, y_pred))
-print(classification_report(y_test, y_pred))
+    return {
+        "feature_width": int(width),
+        "artifact_bytes": len(buf.getvalue()),
+        "single_row_ms_p50": float(np.median(single) * 1000),
+        "batch_us_per_row": batch_s / len(X_eval) * 1e6,
+        "accuracy": float(accuracy_score(y_eval, preds)),
+    }
 
-# ---- Save artifact (pipeline + feature order) ----
-artifact = {"model": pipeline, "feature_order": X.columns.tolist(), "num_cols": num_cols, "cat_cols": cat_cols}
-joblib.dump(artifact, "Earthquake_model.pkl")
-with open("feature_order_earthquake.json", "w") as f:
-    json.dump(X.columns.tolist(), f)
 
-print("Saved Earthquake_model.pkl and feature_order_earthquake.json")
+def load_holdout(data_path=DATA_PATH):
+    """(X_test, y_test): the rows train_earthquake evaluates on, cleaned the same way."""
+    df, _ = load_clean(data_path, **PREP_PARAMS)
+    X = df.drop(columns=[TARGET])
+    y = df[TARGET].astype(int)
+    _, X_test, _, y_test = train_test_split(X, y, stratify=y, **SPLIT_PARAMS)
+    return X_test, y_test
+
+
+def train_earthquake(data_path=DATA_PATH, n_jobs=-1, search=False, cv=3, n_iter=8,
+                     compact=False, shared_artifact=False, neighbours=False):
+    """Train, evaluate and save the earthquake model; returns metrics and per-phase timings.
+
+    n_jobs is the CPU budget for this run: the OpenMP threads of a plain fit (via
+    threadpoolctl), or the number of parallel CV fits with search=True. compact trains the
+    compact-feature pipeline as the artifact (see --compact below); shared_artifact also
+    writes the uncompressed mmap-able copy; neighbours prepends the NeighbourFeatures step.
+    The artifact always carries a geo_index over the whole catalogue for the API.
+    """
+    timer = PhaseTimer()
+    threads = None if n_jobs in (None, -1) else n_jobs
+
+    # ---- Load and basic clean (data_prep.py, cached on disk) ----
+    # mode-fill the common categoricals, median-fill every numeric column
+    with timer.phase("load"):
+        df, prep = load_clean(data_path, **PREP_PARAMS)
+    print(f"Loaded {len(df):,} rows in {prep['seconds']:.2f}s (prep cache: {prep['cache']})")
+
+    with timer.phase("preprocess"):
+        # ---- Target & features ----
+        if TARGET not in df.columns:
+            raise ValueError(f"Target column '{TARGET}' not found in CSV. Columns: {df.columns.tolist()}")
+
+        X = df.drop(columns=[TARGET])
+        y = df[TARGET].astype(int)
+
+        # ---- Train/test split ----
+        X_train, X_test, y_train, y_test = train_test_split(X, y, stratify=y, **SPLIT_PARAMS)
+
+        # ---- Column lists ----
+        num_cols = X_train.select_dtypes(include=[np.number]).columns.tolist()
+        cat_cols = X_train.select_dtypes(exclude=[np.number]).columns.tolist()
+        # neighbour stats are appended by the first pipeline step, so list them as numeric
+        extra_cols = NEIGHBOUR_COLS if neighbours else []
+        num_cols += extra_cols
+
+        # ---- Spatial index over the full catalogue (served by /nearest_earthquakes) ----
+        geo_index = EventIndex.from_frame(df, TARGET)
+
+        # ---- Preprocessing pipeline ----
+        num_pipe = Pipeline([("imputer", SimpleImputer(strategy="median")), ("scaler", StandardScaler())])
+        cat_pipe = Pipeline([
+            ("imputer", SimpleImputer(strategy="most_frequent")),
+            ("ohe", OneHotEncoder(handle_unknown="ignore", sparse_output=False))
+        ])
+
+        preproc = ColumnTransformer([("num", num_pipe, num_cols), ("cat", cat_pipe, cat_cols)], remainder="drop")
+
+        # ---- Model pipeline ----
+        clf = HistGradientBoostingClassifier(max_iter=300, random_state=42)
+        pipeline = Pipeline(neighbour_steps(neighbours) + [("preproc", preproc), ("clf", clf)])
+
+        if compact:
+            c_num, c_cat, c_hash = compact_column_groups(X_train)
+            c_num += extra_cols
+            compact_preproc = ColumnTransformer([
+                ("cat", OrdinalEncoder(handle_unknown="use_encoded_value", unknown_value=np.nan,
+                                       encoded_missing_value=np.nan), c_cat),
+                ("hashed", "passthrough", c_hash),
+                ("num", "passthrough", c_num),
+            ], remainder="drop")
+            compact_clf = HistGradientBoostingClassifier(
+                max_iter=300, random_state=42,
+                categorical_features=list(range(len(c_cat) + len(c_hash))),
+            )
+            compact_pipeline = Pipeline(neighbour_steps(neighbours) + [
+                ("features", FunctionTransformer(compact_features, kw_args={
+                    "num_cols": c_num, "cat_cols": c_cat, "hash_cols": c_hash, "n_hash_buckets": N_HASH_BUCKETS})),
+                ("preproc", compact_preproc),
+                ("clf", compact_clf),
+            ])
+
+    # ---- Fit ----
+    # the pipeline that becomes the artifact is the one searched; the one-hot baseline of a
+    # compact run is only fitted for the comparison table
+    best_params = None
+    with timer.phase("fit"):
+        final = compact_pipeline if compact else pipeline
+        if search:
+            print(f"Searching {n_iter} HistGradientBoostingClassifier configs with {cv}-fold CV...")
+            cv_search = RandomizedSearchCV(final, SEARCH_SPACE, n_iter=n_iter, cv=cv, random_state=42,
+                                           scoring="accuracy", n_jobs=n_jobs)
+            cv_search.fit(X_train, y_train)
+            final = cv_search.best_estimator_
+            best_params = cv_search.best_params_
+            print(f"Best params: {best_params} (CV accuracy {cv_search.best_score_:.4f})")
+        with threadpool_limits(limits=threads):
+            if not search:
+                final.fit(X_train, y_train)
+            if compact:
+                pipeline.fit(X_train, y_train)
+        if compact:
+            compact_pipeline = final
+        else:
+            pipeline = final
+
+    # ---- Evaluate ----
+    with timer.phase("evaluate"):
+        y_pred = pipeline.predict(X_test)
+        accuracy = accuracy_score(y_test, y_pred)
+        print("Accuracy:", accuracy)
+        print(classification_report(y_test, y_pred))
+
+        artifact = {"model": pipeline, "feature_order": X.columns.tolist(), "num_cols": num_cols, "cat_cols": cat_cols,
+                    "geo_index": geo_index}
+
+        if compact:
+            base_stats = profile(pipeline, X_test, y_test)
+            compact_stats = profile(compact_pipeline, X_test, y_test)
+            print("\nOne-hot vs compact pipeline:")
+            print(f"{'metric':<20}{'one-hot':>14}{'compact':>14}{'delta':>14}")
+            for key in base_stats:
+                b, c = base_stats[key], compact_stats[key]
+                print(f"{key:<20}{b:>14.4f}{c:>14.4f}{c - b:>+14.4f}")
+            print(classification_report(y_test, compact_pipeline.predict(X_test)))
+            accuracy = compact_stats["accuracy"]
+
+            artifact = {
+                "model": compact_pipeline, "feature_order": X.columns.tolist(),
+                "num_cols": c_num, "cat_cols": c_cat, "hash_cols": c_hash,
+                "compact_report": {"one_hot": base_stats, "compact": compact_stats},
+                "geo_index": geo_index,
+            }
+
+    # ---- Save artifact (pipeline + feature order) ----
+    with timer.phase("save"):
+        joblib.dump(artifact, MODEL_PATH)
+        write_manifest(MODEL_PATH, name="earthquake", feature_order=X.columns.tolist(),
+                       dtypes=X.dtypes.to_dict(),
+                       column_groups={k: v for k, v in artifact.items() if k.endswith("_cols")},
+                       training_data=data_path)
+        with open(FEATURE_PATH, "w") as f:
+            json.dump(X.columns.tolist(), f)
+
+        print(f"Saved {MODEL_PATH} (+ manifest) and {FEATURE_PATH}")
+
+        reference = build_reference(X_train, quantiles=[c for c in DRIFT_QUANTILE_COLS if c in X_train],
+                                    categoricals=[c for c in DRIFT_CATEGORICAL_COLS if c in X_train])
+        drift_path = save_reference(reference, reference_path(MODEL_PATH))
+        print(f"Saved {drift_path} (drift reference)")
+
+        if shared_artifact:
+            path = dump_shared(artifact, shared_path(MODEL_PATH))
+            print(f"Saved {path} (mmap-able)")
+
+    return {
+        "name": "earthquake", "artifact": MODEL_PATH, "rows": len(df), "prep_cache": prep["cache"],
+        "metrics": {"accuracy": float(accuracy)}, "best_params": best_params, "compact": compact,
+        "neighbours": neighbours,
+        "timings": timer.seconds,
+    }
+
+
+if __name__ == "__main__":
+    # --compact (or EQ_COMPACT=1): date_time -> numeric parts, drop/hash near-unique text,
+    # ordinal-encode the rest and use HistGradientBoosting's native categorical support
+    # instead of a dense one-hot matrix. The one-hot baseline is still trained for comparison.
+    # --shared-artifact: also write Earthquake_model.shared.joblib uncompressed so the API can load
+    # it with mmap_mode="r" (EQ_SHARED_ARTIFACT=1) and share tree arrays across worker processes.
+    # --search: randomized CV search over SEARCH_SPACE instead of the single fixed fit.
+    # --neighbours (or EQ_NEIGHBOUR_FEATURES=1): add tsunami rate, mean magnitude and mean
+    # distance of the EQ_NEIGHBOURS_K nearest training events as features.
+    train_earthquake(
+        search="--search" in sys.argv,
+        compact="--compact" in sys.argv or os.environ.get("EQ_COMPACT", "0") == "1",
+        shared_artifact="--shared-artifact" in sys.argv,
+        neighbours="--neighbours" in sys.argv or os.environ.get("EQ_NEIGHBOUR_FEATURES", "0") == "1",
+    )
@@ -1,132 +1,805 @@
 # Earthquake_api_fixed.py
-from flask import Flask, request, jsonify
-import joblib, json, os, traceback
-import pandas as pd
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+import json, math, os, threading, time, traceback
+from collections import namedtuple
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from artifacts import artifact_version, load_artifact, manifest_path, shared_path
+from audit_log import AuditLog
+from drift import load_monitor
+from memstats import process_memory
+from metrics import CONTENT_TYPE, REGISTRY
+from microbatch import MicroBatcher, QueueFullError
+from prediction_cache import CACHE_HEADER, PredictionCache, canonical_key, file_fingerprint
+from wire_format import (BATCH_ERRORS_HEADER, NDJSON_MIME, UnsupportedFormat, encode_predictions, iter_lines,
+                         ndjson_records, read_arrow_table, request_format, response_format)
 
 app = Flask(__name__)
 
 MODEL_PATH = "Earthquake_model.pkl"            # change if different
 FEATURE_PATH = "feature_order_earthquake.json" # change if different
 
+# Serve from the uncompressed artifact written by `EarthQuake_detection.py --shared-artifact`,
+# loaded with mmap_mode="r" so the boosted trees' node arrays are shared between workers.
+# Pair with pre-fork loading (e.g. gunicorn --preload) to share the rest of the import too.
+USE_SHARED = os.environ.get("EQ_SHARED_ARTIFACT", "0") == "1"
+SHARED_MODEL_PATH = shared_path(MODEL_PATH)
+
+# Optional micro-batching: merge concurrent single-row requests into one predict call.
+# MAX_WAIT_MS bounds the extra latency each request can pay; MAX_ROWS caps the batch size.
+MICROBATCH = os.environ.get("EQ_MICROBATCH", "0") == "1"
+MICROBATCH_MAX_ROWS = int(os.environ.get("EQ_MICROBATCH_MAX_ROWS", "64"))
+MICROBATCH_WAIT_MS = float(os.environ.get("EQ_MICROBATCH_WAIT_MS", "2"))
+MICROBATCH_MAX_QUEUE = int(os.environ.get("EQ_MICROBATCH_MAX_QUEUE", "10000"))
+MICROBATCH_TIMEOUT_S = float(os.environ.get("EQ_MICROBATCH_TIMEOUT_S", "5"))
+
+# In-process prediction cache keyed on the feature values in feature_order order.
+# CACHE_SIZE=0 disables it; TTL_S=0 means entries only leave by LRU eviction or model reload.
+CACHE_SIZE = int(os.environ.get("EQ_CACHE_SIZE", "10000"))
+CACHE_MAX_MB = float(os.environ.get("EQ_CACHE_MAX_MB", "16"))
+CACHE_TTL_S = float(os.environ.get("EQ_CACHE_TTL_S", "0"))
+
+# Streaming endpoint: NDJSON records are scored CHUNK_ROWS at a time and each chunk's
+# predictions are written back before the next is read, so memory stays bounded.
+STREAM_CHUNK_ROWS = int(os.environ.get("EQ_STREAM_CHUNK_ROWS", "1000"))
+STREAM_MAX_LINE_KB = float(os.environ.get("EQ_STREAM_MAX_LINE_KB", "64"))
+
+# Batch rows are type-checked before scoring, so a failed vectorized predict means a model
+# problem rather than one bad row; it is retried row by row only for batches up to this size.
+ROW_FALLBACK_MAX = int(os.environ.get("EQ_ROW_FALLBACK_MAX", "32"))
+
+# Nearest historical events (/nearest_earthquakes): default and maximum k per query.
+NEAREST_K = int(os.environ.get("EQ_NEAREST_K", "10"))
+NEAREST_MAX_K = int(os.environ.get("EQ_NEAREST_MAX_K", "100"))
+
+# Input drift: every scored row is folded into fixed-size sketches (drift.py) and compared with
+# the reference the training script wrote next to the model; GET /drift reports PSI per feature.
+USE_DRIFT = os.environ.get("EQ_DRIFT", "1") == "1"
+DRIFT_REFERENCE_PATH = "Earthquake_model.drift.json"   # change if different
+
+# Audit log (audit_log.py): AUDIT=1 records features, prediction, model version and latency of
+# every scored request to rotated .jsonl.gz files in AUDIT_DIR from a background thread. Records
+# that would push the queue past AUDIT_MAX_ROWS feature rows are dropped and counted rather than
+# slowing requests.
+USE_AUDIT = os.environ.get("EQ_AUDIT", "0") == "1"
+AUDIT_DIR = os.environ.get("EQ_AUDIT_DIR", os.path.join("audit_logs", "earthquake"))
+AUDIT_MAX_ROWS = int(os.environ.get("EQ_AUDIT_MAX_ROWS", "100000"))
+AUDIT_MAX_MB = float(os.environ.get("EQ_AUDIT_MAX_MB", "64"))
+AUDIT_ROTATE_S = float(os.environ.get("EQ_AUDIT_ROTATE_S", "3600"))
+
+# Hot reload: POST /admin/reload (X-Admin-Token must match ADMIN_TOKEN; disabled while unset), and/or
+# poll the artifact every RELOAD_POLL_S seconds (0 = off). The new model is loaded, checked
+# and warmed with WARMUP_ROWS copies of WARMUP_RECORD before it replaces the live one.
+RELOAD_POLL_S = float(os.environ.get("EQ_RELOAD_POLL_S", "0"))
+ADMIN_TOKEN = os.environ.get("EQ_ADMIN_TOKEN", "")
+WARMUP_ROWS = int(os.environ.get("EQ_WARMUP_ROWS", "64"))
+
+# first row of the training CSV; columns a new artifact doesn't know are just left out
+WARMUP_RECORD = {
+    "title": "M 6.5 - 42 km W of Sola, Vanuatu", "magnitude": 6.5, "date_time": "16-08-2023 12:47",
+    "cdi": 7, "mmi": 4, "alert": "green", "sig": 657, "net": "us", "nst": 114, "dmin": 7.177, "gap": 25,
+    "magType": "mww", "depth": 192.955, "latitude": -13.8814, "longitude": 167.158,
+    "location": "Sola, Vanuatu", "continent": None, "country": "Vanuatu",
+}
+
+# Everything a request needs from one loaded artifact. Request handlers read `state` once and
+# use that snapshot throughout, so a reload (one reference assignment) never mixes models
+# mid-request; in-flight requests finish on the model they started with.
+ModelState = namedtuple("ModelState", "model feature_order source version fingerprint loaded_at geo drift numeric")
+
+state = None
+last_reload = None
+_reload_lock = threading.Lock()
+
+# read-only mirrors of `state` for tools and the status page
 model = None
 model_load_err = None
 feature_order = None
+model_source = None
+model_version = None
+batcher = None
+audit = AuditLog(AUDIT_DIR, "earthquake", "earthquake", max_rows=AUDIT_MAX_ROWS, max_mb=AUDIT_MAX_MB,
+                 rotate_s=AUDIT_ROTATE_S) if USE_AUDIT else None
+cache = PredictionCache(CACHE_SIZE, int(CACHE_MAX_MB * 1024 * 1024), CACHE_TTL_S) if CACHE_SIZE > 0 else None
 
-def find_predictable(obj, _visited=None):
-    """Recursively find and return the first object that has a .predict attribute.
-       Returns the object, or None if not found."""
-    if _visited is None:
-        _visited = set()
-    try:
-        oid = id(obj)
-        if oid in _visited:
-            return None
-        _visited.add(oid)
-    except Exception:
-        pass
-
-    # direct estimator
-    if hasattr(obj, "predict"):
-        return obj
-
-    # dict -> search values
-    if isinstance(obj, dict):
-        for v in obj.values():
-            found = find_predictable(v, _visited)
-            if found is not None:
-                return found
-
-    # list/tuple/set -> iterate
-    if isinstance(obj, (list, tuple, set)):
-        for v in obj:
-            found = find_predictable(v, _visited)
-            if found is not None:
-                return found
-
-    # object with __dict__ maybe contains estimator attributes (rare)
+# Per-stage timings and counters for /metrics (METRICS_ENABLED=0 turns them into no-ops).
+SERVICE = "earthquake"
+STAGE_SECONDS = REGISTRY.histogram("prediction_stage_seconds", "Time spent in each serving stage", ["service", "stage"])
+REQUEST_SECONDS = REGISTRY.histogram("prediction_request_seconds", "Request handling time", ["service", "endpoint"])
+REQUESTS_TOTAL = REGISTRY.counter("prediction_requests_total", "HTTP requests handled", ["service", "endpoint", "status"])
+ROWS_TOTAL = REGISTRY.counter("prediction_rows_scored_total", "Rows passed to the model", ["service"])
+MODEL_LOAD_SECONDS = REGISTRY.gauge("model_load_seconds", "Duration of the last model load", ["service"])
+MODEL_SWAP_SECONDS = REGISTRY.gauge("model_swap_seconds", "Pause of the last live-model swap", ["service"])
+RELOADS_TOTAL = REGISTRY.counter("model_reloads_total", "Hot reload attempts", ["service", "result"])
+stage = REGISTRY.stage_timer(STAGE_SECONDS, service=SERVICE)
+
+def _load_drift(order):
+    """Live drift monitor against DRIFT_REFERENCE_PATH, or None (disabled, missing or unreadable)."""
+    if not USE_DRIFT:
+        return None
     try:
-        d = getattr(obj, "__dict__", None)
-        if isinstance(d, dict):
-            for v in d.values():
-                found = find_predictable(v, _visited)
-                if found is not None:
-                    return found
+        monitor = load_monitor(DRIFT_REFERENCE_PATH, order)
     except Exception:
-        pass
+        app.logger.warning("Drift reference unusable, drift monitoring off:\n%s", traceback.format_exc())
+        return None
+    if monitor is None:
+        app.logger.info("No drift reference at %s; retrain to enable /drift", DRIFT_REFERENCE_PATH)
+    return monitor
 
-    return None
+def _load_state():
+    """Load the configured artifact into a new ModelState; returns (state, load_seconds).
+
+    Nothing global is touched, so this can run while the current model keeps serving.
+    """
+    t0 = time.perf_counter()
+    loaded_path = SHARED_MODEL_PATH if USE_SHARED else MODEL_PATH
+    # fingerprint first: if the file is replaced during the load, the next check sees a change
+    fingerprint = file_fingerprint(loaded_path)
+    if USE_SHARED:
+        pipe, order, bundle = load_artifact(SHARED_MODEL_PATH, FEATURE_PATH, mmap_mode="r")
+        source = "shared-mmap"
+    else:
+        pipe, order, bundle = load_artifact(MODEL_PATH, FEATURE_PATH)
+        source = "pickle"
+    # spatial index (geo_index.EventIndex); artifacts trained before it existed have none
+    geo = bundle.get("geo_index") if isinstance(bundle, dict) else None
+    # raw features the pipeline treats as numbers; requests are coerced / checked against these
+    num_cols = bundle.get("num_cols", []) if isinstance(bundle, dict) else []
+    numeric = frozenset(c for c in num_cols if c in order)
+    new = ModelState(pipe, order, source, artifact_version(loaded_path), fingerprint, time.time(), geo,
+                     _load_drift(order), numeric)
+    return new, time.perf_counter() - t0
+
+def _install(new):
+    """Make `new` the live model with a single reference swap."""
+    global state, model, feature_order, model_source, model_version
+    if cache is not None:
+        # a different artifact invalidates every cached prediction
+        cache.bind(new.fingerprint)
+    state = new
+    model, feature_order = new.model, new.feature_order
+    model_source, model_version = new.source, new.version
 
 def load_assets():
-    global model, model_load_err, feature_order
+    global model_load_err
     try:
-        if not os.path.exists(MODEL_PATH):
-            raise FileNotFoundError(f"Model file not found: {MODEL_PATH}")
-        if not os.path.exists(FEATURE_PATH):
-            raise FileNotFoundError(f"Feature-order file not found: {FEATURE_PATH}")
+        new, load_s = _load_state()
+        MODEL_LOAD_SECONDS.set(load_s, service=SERVICE)
+        _install(new)
+    except Exception as e:
+        model_load_err = traceback.format_exc()
+        app.logger.error("Failed to load assets:\n%s", model_load_err)
+
+# load at startup
+load_assets()
+
+def _predict_frame(frame, st):
+    """st.model.predict, split into preprocess / predict stages when the model is a Pipeline."""
+    steps = getattr(st.model, "steps", None)
+    if not steps:
+        with stage("predict"):
+            return st.model.predict(frame)
+    Xt = frame
+    with stage("preprocess"):
+        # same walk as Pipeline.predict, so the timings add up to one predict call
+        for _, step in steps[:-1]:
+            if step is not None and step != "passthrough":
+                Xt = step.transform(Xt)
+    with stage("predict"):
+        return steps[-1][1].predict(Xt)
+
+def _json_response(body, status=200, headers=None):
+    with stage("serialize"):
+        resp = jsonify(body)
+    return resp, status, headers or {}
+
+def _response(body, status=200, headers=None):
+    """Binary bodies (already encoded, Content-Type in headers) go out as-is; dicts as JSON."""
+    if isinstance(body, bytes):
+        return Response(body, status=status, headers=headers)
+    return _json_response(body, status, headers)
+
+def _collect_stats():
+    """Scrape-time cache / audit / drift / micro-batch figures for /metrics."""
+    labels = {"service": SERVICE}
+    out = []
+    if cache is not None:
+        snap = cache.snapshot()
+        for k in ("hits", "misses", "evictions", "expirations", "invalidations"):
+            out.append((f"prediction_cache_{k}_total", "counter", f"Prediction cache {k}", [(labels, snap[k])]))
+        out.append(("prediction_cache_entries", "gauge", "Entries in the prediction cache", [(labels, snap["entries"])]))
+        out.append(("prediction_cache_bytes", "gauge", "Approximate prediction cache size", [(labels, snap["bytes"])]))
+    if audit is not None:
+        snap = audit.snapshot()
+        for k in ("logged", "written", "dropped", "errors"):
+            out.append((f"audit_{k}_total", "counter", f"Audit log records {k}", [(labels, snap[k])]))
+        out.append(("audit_dropped_rows_total", "counter", "Feature rows in dropped audit records",
+                    [(labels, snap["dropped_rows"])]))
+        out.append(("audit_queue_depth", "gauge", "Audit records waiting for the writer", [(labels, snap["queued"])]))
+        out.append(("audit_queue_rows", "gauge", "Feature rows waiting for the writer", [(labels, snap["queued_rows"])]))
+    st = state
+    if st is not None and st.drift is not None:
+        report = st.drift.report()
+        psi = [({"service": SERVICE, "feature": name}, f["psi"]) for name, f in report["features"].items()
+               if f["psi"] is not None]
+        out.append(("drift_psi", "gauge", "Population stability index of live inputs vs training", psi))
+        out.append(("drift_rows", "gauge", "Rows seen by the drift monitor", [(labels, report["rows"])]))
+    if batcher is not None:
+        snap = batcher.snapshot()
+        for k in ("batches", "rows", "fallbacks", "rejected"):
+            out.append((f"microbatch_{k}_total", "counter", f"Micro-batcher {k}", [(labels, snap[k])]))
+        out.append(("microbatch_queue_depth", "gauge", "Rows waiting for a micro-batch", [(labels, snap["queue_depth"])]))
+        out.append(("microbatch_max_batch", "gauge", "Largest micro-batch so far", [(labels, snap["max_batch"])]))
+    return out
+
+REGISTRY.add_collector(_collect_stats)
+
+def _score_rows(rows, st=None):
+    """Score a list of rows (values already in feature_order) in one vectorized call.
 
-        bundle = joblib.load(MODEL_PATH)
-        # try common keys first
-        if isinstance(bundle, dict):
-            for k in ("model", "pipeline", "estimator", "clf"):
-                if k in bundle and hasattr(bundle[k], "predict"):
-                    model = bundle[k]
-                    break
+    st defaults to the live state; the micro-batcher passes the state each row was built for.
+    """
+    st = st or state
+    ROWS_TOTAL.inc(len(rows), service=SERVICE)
+    import pandas as pd  # deferred: keeps pandas off the startup path until the first prediction
 
-        if model is None:
-            # recursive search
-            model = find_predictable(bundle)
+    with stage("frame"):
+        frame = pd.DataFrame(rows, columns=st.feature_order)
+    return _predict_frame(frame, st)
 
-        if model is None:
-            raise ValueError("No estimator with .predict found inside the loaded joblib object.")
+def _coerce_row(values, names, numeric):
+    """Row for the model with numeric features as floats (None stays None, for the imputers).
 
-        with open(FEATURE_PATH, "r", encoding="utf-8") as f:
-            feature_order = json.load(f)
+    Returns (row, invalid) where invalid lists numeric features whose value is not a finite
+    number (text, booleans, +/-inf); text features pass through unchanged.
+    """
+    row, invalid = [], []
+    for name, v in zip(names, values):
+        if v is None or name not in numeric:
+            row.append(v)
+            continue
+        try:
+            f = float(v)
+        except (TypeError, ValueError):
+            f = None
+        if f is None or isinstance(v, bool) or math.isinf(f):
+            invalid.append(name)
+            continue
+        row.append(f)
+    return row, invalid
 
+def _predict_records(records, st):
+    """Validate and score a list of feature dicts.
+
+    Every row is type-checked first (numeric features coerced to floats); rows with
+    non-numeric values there are reported as errors and the rest are stacked and scored in a
+    single model.predict call. If that call still fails, small batches (ROW_FALLBACK_MAX
+    rows) are re-scored one by one, larger ones fail as a whole.
+    Missing features are passed as None and left to the pipeline's imputers,
+    same as /predict_earthquake.
+    Rows already in the prediction cache are answered from it and skip the model.
+    Returns (predictions, errors, cache_hits) where predictions is aligned with records
+    (None for rows that failed) and errors is a list of {"index": i, ...} dicts.
+    """
+    predictions = [None] * len(records)
+    errors = []
+    rows, index, keys = [], [], []
+    observed = []   # every valid row, cache hits included, for the drift monitor
+    hits = 0
+    for i, rec in enumerate(records):
+        if not isinstance(rec, dict):
+            errors.append({"index": i, "error": "Record must be a JSON object"})
+            continue
+        row, invalid = _coerce_row([rec.get(k) for k in st.feature_order], st.feature_order, st.numeric)
+        if invalid:
+            errors.append({"index": i, "error": "Non-numeric features", "invalid": invalid})
+            continue
+        observed.append(row)
+        key = canonical_key(row) if cache is not None else None
+        if key is not None:
+            hit, val = cache.get(key)
+            if hit:
+                predictions[i] = val
+                hits += 1
+                continue
+        rows.append(row)
+        index.append(i)
+        keys.append(key)
+
+    if st.drift is not None and observed:
+        st.drift.observe(observed)
+
+    if not rows:
+        return predictions, errors, hits
+
+    try:
+        values = _score_rows(rows, st).tolist()
     except Exception as e:
-        model = None
-        model_load_err = traceback.format_exc()
-        app.logger.error("Failed to load assets:\n%s", model_load_err)
+        app.logger.warning("Vectorized batch prediction failed:\n%s", traceback.format_exc())
+        if len(rows) > ROW_FALLBACK_MAX:
+            values = [None] * len(rows)
+            errors.extend({"index": i, "error": "prediction failed", "details": str(e)} for i in index)
+            errors.sort(key=lambda e: e["index"])
+            return _fill(predictions, index, values), errors, hits
+        values = []
+        for i, row in zip(index, rows):
+            try:
+                values.append(_score_rows([row], st).tolist()[0])
+            except Exception as e:
+                values.append(None)
+                errors.append({"index": i, "error": "prediction failed", "details": str(e)})
+        errors.sort(key=lambda e: e["index"])
 
-# load at startup
-load_assets()
+    for key, val in zip(keys, values):
+        if key is not None and val is not None:
+            cache.put(key, val, version=st.fingerprint)
 
-@app.route("/", methods=["GET"])
-def root():
-    return {
-        "service": "Earthquake API",
-        "status": "ok" if model is not None else "model_missing",
-        "endpoints": ["/predict_earthquake (POST)"]
-    }
+    return _fill(predictions, index, values), errors, hits
 
-@app.route("/predict_earthquake", methods=["POST"])
-def predict_earthquake():
-    if model is None:
-        return jsonify({"error": "model not available", "details": model_load_err}), 500
+def _fill(predictions, index, values):
+    for i, val in zip(index, values):
+        predictions[i] = val
+    return predictions
+
+def _audit(endpoint, t0, st, features, predictions):
+    """Hand a scored request to the audit log (a queue put; the writer thread does the rest)."""
+    if audit is not None:
+        audit.log(endpoint, st.version, (time.perf_counter() - t0) * 1000, features, predictions)
+
+def handle_predict(payload):
+    """Validate and score one record from an already-parsed JSON body.
+
+    Returns (body, status, headers); the Flask route and asgi_app.py both serve this.
+    """
+    t0 = time.perf_counter()
+    st = state
+    if st is None:
+        return {"error": "model not available", "details": model_load_err}, 500, {}
 
-    payload = request.get_json(force=True, silent=True)
     if payload is None:
-        return jsonify({"error": "invalid or empty JSON body"}), 400
+        return {"error": "invalid or empty JSON body"}, 400, {}
 
     data = payload.get("data") if isinstance(payload, dict) and "data" in payload else payload
     if not isinstance(data, dict):
-        return jsonify({"error": "Request body must be a JSON object (or {\"data\": {...}})"}), 400
+        return {"error": "Request body must be a JSON object (or {\"data\": {...}})"}, 400, {}
 
-    if feature_order is None:
-        return jsonify({"error": "feature_order not loaded"}), 500
+    row, invalid = _coerce_row([data.get(k) for k in st.feature_order], st.feature_order, st.numeric)
+    if invalid:
+        return {"error": "Non-numeric features", "invalid": invalid}, 400, {}
 
     try:
-        row = pd.DataFrame([{k: data.get(k, None) for k in feature_order}], columns=feature_order)
-        pred = model.predict(row)
+        if st.drift is not None:
+            st.drift.observe([row])
+        key = canonical_key(row) if cache is not None else None
+        if key is not None:
+            hit, val = cache.get(key)
+            if hit:
+                _audit("predict", t0, st, [data], [val])
+                return {"prediction": [val]}, 200, {CACHE_HEADER: "HIT"}
 
-        if hasattr(pred, "tolist"):
-            return jsonify({"prediction": pred.tolist()})
+        if batcher is not None:
+            # value comes back already unwrapped from the stacked prediction
+            val = batcher.predict(row, timeout=MICROBATCH_TIMEOUT_S, context=st)
         else:
-            return jsonify({"prediction": float(pred)})
+            val = _score_rows([row], st).tolist()[0]
 
+        if key is not None:
+            cache.put(key, val, version=st.fingerprint)
+        _audit("predict", t0, st, [data], [val])
+        return {"prediction": [val]}, 200, {CACHE_HEADER: "MISS" if key is not None else "BYPASS"}
+
+    except QueueFullError as e:
+        return {"error": "server busy", "details": str(e)}, 503, {"Retry-After": "1"}
+    except FutureTimeout:
+        # the row is still queued behind slower batches: same back-off as a full queue
+        return {"error": "server busy", "details": f"no micro-batch result within {MICROBATCH_TIMEOUT_S}s"}, \
+            503, {"Retry-After": "1"}
     except Exception as e:
         tb = traceback.format_exc()
         app.logger.error("Prediction failed:\n%s", tb)
-        return jsonify({"error": "prediction failed", "details": str(e), "traceback": tb}), 500
+        return {"error": "prediction failed", "details": str(e), "traceback": tb}, 500, {}
+
+def _batch_response(predictions, errors, out_fmt, headers):
+    """Batch reply as JSON, or the predictions encoded as out_fmt (failed rows as NaN)."""
+    if out_fmt == "json":
+        if hasattr(predictions, "tolist"):
+            predictions = predictions.tolist()
+        return {"predictions": predictions, "errors": errors, "count": len(predictions)}, 200, headers
+    try:
+        with stage("serialize"):
+            raw, headers["Content-Type"] = encode_predictions(predictions, out_fmt, "prediction")
+    except UnsupportedFormat as e:
+        return {"error": "not acceptable", "details": str(e)}, 406, {}
+    headers[BATCH_ERRORS_HEADER] = str(len(errors))
+    return raw, 200, headers
+
+def handle_batch(payload, accept=None):
+    """Batch counterpart of handle_predict: a list of records, or {"data": [...]}.
+
+    The response is JSON unless accept asks for .npy or Arrow (see _batch_response).
+    """
+    t0 = time.perf_counter()
+    st = state
+    if st is None:
+        return {"error": "model not available", "details": model_load_err}, 500, {}
+    try:
+        out_fmt = response_format(accept)
+    except UnsupportedFormat as e:
+        return {"error": "not acceptable", "details": str(e)}, 406, {}
+
+    if payload is None:
+        return {"error": "invalid or empty JSON body"}, 400, {}
+
+    records = payload.get("data") if isinstance(payload, dict) and "data" in payload else payload
+    if not isinstance(records, list):
+        return {"error": "Request body must be a JSON list of objects (or {\"data\": [...]})"}, 400, {}
+
+    predictions, errors, hits = _predict_records(records, st)
+    _audit("batch", t0, st, records, predictions)
+    scored = len(records) - len(errors)
+    cache_state = "BYPASS" if cache is None else ("HIT" if scored and hits == scored else ("PARTIAL" if hits else "MISS"))
+    return _batch_response(predictions, errors, out_fmt, {CACHE_HEADER: cache_state})
+
+def handle_columnar(body, content_type, accept=None):
+    """Score an Arrow IPC batch body (see wire_format.py).
+
+    Columns are selected by name in feature_order and handed to the pipeline as one
+    DataFrame, with no per-row dicts; the prediction cache is bypassed and the whole batch
+    succeeds or fails together. .npy bodies are refused (415) because the earthquake
+    features mix text and numbers. Returns (body, status, headers) like handle_batch.
+    """
+    t0 = time.perf_counter()
+    st = state
+    if st is None:
+        return {"error": "model not available", "details": model_load_err}, 500, {}
+
+    fmt = request_format(content_type)
+    if fmt != "arrow":
+        return {"error": "unsupported media type",
+                "details": "earthquake features include text columns; send an Arrow IPC stream"}, 415, {}
+    try:
+        out_fmt = response_format(accept, default=fmt)
+    except UnsupportedFormat as e:
+        return {"error": "not acceptable", "details": str(e)}, 406, {}
+
+    try:
+        with stage("parse"):
+            table = read_arrow_table(body, st.feature_order)
+        with stage("frame"):
+            frame = table.to_pandas()
+    except UnsupportedFormat as e:
+        return {"error": "unsupported media type", "details": str(e)}, 415, {}
+    except ValueError as e:
+        return {"error": "invalid columnar body", "details": str(e)}, 400, {}
+
+    try:
+        ROWS_TOTAL.inc(len(frame), service=SERVICE)
+        values = _predict_frame(frame, st)
+        if st.drift is not None:
+            st.drift.observe_columns(frame)
+        _audit("columnar", t0, st, frame, values)
+    except Exception as e:
+        tb = traceback.format_exc()
+        app.logger.error("Columnar prediction failed:\n%s", tb)
+        return {"error": "prediction failed", "details": str(e), "traceback": tb}, 500, {}
+
+    return _batch_response(values, [], out_fmt, {CACHE_HEADER: "BYPASS"})
+
+def handle_nearest(params):
+    """k nearest historical events to {"latitude", "longitude", "k"} and their tsunami rate.
+
+    Answered from the ball tree stored in the artifact, so no catalogue scan per request.
+    Returns (body, status, headers) like handle_predict.
+    """
+    st = state
+    if st is None:
+        return {"error": "model not available", "details": model_load_err}, 500, {}
+    if st.geo is None:
+        return {"error": "spatial index not available",
+                "details": "artifact has no geo_index; retrain with EarthQuake_detection.py"}, 503, {}
+    if not isinstance(params, dict):
+        return {"error": "invalid or empty JSON body"}, 400, {}
+
+    lat, lon = params.get("latitude"), params.get("longitude")
+    if lat is None or lon is None:
+        return {"error": "latitude and longitude are required"}, 400, {}
+    try:
+        k = int(params.get("k", NEAREST_K))
+    except (TypeError, ValueError):
+        return {"error": "k must be an integer"}, 400, {}
+    if not 1 <= k <= NEAREST_MAX_K:
+        return {"error": f"k must be between 1 and {NEAREST_MAX_K}"}, 400, {}
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return {"error": "invalid coordinates", "details": "latitude and longitude must be numbers"}, 400, {}
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return {"error": "invalid coordinates",
+                "details": "latitude must be in [-90, 90] and longitude in [-180, 180]"}, 400, {}
+
+    try:
+        t0 = time.perf_counter()
+        with stage("nearest"):
+            result = st.geo.nearest(lat, lon, k)
+        result.update(latitude=lat, longitude=lon, query_ms=(time.perf_counter() - t0) * 1000)
+    except ValueError as e:
+        return {"error": "invalid coordinates", "details": str(e)}, 400, {}
+    return result, 200, {}
+
+def score_stream_chunk(items):
+    """Score one chunk of (index, record, error) items from ndjson_records.
+
+    Goes through _predict_records, so validation, the cache and per-row fallback behave as
+    on /batch. Each chunk uses the model that is live when it starts, so a long stream
+    picks up a reload at the next chunk. Returns the NDJSON lines for the chunk, one per
+    record in input order.
+    """
+    t0 = time.perf_counter()
+    st = state
+    records = [rec for _, rec, err in items]
+    predictions, errors, _ = _predict_records(records, st)
+    _audit("stream", t0, st, records, predictions)
+    failed = {e["index"]: e for e in errors}
+    lines = []
+    for pos, (i, rec, err) in enumerate(items):
+        if err is not None:
+            out = {"index": i, "error": err}
+        elif pos in failed:
+            out = dict(failed[pos], index=i)
+        else:
+            out = {"index": i, "prediction": predictions[pos]}
+        lines.append(json.dumps(out))
+    return ("\n".join(lines) + "\n").encode()
+
+def stream_predictions(lines):
+    """Yield NDJSON prediction chunks for an iterable of input lines (see wire_format.iter_lines)."""
+    chunk = []
+    for item in ndjson_records(lines):
+        chunk.append(item)
+        if len(chunk) >= STREAM_CHUNK_ROWS:
+            yield score_stream_chunk(chunk)
+            chunk = []
+    if chunk:
+        yield score_stream_chunk(chunk)
+
+def _warm_up(st):
+    """Score WARMUP_RECORD (once, then as a batch) through st so the first live requests don't
+    pay for lazy imports and cold caches; raises if the model returns non-finite values."""
+    row = [WARMUP_RECORD.get(k) for k in st.feature_order]
+    _score_rows([row], st)
+    values = _score_rows([row] * max(1, WARMUP_ROWS), st).tolist()
+    bad = [v for v in values if not math.isfinite(v)]
+    if bad:
+        raise ValueError(f"warm-up produced {len(bad)} non-finite predictions")
+
+def reload_model(reason="admin"):
+    """Load, validate and warm the artifact on disk, then swap it in atomically.
+
+    The live model keeps serving until the swap; on any failure it stays live. The new
+    artifact may change the feature order: each request validates and scores against one
+    state snapshot, so requests in flight finish on the old order.
+    Returns a report dict, also kept in `last_reload` for GET /.
+    """
+    global last_reload, model_load_err
+    with _reload_lock:
+        t0 = time.perf_counter()
+        previous = state
+        report = {"reason": reason, "at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                  "previous_version": previous.version if previous is not None else None}
+        try:
+            new, load_s = _load_state()
+            t1 = time.perf_counter()
+            _warm_up(new)
+            warm_s = time.perf_counter() - t1
+            t2 = time.perf_counter()
+            _install(new)
+            swap_s = time.perf_counter() - t2
+        except Exception as e:
+            report.update(ok=False, error=str(e))
+            RELOADS_TOTAL.inc(service=SERVICE, result="failed")
+            app.logger.error("Model reload failed, still serving %s:\n%s", report["previous_version"], traceback.format_exc())
+        else:
+            model_load_err = None
+            report.update(ok=True, version=new.version, load_seconds=load_s, warmup_seconds=warm_s,
+                          swap_seconds=swap_s)
+            MODEL_LOAD_SECONDS.set(load_s, service=SERVICE)
+            MODEL_SWAP_SECONDS.set(swap_s, service=SERVICE)
+            RELOADS_TOTAL.inc(service=SERVICE, result="ok")
+            app.logger.info("Reloaded earthquake model %s -> %s (load %.3fs, warm-up %.3fs, swap %.6fs)",
+                            report["previous_version"], new.version, load_s, warm_s, swap_s)
+        report["total_seconds"] = time.perf_counter() - t0
+        last_reload = report
+        return report
+
+def _artifact_signature():
+    path = SHARED_MODEL_PATH if USE_SHARED else MODEL_PATH
+    sig = []
+    for p in (path, manifest_path(path)):
+        try:
+            sig.append(file_fingerprint(p))
+        except OSError:
+            sig.append(None)
+    return tuple(sig)
+
+def _watch_artifact():
+    """Reload when the artifact (or its manifest) changes and has been stable for one poll."""
+    seen = _artifact_signature()
+    pending = None
+    while True:
+        time.sleep(RELOAD_POLL_S)
+        sig = _artifact_signature()
+        if sig == seen:
+            pending = None
+        elif sig != pending:
+            pending = sig   # changed since the last poll; wait until the writer is done
+        else:
+            reload_model(reason="file-watch")
+            seen, pending = sig, None
+
+if RELOAD_POLL_S > 0:
+    threading.Thread(target=_watch_artifact, name="eq-reload-watch", daemon=True).start()
+
+if MICROBATCH:
+    batcher = MicroBatcher(
+        _score_rows,
+        max_batch_size=MICROBATCH_MAX_ROWS,
+        max_wait_ms=MICROBATCH_WAIT_MS,
+        max_queue=MICROBATCH_MAX_QUEUE,
+        name="eq-microbatch",
+    )
+
+@app.before_request
+def start_request_timer():
+    if REGISTRY.enabled:
+        g.request_t0 = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    t0 = g.get("request_t0")
+    if t0 is not None:
+        endpoint = request.endpoint or "unknown"
+        REQUEST_SECONDS.observe(time.perf_counter() - t0, service=SERVICE, endpoint=endpoint)
+        REQUESTS_TOTAL.inc(service=SERVICE, endpoint=endpoint, status=response.status_code)
+    return response
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus text-format metrics for this process."""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+def admin_denied(token):
+    """(body, status) refusing an admin request, or None if token matches ADMIN_TOKEN.
+
+    Admin routes are off unless EQ_ADMIN_TOKEN is set.
+    """
+    if not ADMIN_TOKEN:
+        return {"error": "admin endpoints disabled", "details": "set EQ_ADMIN_TOKEN to enable"}, 403
+    if token != ADMIN_TOKEN:
+        return {"error": "forbidden"}, 403
+    return None
+
+def service_status():
+    """Status payload for GET / (also embedded in asgi_app.py's combined root)."""
+    return {
+        "service": "Earthquake API",
+        "status": "ok" if model is not None else "model_missing",
+        "model_source": model_source,
+        "model_version": model_version,
+        "model_loaded_at": state.loaded_at if state is not None else None,
+        "geo_index_events": len(state.geo) if state is not None and state.geo is not None else None,
+        "reload": {"poll_s": RELOAD_POLL_S, "last": last_reload},
+        "endpoints": ["/predict_earthquake (POST)", "/predict_earthquake/batch (POST)", "/predict_earthquake/stream (POST)", "/nearest_earthquakes (GET, POST)", "/admin/reload (POST)", "/drift (GET)", "/cache (GET)", "/memory (GET)", "/metrics (GET)"],
+        "microbatch": {"config": batcher.config(), "stats": batcher.snapshot()} if batcher is not None else None,
+        "cache": cache.snapshot() if cache is not None else None,
+        "audit": audit.snapshot() if audit is not None else None,
+    }
+
+@app.route("/", methods=["GET"])
+def root():
+    return service_status()
+
+@app.route("/admin/reload", methods=["POST"])
+def admin_reload():
+    """Hot-reload the model from disk in this worker (see reload_model)."""
+    denied = admin_denied(request.headers.get("X-Admin-Token"))
+    if denied:
+        return jsonify(denied[0]), denied[1]
+    report = reload_model(reason="admin")
+    return jsonify(report), 200 if report["ok"] else 500
+
+def drift_report():
+    """Payload for GET /drift (also used by asgi_app.py)."""
+    st = state
+    if st is None or st.drift is None:
+        return {"enabled": False, "reference": DRIFT_REFERENCE_PATH,
+                "details": "drift monitoring off or no reference; retrain to write one"}
+    return dict(st.drift.report(), enabled=True, reference=DRIFT_REFERENCE_PATH, model_version=st.version)
+
+def cache_status():
+    """Payload for GET /cache (also used by asgi_app.py)."""
+    if cache is None:
+        return {"enabled": False}
+    return dict(cache.snapshot(), enabled=True)
+
+@app.route("/memory", methods=["GET"])
+def memory():
+    """Resident vs shared memory of this worker process."""
+    return jsonify(dict(process_memory(), model_source=model_source))
+
+@app.route("/drift", methods=["GET"])
+def drift_status():
+    """Per-feature PSI of the traffic seen since start (or the last reset) vs the training data."""
+    return jsonify(drift_report())
+
+@app.route("/drift/reset", methods=["POST"])
+def drift_reset():
+    """Start a new observation window (guarded like /admin/reload)."""
+    denied = admin_denied(request.headers.get("X-Admin-Token"))
+    if denied:
+        return jsonify(denied[0]), denied[1]
+    st = state
+    if st is not None and st.drift is not None:
+        st.drift.reset()
+    return jsonify({"reset": st is not None and st.drift is not None})
+
+@app.route("/cache", methods=["GET"])
+def cache_stats():
+    """Prediction cache hit/miss/eviction counters."""
+    return jsonify(cache_status())
+
+@app.route("/predict_earthquake", methods=["POST"])
+def predict_earthquake():
+    with stage("parse"):
+        payload = request.get_json(force=True, silent=True)
+    return _json_response(*handle_predict(payload))
+
+@app.route("/predict_earthquake/batch", methods=["POST"])
+def predict_earthquake_batch():
+    """Score many records in one vectorized pass.
+
+    Body is a JSON list of feature dicts, or {"data": [...]}. Rows that fail
+    validation are reported in "errors" and get a null prediction; the rest of
+    the batch is still scored. An Arrow body (by Content-Type) is scored through
+    handle_columnar instead.
+    """
+    if request_format(request.content_type) != "json":
+        return _response(*handle_columnar(request.get_data(), request.content_type, request.headers.get("Accept")))
+    with stage("parse"):
+        payload = request.get_json(force=True, silent=True)
+    return _response(*handle_batch(payload, request.headers.get("Accept")))
+
+@app.route("/nearest_earthquakes", methods=["GET", "POST"])
+def nearest_earthquakes():
+    """k nearest historical events: ?latitude=..&longitude=..&k=.. or the same keys as JSON."""
+    if request.method == "GET":
+        params = request.args.to_dict()
+    else:
+        with stage("parse"):
+            params = request.get_json(force=True, silent=True)
+    return _json_response(*handle_nearest(params))
+
+@app.route("/predict_earthquake/stream", methods=["POST"])
+def predict_earthquake_stream():
+    """Score newline-delimited JSON records as they arrive.
+
+    The body is read incrementally (chunked uploads work) and predictions come back as
+    NDJSON, one {"index": i, "prediction": ...} or {"index": i, "error": ...} line per
+    record, flushed every STREAM_CHUNK_ROWS records.
+    """
+    if state is None:
+        return _json_response({"error": "model not available", "details": model_load_err}, 500)
+
+    lines = iter_lines(request.stream, int(STREAM_MAX_LINE_KB * 1024))
+
+    def generate():
+        try:
+            yield from stream_predictions(lines)
+        except Exception as e:
+            # headers are already sent, so report the failure in-band and stop
+            app.logger.error("Streaming prediction failed:\n%s", traceback.format_exc())
+            yield (json.dumps({"error": "stream aborted", "details": str(e)}) + "\n").encode()
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIME)
 
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=5001)
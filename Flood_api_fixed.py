@@ -1,86 +1,802 @@
 # flood_api_fixed.py
-from flask import Flask, request, jsonify
-import joblib, json, os, traceback
-import pandas as pd
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+import json, math, os, sys, threading, time, traceback
+from collections import namedtuple
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import numpy as np
+
+from artifacts import (artifact_version, load_artifact, load_shared, manifest_path, shared_path,
+                       variant_path)
+from flood_compiled import MAX_ROWS, CompiledFloodModel, compile_flood_pipeline, check_equivalence
+from audit_log import AuditLog
+from drift import load_monitor
+from memstats import process_memory
+from metrics import CONTENT_TYPE, REGISTRY
+from microbatch import MicroBatcher, QueueFullError
+from prediction_cache import CACHE_HEADER, PredictionCache, canonical_key, file_fingerprint
+from wire_format import (BATCH_ERRORS_HEADER, NDJSON_MIME, UnsupportedFormat, arrow_to_matrix, encode_predictions,
+                         iter_lines, ndjson_records, read_arrow_table, read_npy, request_format, response_format)
 
 app = Flask(__name__)
 
-MODEL_PATH = "flood_model.pkl"            # change if different
+# Serve one of the cheaper candidates written by `Flood_prediction.py --variants`
+# (ridge, hgb, pruned_rf, distilled_rf) instead of the full forest; empty = full forest.
+MODEL_VARIANT = os.environ.get("FLOOD_MODEL_VARIANT", "")
+
+MODEL_PATH = variant_path("flood_model.pkl", MODEL_VARIANT)  # change if different
 FEATURE_PATH = "feature_order_flood.json" # change if different
 
+# Serve through the flat NumPy version of the pipeline (flood_compiled.py) when it compiles
+# and matches pipe.predict; set FLOOD_COMPILED=0 to always use the sklearn pipeline.
+USE_COMPILED = os.environ.get("FLOOD_COMPILED", "1") == "1"
+# Only matrices up to this many rows are scored by the compiled model; larger batches are faster
+# through the sklearn pipeline. Ignored with FLOOD_SHARED_ARTIFACT=1, where no pipeline is loaded.
+COMPILED_MAX_ROWS = int(os.environ.get("FLOOD_COMPILED_MAX_ROWS", str(MAX_ROWS)))
+
+# Serve from the mmap-able artifact written by `Flood_prediction.py --shared-artifact`: only the
+# compiled arrays, memory-mapped read-only, so every worker shares one copy of the packed trees.
+# Pair with pre-fork loading (e.g. gunicorn --preload) to share the rest of the import too.
+USE_SHARED = os.environ.get("FLOOD_SHARED_ARTIFACT", "0") == "1"
+SHARED_MODEL_PATH = shared_path(MODEL_PATH)
+
+# Optional micro-batching: merge concurrent single-row requests into one predict call.
+# MAX_WAIT_MS bounds the extra latency each request can pay; MAX_ROWS caps the batch size.
+MICROBATCH = os.environ.get("FLOOD_MICROBATCH", "0") == "1"
+MICROBATCH_MAX_ROWS = int(os.environ.get("FLOOD_MICROBATCH_MAX_ROWS", "64"))
+MICROBATCH_WAIT_MS = float(os.environ.get("FLOOD_MICROBATCH_WAIT_MS", "2"))
+MICROBATCH_MAX_QUEUE = int(os.environ.get("FLOOD_MICROBATCH_MAX_QUEUE", "10000"))
+MICROBATCH_TIMEOUT_S = float(os.environ.get("FLOOD_MICROBATCH_TIMEOUT_S", "5"))
+
+# In-process prediction cache keyed on the feature values in feature_order order.
+# CACHE_SIZE=0 disables it; TTL_S=0 means entries only leave by LRU eviction or model reload.
+CACHE_SIZE = int(os.environ.get("FLOOD_CACHE_SIZE", "10000"))
+CACHE_MAX_MB = float(os.environ.get("FLOOD_CACHE_MAX_MB", "16"))
+CACHE_TTL_S = float(os.environ.get("FLOOD_CACHE_TTL_S", "0"))
+
+# Streaming endpoint: NDJSON records are scored CHUNK_ROWS at a time and each chunk's
+# predictions are written back before the next is read, so memory stays bounded.
+STREAM_CHUNK_ROWS = int(os.environ.get("FLOOD_STREAM_CHUNK_ROWS", "1000"))
+STREAM_MAX_LINE_KB = float(os.environ.get("FLOOD_STREAM_MAX_LINE_KB", "64"))
+
+# Batch rows are type-checked before scoring, so a failed vectorized predict means a model
+# problem rather than one bad row; it is retried row by row only for batches up to this size.
+ROW_FALLBACK_MAX = int(os.environ.get("FLOOD_ROW_FALLBACK_MAX", "32"))
+
+# What-if sweeps (/predict_flood/sweep): at most SWEEP_MAX_ROWS grid rows per request. The
+# optional partial-dependence summary averages the same grid over PD_SAMPLE_ROWS rows of
+# PD_DATA_PATH (cleaned like the training data) and is cached per model and grid (PD_CACHE_SIZE
+# entries within PD_CACHE_MB, 0 entries = no cache).
+SWEEP_MAX_ROWS = int(os.environ.get("FLOOD_SWEEP_MAX_ROWS", "200000"))
+PD_DATA_PATH = "flood.csv"                 # change if different
+PD_SAMPLE_ROWS = int(os.environ.get("FLOOD_PD_SAMPLE_ROWS", "2000"))
+PD_CACHE_SIZE = int(os.environ.get("FLOOD_PD_CACHE_SIZE", "256"))
+PD_CACHE_MB = float(os.environ.get("FLOOD_PD_CACHE_MB", "4"))
+
+# Input drift: every scored row is folded into fixed-size sketches (drift.py) and compared with
+# the reference the training script wrote next to the model; GET /drift reports PSI per feature.
+USE_DRIFT = os.environ.get("FLOOD_DRIFT", "1") == "1"
+DRIFT_REFERENCE_PATH = "flood_model.drift.json"        # change if different
+
+# Audit log (audit_log.py): AUDIT=1 records features, prediction, model version and latency of
+# every scored request to rotated .jsonl.gz files in AUDIT_DIR from a background thread. Records
+# that would push the queue past AUDIT_MAX_ROWS feature rows are dropped and counted rather than
+# slowing requests.
+USE_AUDIT = os.environ.get("FLOOD_AUDIT", "0") == "1"
+AUDIT_DIR = os.environ.get("FLOOD_AUDIT_DIR", os.path.join("audit_logs", "flood"))
+AUDIT_MAX_ROWS = int(os.environ.get("FLOOD_AUDIT_MAX_ROWS", "100000"))
+AUDIT_MAX_MB = float(os.environ.get("FLOOD_AUDIT_MAX_MB", "64"))
+AUDIT_ROTATE_S = float(os.environ.get("FLOOD_AUDIT_ROTATE_S", "3600"))
+
+# Hot reload: POST /admin/reload (X-Admin-Token must match ADMIN_TOKEN; disabled while unset), and/or
+# poll the artifact every RELOAD_POLL_S seconds (0 = off). The new model is loaded, checked
+# and warmed with WARMUP_ROWS synthetic rows before it replaces the live one.
+RELOAD_POLL_S = float(os.environ.get("FLOOD_RELOAD_POLL_S", "0"))
+ADMIN_TOKEN = os.environ.get("FLOOD_ADMIN_TOKEN", "")
+WARMUP_ROWS = int(os.environ.get("FLOOD_WARMUP_ROWS", "64"))
+
+# Everything a request needs from one loaded artifact. Request handlers read `state` once and
+# use that snapshot throughout, so a reload (one reference assignment) never mixes models
+# mid-request; in-flight requests finish on the model they started with.
+ModelState = namedtuple("ModelState", "model compiled feature_order source version fingerprint loaded_at drift")
+
+state = None
+last_reload = None
+_reload_lock = threading.Lock()
+
+# read-only mirrors of `state` for tools and the status page
 model = None
 model_load_err = None
 feature_order = None
+compiled = None
+model_source = None
+model_version = None
+batcher = None
+audit = AuditLog(AUDIT_DIR, "flood", "flood", max_rows=AUDIT_MAX_ROWS, max_mb=AUDIT_MAX_MB,
+                 rotate_s=AUDIT_ROTATE_S) if USE_AUDIT else None
+cache = PredictionCache(CACHE_SIZE, int(CACHE_MAX_MB * 1024 * 1024), CACHE_TTL_S) if CACHE_SIZE > 0 else None
+pd_cache = PredictionCache(PD_CACHE_SIZE, int(PD_CACHE_MB * 1024 * 1024)) if PD_CACHE_SIZE > 0 else None
+_pd_rows = None     # (feature_order, sample matrix) read from PD_DATA_PATH on first use
+_pd_lock = threading.Lock()
 
-# reuse the same recursive finder
-def find_predictable(obj, _visited=None):
-    if _visited is None:
-        _visited = set()
+# Per-stage timings and counters for /metrics (METRICS_ENABLED=0 turns them into no-ops).
+SERVICE = "flood"
+STAGE_SECONDS = REGISTRY.histogram("prediction_stage_seconds", "Time spent in each serving stage", ["service", "stage"])
+REQUEST_SECONDS = REGISTRY.histogram("prediction_request_seconds", "Request handling time", ["service", "endpoint"])
+REQUESTS_TOTAL = REGISTRY.counter("prediction_requests_total", "HTTP requests handled", ["service", "endpoint", "status"])
+ROWS_TOTAL = REGISTRY.counter("prediction_rows_scored_total", "Rows passed to the model", ["service"])
+MODEL_LOAD_SECONDS = REGISTRY.gauge("model_load_seconds", "Duration of the last model load", ["service"])
+MODEL_SWAP_SECONDS = REGISTRY.gauge("model_swap_seconds", "Pause of the last live-model swap", ["service"])
+RELOADS_TOTAL = REGISTRY.counter("model_reloads_total", "Hot reload attempts", ["service", "result"])
+stage = REGISTRY.stage_timer(STAGE_SECONDS, service=SERVICE)
+
+def compile_model(model, feature_order):
+    """Build the pandas-free compiled model, or return None if this pipeline can't be compiled."""
+    if not USE_COMPILED:
+        return None
     try:
-        oid = id(obj)
-        if oid in _visited:
-            return None
-        _visited.add(oid)
+        fast = compile_flood_pipeline(model, feature_order)
+        diff = check_equivalence(model, fast)
+        app.logger.info("Using compiled flood model (%d trees, max abs diff %g)", fast.n_trees, diff)
+        return fast
     except Exception:
-        pass
-
-    if hasattr(obj, "predict"):
-        return obj
-
-    if isinstance(obj, dict):
-        for v in obj.values():
-            found = find_predictable(v, _visited)
-            if found is not None:
-                return found
+        app.logger.warning("Compiled flood model unavailable, using sklearn pipeline:\n%s", traceback.format_exc())
+        return None
 
-    if isinstance(obj, (list, tuple, set)):
-        for v in obj:
-            found = find_predictable(v, _visited)
-            if found is not None:
-                return found
+def load_shared_assets():
+    """Load the compiled model straight from the memory-mapped shared artifact."""
+    bundle = load_shared(SHARED_MODEL_PATH)
+    with open(FEATURE_PATH, "r", encoding="utf-8") as f:
+        order = json.load(f)
+    fast = CompiledFloodModel.from_state(bundle["compiled"])
+    if fast.feature_order != order:
+        raise ValueError(f"{SHARED_MODEL_PATH} feature order does not match {FEATURE_PATH}")
+    return fast, order
 
+def _load_drift(order):
+    """Live drift monitor against DRIFT_REFERENCE_PATH, or None (disabled, missing or unreadable)."""
+    if not USE_DRIFT:
+        return None
     try:
-        d = getattr(obj, "__dict__", None)
-        if isinstance(d, dict):
-            for v in d.values():
-                found = find_predictable(v, _visited)
-                if found is not None:
-                    return found
+        monitor = load_monitor(DRIFT_REFERENCE_PATH, order)
     except Exception:
-        pass
+        app.logger.warning("Drift reference unusable, drift monitoring off:\n%s", traceback.format_exc())
+        return None
+    if monitor is None:
+        app.logger.info("No drift reference at %s; retrain to enable /drift", DRIFT_REFERENCE_PATH)
+    return monitor
 
-    return None
+def _load_state():
+    """Load the configured artifact into a new ModelState; returns (state, load_seconds).
+
+    Nothing global is touched, so this can run while the current model keeps serving.
+    """
+    t0 = time.perf_counter()
+    loaded_path = SHARED_MODEL_PATH if USE_SHARED else MODEL_PATH
+    # fingerprint first: if the file is replaced during the load, the next check sees a change
+    fingerprint = file_fingerprint(loaded_path)
+    if USE_SHARED:
+        # the compiled model is a drop-in for pipe.predict, so it serves as both
+        fast, order = load_shared_assets()
+        new = ModelState(fast, fast, order, "shared-mmap", artifact_version(loaded_path), fingerprint, time.time(),
+                         _load_drift(order))
+    else:
+        pipe, order, _ = load_artifact(MODEL_PATH, FEATURE_PATH)
+        new = ModelState(pipe, compile_model(pipe, order), order, "pickle", artifact_version(loaded_path),
+                         fingerprint, time.time(), _load_drift(order))
+    return new, time.perf_counter() - t0
+
+def _install(new):
+    """Make `new` the live model with a single reference swap."""
+    global state, model, compiled, feature_order, model_source, model_version
+    if cache is not None:
+        # a different artifact invalidates every cached prediction
+        cache.bind(new.fingerprint)
+    if pd_cache is not None:
+        pd_cache.bind(new.fingerprint)
+    state = new
+    model, compiled, feature_order = new.model, new.compiled, new.feature_order
+    model_source, model_version = new.source, new.version
 
 def load_assets():
-    global model, model_load_err, feature_order
+    global model_load_err
+    try:
+        new, load_s = _load_state()
+        MODEL_LOAD_SECONDS.set(load_s, service=SERVICE)
+        _install(new)
+    except Exception as e:
+        model_load_err = traceback.format_exc()
+        app.logger.error("Failed to load assets:\n%s", model_load_err)
+
+load_assets()
+
+def _predict_frame(frame, st):
+    """st.model.predict, split into preprocess / predict stages when the model is a Pipeline."""
+    steps = getattr(st.model, "steps", None)
+    if not steps:
+        with stage("predict"):
+            return st.model.predict(frame)
+    Xt = frame
+    with stage("preprocess"):
+        # same walk as Pipeline.predict, so the timings add up to one predict call
+        for _, step in steps[:-1]:
+            if step is not None and step != "passthrough":
+                Xt = step.transform(Xt)
+    with stage("predict"):
+        return steps[-1][1].predict(Xt)
+
+def _json_response(body, status=200, headers=None):
+    with stage("serialize"):
+        resp = jsonify(body)
+    return resp, status, headers or {}
+
+def _response(body, status=200, headers=None):
+    """Binary bodies (already encoded, Content-Type in headers) go out as-is; dicts as JSON."""
+    if isinstance(body, bytes):
+        return Response(body, status=status, headers=headers)
+    return _json_response(body, status, headers)
+
+def _collect_stats():
+    """Scrape-time cache / audit / drift / micro-batch figures for /metrics."""
+    labels = {"service": SERVICE}
+    out = []
+    if cache is not None:
+        snap = cache.snapshot()
+        for k in ("hits", "misses", "evictions", "expirations", "invalidations"):
+            out.append((f"prediction_cache_{k}_total", "counter", f"Prediction cache {k}", [(labels, snap[k])]))
+        out.append(("prediction_cache_entries", "gauge", "Entries in the prediction cache", [(labels, snap["entries"])]))
+        out.append(("prediction_cache_bytes", "gauge", "Approximate prediction cache size", [(labels, snap["bytes"])]))
+    if audit is not None:
+        snap = audit.snapshot()
+        for k in ("logged", "written", "dropped", "errors"):
+            out.append((f"audit_{k}_total", "counter", f"Audit log records {k}", [(labels, snap[k])]))
+        out.append(("audit_dropped_rows_total", "counter", "Feature rows in dropped audit records",
+                    [(labels, snap["dropped_rows"])]))
+        out.append(("audit_queue_depth", "gauge", "Audit records waiting for the writer", [(labels, snap["queued"])]))
+        out.append(("audit_queue_rows", "gauge", "Feature rows waiting for the writer", [(labels, snap["queued_rows"])]))
+    st = state
+    if st is not None and st.drift is not None:
+        report = st.drift.report()
+        psi = [({"service": SERVICE, "feature": name}, f["psi"]) for name, f in report["features"].items()
+               if f["psi"] is not None]
+        out.append(("drift_psi", "gauge", "Population stability index of live inputs vs training", psi))
+        out.append(("drift_rows", "gauge", "Rows seen by the drift monitor", [(labels, report["rows"])]))
+    if batcher is not None:
+        snap = batcher.snapshot()
+        for k in ("batches", "rows", "fallbacks", "rejected"):
+            out.append((f"microbatch_{k}_total", "counter", f"Micro-batcher {k}", [(labels, snap[k])]))
+        out.append(("microbatch_queue_depth", "gauge", "Rows waiting for a micro-batch", [(labels, snap["queue_depth"])]))
+        out.append(("microbatch_max_batch", "gauge", "Largest micro-batch so far", [(labels, snap["max_batch"])]))
+    return out
+
+REGISTRY.add_collector(_collect_stats)
+
+def _use_compiled(n_rows, st):
+    """True if n_rows should go through the compiled model rather than the sklearn pipeline."""
+    if st.compiled is None:
+        return False
+    # the shared artifact loads only the compiled arrays, so there is no pipeline to fall back to
+    return n_rows <= COMPILED_MAX_ROWS or st.model is st.compiled
+
+def _score_matrix(X, st):
+    """Score a float64 matrix whose columns are already in feature_order."""
+    ROWS_TOTAL.inc(len(X), service=SERVICE)
+    if _use_compiled(len(X), st):
+        with stage("preprocess"):
+            Xt = st.compiled.transform(X)
+        with stage("predict"):
+            return st.compiled.predict_transformed(Xt)
+    import pandas as pd  # deferred so a compiled/mmap start never pays for the pandas import
+
+    with stage("frame"):
+        frame = pd.DataFrame(X, columns=st.feature_order, copy=False)
+    return _predict_frame(frame, st)
+
+def _score_rows(rows, st=None):
+    """Score a list of rows (values already in feature_order) in one vectorized call.
+
+    st defaults to the live state; the micro-batcher passes the state each row was built for.
+    """
+    st = st or state
+    if st.compiled is not None:
+        with stage("frame"):
+            X = st.compiled.rows_to_array(rows)
+        return _score_matrix(X, st)
+    ROWS_TOTAL.inc(len(rows), service=SERVICE)
+    import pandas as pd
+
+    with stage("frame"):
+        frame = pd.DataFrame(rows, columns=st.feature_order)
+    return _predict_frame(frame, st)
+
+def _coerce_row(values, names):
+    """Float row for the model: None -> NaN (imputed), numbers and numeric strings as floats.
+
+    Returns (row, invalid) where invalid lists the features that are not finite numbers
+    (text, booleans, +/-inf); the row is unusable when invalid is non-empty.
+    """
+    row, invalid = [], []
+    for name, v in zip(names, values):
+        if v is None:
+            row.append(math.nan)
+            continue
+        try:
+            f = float(v)
+        except (TypeError, ValueError):
+            f = None
+        if f is None or isinstance(v, bool) or math.isinf(f):
+            invalid.append(name)
+            continue
+        row.append(f)
+    return row, invalid
+
+def _predict_records(records, st):
+    """Validate and score a list of feature dicts.
+
+    Every row is type-checked and coerced to floats first; rows with missing or non-numeric
+    features are reported as errors and the rest are stacked and scored in a single
+    model.predict call. If that call still fails, small batches (ROW_FALLBACK_MAX rows) are
+    re-scored one by one, larger ones fail as a whole.
+    Rows already in the prediction cache are answered from it and skip the model.
+    Returns (predictions, errors, cache_hits) where predictions is aligned with records
+    (None for rows that failed) and errors is a list of {"index": i, ...} dicts.
+    """
+    predictions = [None] * len(records)
+    errors = []
+    rows, index, keys = [], [], []
+    observed = []   # every valid row, cache hits included, for the drift monitor
+    hits = 0
+    for i, rec in enumerate(records):
+        if not isinstance(rec, dict):
+            errors.append({"index": i, "error": "Record must be a JSON object"})
+            continue
+        missing = [f for f in st.feature_order if f not in rec]
+        if missing:
+            errors.append({"index": i, "error": "Missing features", "missing": missing})
+            continue
+        row, invalid = _coerce_row([rec[k] for k in st.feature_order], st.feature_order)
+        if invalid:
+            errors.append({"index": i, "error": "Non-numeric features", "invalid": invalid})
+            continue
+        observed.append(row)
+        key = canonical_key(row) if cache is not None else None
+        if key is not None:
+            hit, val = cache.get(key)
+            if hit:
+                predictions[i] = val
+                hits += 1
+                continue
+        rows.append(row)
+        index.append(i)
+        keys.append(key)
+
+    if st.drift is not None and observed:
+        st.drift.observe(observed)
+
+    if not rows:
+        return predictions, errors, hits
+
     try:
-        if not os.path.exists(MODEL_PATH):
-            raise FileNotFoundError(f"Model file not found: {MODEL_PATH}")
-        if not os.path.exists(FEATURE_PATH):
-            raise FileNotFoundError(f"Feature-order file not found: {FEATURE_PATH}")
+        values = _score_rows(rows, st).tolist()
+    except Exception as e:
+        app.logger.warning("Vectorized batch prediction failed:\n%s", traceback.format_exc())
+        if len(rows) > ROW_FALLBACK_MAX:
+            values = [None] * len(rows)
+            errors.extend({"index": i, "error": "prediction failed", "details": str(e)} for i in index)
+            errors.sort(key=lambda e: e["index"])
+            return _fill(predictions, index, values), errors, hits
+        values = []
+        for i, row in zip(index, rows):
+            try:
+                values.append(_score_rows([row], st).tolist()[0])
+            except Exception as e:
+                values.append(None)
+                errors.append({"index": i, "error": "prediction failed", "details": str(e)})
+        errors.sort(key=lambda e: e["index"])
+
+    for key, val in zip(keys, values):
+        if key is not None and val is not None:
+            cache.put(key, val, version=st.fingerprint)
+
+    return _fill(predictions, index, values), errors, hits
+
+def _fill(predictions, index, values):
+    for i, val in zip(index, values):
+        predictions[i] = val
+    return predictions
+
+def _audit(endpoint, t0, st, features, predictions):
+    """Hand a scored request to the audit log (a queue put; the writer thread does the rest)."""
+    if audit is not None:
+        audit.log(endpoint, st.version, (time.perf_counter() - t0) * 1000, features, predictions)
+
+def handle_predict(payload):
+    """Validate and score one record from an already-parsed JSON body.
+
+    Returns (body, status, headers); the Flask route and asgi_app.py both serve this.
+    """
+    t0 = time.perf_counter()
+    st = state
+    if st is None:
+        return {"error": "model not available", "details": model_load_err}, 500, {}
+
+    if payload is None:
+        return {"error": "invalid or empty JSON body"}, 400, {}
 
-        bundle = joblib.load(MODEL_PATH)
-        if isinstance(bundle, dict):
-            for k in ("model", "pipeline", "estimator", "clf"):
-                if k in bundle and hasattr(bundle[k], "predict"):
-                    model = bundle[k]
-                    break
+    data = payload.get("data") if isinstance(payload, dict) and "data" in payload else payload
+    if not isinstance(data, dict):
+        return {"error": "Request body must be a JSON object (or {\"data\": {...}})"}, 400, {}
+
+    missing = [f for f in st.feature_order if f not in data]
+    if missing:
+        return {"error": "Missing features", "missing": missing}, 400, {}
+
+    row, invalid = _coerce_row([data[k] for k in st.feature_order], st.feature_order)
+    if invalid:
+        return {"error": "Non-numeric features", "invalid": invalid}, 400, {}
 
-        if model is None:
-            model = find_predictable(bundle)
+    try:
+        if st.drift is not None:
+            st.drift.observe([row])
+        key = canonical_key(row) if cache is not None else None
+        if key is not None:
+            hit, val = cache.get(key)
+            if hit:
+                _audit("predict", t0, st, [data], [val])
+                return {"flood_prediction": [val]}, 200, {CACHE_HEADER: "HIT"}
 
-        if model is None:
-            raise ValueError("No estimator with .predict found inside the loaded joblib object.")
+        if batcher is not None:
+            # value comes back already unwrapped from the stacked prediction
+            val = batcher.predict(row, timeout=MICROBATCH_TIMEOUT_S, context=st)
+        else:
+            val = _score_rows([row], st).tolist()[0]
 
-        with open(FEATURE_PATH, "r", encoding="utf-8") as f:
-            feature_order = json.load(f)
+        if key is not None:
+            cache.put(key, val, version=st.fingerprint)
+        _audit("predict", t0, st, [data], [val])
+        return {"flood_prediction": [val]}, 200, {CACHE_HEADER: "MISS" if key is not None else "BYPASS"}
 
+    except QueueFullError as e:
+        return {"error": "server busy", "details": str(e)}, 503, {"Retry-After": "1"}
+    except FutureTimeout:
+        # the row is still queued behind slower batches: same back-off as a full queue
+        return {"error": "server busy", "details": f"no micro-batch result within {MICROBATCH_TIMEOUT_S}s"}, \
+            503, {"Retry-After": "1"}
     except Exception as e:
-        model = None
-        model_load_err = traceback.format_exc()
-        app.logger.error("Failed to load assets:\n%s", model_load_err)
+        tb = traceback.format_exc()
+        app.logger.error("Prediction failed:\n%s", tb)
+        return {"error": "prediction failed", "details": str(e), "traceback": tb}, 500, {}
 
-load_assets()
+def _batch_response(predictions, errors, out_fmt, headers):
+    """Batch reply as JSON, or the predictions encoded as out_fmt (failed rows as NaN)."""
+    if out_fmt == "json":
+        if hasattr(predictions, "tolist"):
+            predictions = predictions.tolist()
+        return {"flood_predictions": predictions, "errors": errors, "count": len(predictions)}, 200, headers
+    try:
+        with stage("serialize"):
+            raw, headers["Content-Type"] = encode_predictions(predictions, out_fmt, "flood_prediction")
+    except UnsupportedFormat as e:
+        return {"error": "not acceptable", "details": str(e)}, 406, {}
+    headers[BATCH_ERRORS_HEADER] = str(len(errors))
+    return raw, 200, headers
+
+def handle_batch(payload, accept=None):
+    """Batch counterpart of handle_predict: a list of records, or {"data": [...]}.
+
+    The response is JSON unless accept asks for .npy or Arrow (see _batch_response).
+    """
+    t0 = time.perf_counter()
+    st = state
+    if st is None:
+        return {"error": "model not available", "details": model_load_err}, 500, {}
+    try:
+        out_fmt = response_format(accept)
+    except UnsupportedFormat as e:
+        return {"error": "not acceptable", "details": str(e)}, 406, {}
+
+    if payload is None:
+        return {"error": "invalid or empty JSON body"}, 400, {}
+
+    records = payload.get("data") if isinstance(payload, dict) and "data" in payload else payload
+    if not isinstance(records, list):
+        return {"error": "Request body must be a JSON list of objects (or {\"data\": [...]})"}, 400, {}
+
+    predictions, errors, hits = _predict_records(records, st)
+    _audit("batch", t0, st, records, predictions)
+    scored = len(records) - len(errors)
+    cache_state = "BYPASS" if cache is None else ("HIT" if scored and hits == scored else ("PARTIAL" if hits else "MISS"))
+    return _batch_response(predictions, errors, out_fmt, {CACHE_HEADER: cache_state})
+
+def handle_columnar(body, content_type, accept=None):
+    """Score a binary batch body (.npy or Arrow, see wire_format.py).
+
+    The body is decoded straight into a float matrix in feature_order, so no per-row Python
+    objects are built and the prediction cache is bypassed. The whole batch succeeds or fails
+    together. Returns (body, status, headers) like handle_batch; body is bytes with the
+    Content-Type in headers when the client Accepts a binary format.
+    """
+    t0 = time.perf_counter()
+    st = state
+    if st is None:
+        return {"error": "model not available", "details": model_load_err}, 500, {}
+
+    fmt = request_format(content_type)
+    try:
+        out_fmt = response_format(accept, default=fmt)
+    except UnsupportedFormat as e:
+        return {"error": "not acceptable", "details": str(e)}, 406, {}
+
+    try:
+        with stage("parse"):
+            if fmt == "npy":
+                X = read_npy(body, st.feature_order)
+            else:
+                X = arrow_to_matrix(read_arrow_table(body, st.feature_order))
+    except UnsupportedFormat as e:
+        return {"error": "unsupported media type", "details": str(e)}, 415, {}
+    except ValueError as e:
+        return {"error": "invalid columnar body", "details": str(e)}, 400, {}
+
+    try:
+        values = _score_matrix(X, st)
+        if st.drift is not None:
+            st.drift.observe_columns({f: X[:, j] for j, f in enumerate(st.feature_order)})
+        _audit("columnar", t0, st, (st.feature_order, X), values)
+    except Exception as e:
+        tb = traceback.format_exc()
+        app.logger.error("Columnar prediction failed:\n%s", tb)
+        return {"error": "prediction failed", "details": str(e), "traceback": tb}, 500, {}
+
+    return _batch_response(values, [], out_fmt, {CACHE_HEADER: "BYPASS"})
+
+def _sweep_values(spec):
+    """Grid values for one swept feature: [v, ...] or {"start", "stop", "step"} (stop inclusive)."""
+    if isinstance(spec, dict):
+        start, stop, step = float(spec["start"]), float(spec["stop"]), float(spec.get("step", 1))
+        if step <= 0 or stop < start:
+            raise ValueError("need step > 0 and stop >= start")
+        n = int(math.floor((stop - start) / step + 1e-9)) + 1
+        if n > SWEEP_MAX_ROWS:
+            raise ValueError(f"{n} values is more than {SWEEP_MAX_ROWS}")
+        values = start + step * np.arange(n)
+    elif isinstance(spec, list) and spec:
+        # np.asarray would take nested lists (a 2-D grid) and numeric strings, so check items first
+        if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in spec):
+            raise ValueError("values must be a flat list of numbers")
+        values = np.asarray(spec, dtype=np.float64)
+    else:
+        raise ValueError("expected a non-empty list or {\"start\", \"stop\", \"step\"}")
+    if not np.isfinite(values).all():
+        raise ValueError("values must be finite numbers")
+    return values
+
+def _grid_matrix(B, cols, grids):
+    """Each row of B repeated for every combination of grids (row-major), swept columns set."""
+    mesh = np.stack([m.ravel() for m in np.meshgrid(*grids, indexing="ij")], axis=1)
+    X = np.repeat(B, len(mesh), axis=0)
+    X[:, cols] = np.tile(mesh, (len(B), 1))
+    return X
+
+def _pd_reference(order):
+    """PD_SAMPLE_ROWS rows of PD_DATA_PATH as a feature_order matrix, read once per feature order.
+
+    Loaded through data_prep.load_clean with the training PREP_PARAMS, so the reference rows
+    are cleaned (and winsorized) exactly like the rows the model was fitted on.
+    """
+    global _pd_rows
+    with _pd_lock:
+        if _pd_rows is None or _pd_rows[0] != order:
+            from data_prep import load_clean
+            from Flood_prediction import PREP_PARAMS
+
+            df, _ = load_clean(PD_DATA_PATH, **PREP_PARAMS)
+            df = df[order].dropna()
+            if len(df) > PD_SAMPLE_ROWS:
+                df = df.sample(PD_SAMPLE_ROWS, random_state=42)
+            _pd_rows = (list(order), df.to_numpy(dtype=np.float64))
+        return _pd_rows[1]
+
+def _partial_dependence(st, features, cols, grids):
+    """Mean prediction over the reference sample at every grid point (cached per model)."""
+    key = ("pd",) + tuple(features) + tuple(tuple(v.tolist()) for v in grids)
+    if pd_cache is not None:
+        hit, val = pd_cache.get(key)
+        if hit:
+            return dict(val, mean=val["mean"].tolist(), cached=True)
+    R = _pd_reference(st.feature_order)
+    shape = [len(v) for v in grids]
+    rows = min(len(R), max(1, SWEEP_MAX_ROWS // math.prod(shape)))
+    with stage("frame"):
+        X = _grid_matrix(R[:rows], cols, grids)
+    mean = _score_matrix(X, st).reshape([rows] + shape).mean(axis=0)
+    # cached as the float64 array, so its size is exactly grid cells x 8 bytes
+    val = {"mean": mean, "rows": rows, "data": PD_DATA_PATH}
+    if pd_cache is not None:
+        pd_cache.put(key, val, version=st.fingerprint, nbytes=mean.nbytes + sys.getsizeof(val))
+    return dict(val, mean=mean.tolist(), cached=False)
+
+def handle_sweep(payload):
+    """What-if grid: base record(s) x one or two swept features, scored in one predict call.
+
+    Body: {"base": {...} or [{...}, ...], "sweep": {"DamsQuality": [3, 5, 8]} or
+    {"DamsQuality": {"start": 3, "stop": 8, "step": 1}}, "partial_dependence": false}.
+    "predictions" is a nested list shaped [base, values of feature 1(, values of feature 2)].
+    Returns (body, status, headers) like handle_batch.
+    """
+    st = state
+    if st is None:
+        return {"error": "model not available", "details": model_load_err}, 500, {}
+    if not isinstance(payload, dict):
+        return {"error": "invalid or empty JSON body"}, 400, {}
+
+    base = payload.get("base")
+    records = [base] if isinstance(base, dict) else base
+    if not isinstance(records, list) or not records or not all(isinstance(r, dict) for r in records):
+        return {"error": "base must be a feature object or a non-empty list of them"}, 400, {}
+    sweep = payload.get("sweep")
+    if not isinstance(sweep, dict) or not 1 <= len(sweep) <= 2:
+        return {"error": "sweep must map one or two features to their values"}, 400, {}
+    features = list(sweep)
+    unknown = [f for f in features if f not in st.feature_order]
+    if unknown:
+        return {"error": "Unknown sweep features", "unknown": unknown}, 400, {}
+    for i, rec in enumerate(records):
+        missing = [f for f in st.feature_order if f not in rec and f not in sweep]
+        if missing:
+            return {"error": "Missing features", "index": i, "missing": missing}, 400, {}
+
+    try:
+        grids = [_sweep_values(sweep[f]) for f in features]
+    except (KeyError, TypeError, ValueError) as e:
+        return {"error": "invalid sweep", "details": str(e)}, 400, {}
+    shape = [len(records)] + [len(v) for v in grids]
+    if math.prod(shape) > SWEEP_MAX_ROWS:
+        return {"error": "sweep too large", "details": f"{math.prod(shape)} grid rows, limit {SWEEP_MAX_ROWS}"}, 413, {}
+    cols = [st.feature_order.index(f) for f in features]
+
+    try:
+        with stage("parse"):
+            B = np.array([[rec.get(k, np.nan) for k in st.feature_order] for rec in records], dtype=np.float64)
+    except (TypeError, ValueError) as e:
+        return {"error": "invalid base record", "details": str(e)}, 400, {}
+
+    try:
+        with stage("frame"):
+            X = _grid_matrix(B, cols, grids)
+        values = _score_matrix(X, st).reshape(shape)
+        body = {"features": features, "values": [v.tolist() for v in grids], "shape": shape,
+                "predictions": values.tolist()}
+        if payload.get("partial_dependence"):
+            body["partial_dependence"] = _partial_dependence(st, features, cols, grids)
+    except Exception as e:
+        tb = traceback.format_exc()
+        app.logger.error("Sweep failed:\n%s", tb)
+        return {"error": "sweep failed", "details": str(e), "traceback": tb}, 500, {}
+    return body, 200, {}
+
+def score_stream_chunk(items):
+    """Score one chunk of (index, record, error) items from ndjson_records.
+
+    Goes through _predict_records, so validation, the cache and per-row fallback behave as
+    on /batch. Each chunk uses the model that is live when it starts, so a long stream
+    picks up a reload at the next chunk. Returns the NDJSON lines for the chunk, one per
+    record in input order.
+    """
+    t0 = time.perf_counter()
+    st = state
+    records = [rec for _, rec, err in items]
+    predictions, errors, _ = _predict_records(records, st)
+    _audit("stream", t0, st, records, predictions)
+    failed = {e["index"]: e for e in errors}
+    lines = []
+    for pos, (i, rec, err) in enumerate(items):
+        if err is not None:
+            out = {"index": i, "error": err}
+        elif pos in failed:
+            out = dict(failed[pos], index=i)
+        else:
+            out = {"index": i, "flood_prediction": predictions[pos]}
+        lines.append(json.dumps(out))
+    return ("\n".join(lines) + "\n").encode()
+
+def stream_predictions(lines):
+    """Yield NDJSON prediction chunks for an iterable of input lines (see wire_format.iter_lines)."""
+    chunk = []
+    for item in ndjson_records(lines):
+        chunk.append(item)
+        if len(chunk) >= STREAM_CHUNK_ROWS:
+            yield score_stream_chunk(chunk)
+            chunk = []
+    if chunk:
+        yield score_stream_chunk(chunk)
+
+def _warm_up(st):
+    """Score synthetic rows (one, then a batch) through st so the first live requests don't pay
+    for lazy imports and cold caches; raises if the model returns non-finite values."""
+    d = len(st.feature_order)
+    rows = [[(i + j) % 17 for j in range(d)] for i in range(max(1, WARMUP_ROWS))]
+    _score_rows(rows[:1], st)
+    values = _score_rows(rows, st).tolist()
+    bad = [v for v in values if not math.isfinite(v)]
+    if bad:
+        raise ValueError(f"warm-up produced {len(bad)} non-finite predictions")
+
+def reload_model(reason="admin"):
+    """Load, validate and warm the artifact on disk, then swap it in atomically.
+
+    The live model keeps serving until the swap; on any failure it stays live. The new
+    artifact may change the feature order: each request validates and scores against one
+    state snapshot, so requests in flight finish on the old order.
+    Returns a report dict, also kept in `last_reload` for GET /.
+    """
+    global last_reload, model_load_err
+    with _reload_lock:
+        t0 = time.perf_counter()
+        previous = state
+        report = {"reason": reason, "at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                  "previous_version": previous.version if previous is not None else None}
+        try:
+            new, load_s = _load_state()
+            t1 = time.perf_counter()
+            _warm_up(new)
+            warm_s = time.perf_counter() - t1
+            t2 = time.perf_counter()
+            _install(new)
+            swap_s = time.perf_counter() - t2
+        except Exception as e:
+            report.update(ok=False, error=str(e))
+            RELOADS_TOTAL.inc(service=SERVICE, result="failed")
+            app.logger.error("Model reload failed, still serving %s:\n%s", report["previous_version"], traceback.format_exc())
+        else:
+            model_load_err = None
+            report.update(ok=True, version=new.version, compiled=new.compiled is not None,
+                          load_seconds=load_s, warmup_seconds=warm_s, swap_seconds=swap_s)
+            MODEL_LOAD_SECONDS.set(load_s, service=SERVICE)
+            MODEL_SWAP_SECONDS.set(swap_s, service=SERVICE)
+            RELOADS_TOTAL.inc(service=SERVICE, result="ok")
+            app.logger.info("Reloaded flood model %s -> %s (load %.3fs, warm-up %.3fs, swap %.6fs)",
+                            report["previous_version"], new.version, load_s, warm_s, swap_s)
+        report["total_seconds"] = time.perf_counter() - t0
+        last_reload = report
+        return report
+
+def _artifact_signature():
+    path = SHARED_MODEL_PATH if USE_SHARED else MODEL_PATH
+    sig = []
+    for p in (path, manifest_path(path)):
+        try:
+            sig.append(file_fingerprint(p))
+        except OSError:
+            sig.append(None)
+    return tuple(sig)
+
+def _watch_artifact():
+    """Reload when the artifact (or its manifest) changes and has been stable for one poll."""
+    seen = _artifact_signature()
+    pending = None
+    while True:
+        time.sleep(RELOAD_POLL_S)
+        sig = _artifact_signature()
+        if sig == seen:
+            pending = None
+        elif sig != pending:
+            pending = sig   # changed since the last poll; wait until the writer is done
+        else:
+            reload_model(reason="file-watch")
+            seen, pending = sig, None
+
+if RELOAD_POLL_S > 0:
+    threading.Thread(target=_watch_artifact, name="flood-reload-watch", daemon=True).start()
+
+if MICROBATCH:
+    batcher = MicroBatcher(
+        _score_rows,
+        max_batch_size=MICROBATCH_MAX_ROWS,
+        max_wait_ms=MICROBATCH_WAIT_MS,
+        max_queue=MICROBATCH_MAX_QUEUE,
+        name="flood-microbatch",
+    )
 
 @app.before_request
 def normalize_path_trailing_whitespace():
@@ -100,14 +816,107 @@ def normalize_path_trailing_whitespace():
         app.logger.debug("Normalized path: %r -> %r", path, stripped)
         # continue handling the (rewritten) request
 
-@app.route("/", methods=["GET"])
-def root():
+@app.before_request
+def start_request_timer():
+    if REGISTRY.enabled:
+        g.request_t0 = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    t0 = g.get("request_t0")
+    if t0 is not None:
+        endpoint = request.endpoint or "unknown"
+        REQUEST_SECONDS.observe(time.perf_counter() - t0, service=SERVICE, endpoint=endpoint)
+        REQUESTS_TOTAL.inc(service=SERVICE, endpoint=endpoint, status=response.status_code)
+    return response
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus text-format metrics for this process."""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+def admin_denied(token):
+    """(body, status) refusing an admin request, or None if token matches ADMIN_TOKEN.
+
+    Admin routes are off unless FLOOD_ADMIN_TOKEN is set.
+    """
+    if not ADMIN_TOKEN:
+        return {"error": "admin endpoints disabled", "details": "set FLOOD_ADMIN_TOKEN to enable"}, 403
+    if token != ADMIN_TOKEN:
+        return {"error": "forbidden"}, 403
+    return None
+
+def service_status():
+    """Status payload for GET / (also embedded in asgi_app.py's combined root)."""
     return {
         "service": "Flood API",
         "status": "ok" if model is not None else "model_missing",
-        "endpoints": ["/predict_flood (POST)"]
+        "compiled": compiled is not None,
+        "compiled_max_rows": COMPILED_MAX_ROWS,
+        "model_variant": MODEL_VARIANT or "rf",
+        "model_source": model_source,
+        "model_version": model_version,
+        "model_loaded_at": state.loaded_at if state is not None else None,
+        "reload": {"poll_s": RELOAD_POLL_S, "last": last_reload},
+        "endpoints": ["/predict_flood (POST)", "/predict_flood/batch (POST)", "/predict_flood/stream (POST)", "/predict_flood/sweep (POST)", "/admin/reload (POST)", "/drift (GET)", "/cache (GET)", "/memory (GET)", "/metrics (GET)"],
+        "microbatch": {"config": batcher.config(), "stats": batcher.snapshot()} if batcher is not None else None,
+        "cache": cache.snapshot() if cache is not None else None,
+        "audit": audit.snapshot() if audit is not None else None,
     }
 
+@app.route("/", methods=["GET"])
+def root():
+    return service_status()
+
+@app.route("/admin/reload", methods=["POST"])
+def admin_reload():
+    """Hot-reload the model from disk in this worker (see reload_model)."""
+    denied = admin_denied(request.headers.get("X-Admin-Token"))
+    if denied:
+        return jsonify(denied[0]), denied[1]
+    report = reload_model(reason="admin")
+    return jsonify(report), 200 if report["ok"] else 500
+
+def drift_report():
+    """Payload for GET /drift (also used by asgi_app.py)."""
+    st = state
+    if st is None or st.drift is None:
+        return {"enabled": False, "reference": DRIFT_REFERENCE_PATH,
+                "details": "drift monitoring off or no reference; retrain to write one"}
+    return dict(st.drift.report(), enabled=True, reference=DRIFT_REFERENCE_PATH, model_version=st.version)
+
+def cache_status():
+    """Payload for GET /cache (also used by asgi_app.py)."""
+    if cache is None:
+        return {"enabled": False}
+    return dict(cache.snapshot(), enabled=True)
+
+@app.route("/memory", methods=["GET"])
+def memory():
+    """Resident vs shared memory of this worker process."""
+    return jsonify(dict(process_memory(), model_source=model_source))
+
+@app.route("/drift", methods=["GET"])
+def drift_status():
+    """Per-feature PSI of the traffic seen since start (or the last reset) vs the training data."""
+    return jsonify(drift_report())
+
+@app.route("/drift/reset", methods=["POST"])
+def drift_reset():
+    """Start a new observation window (guarded like /admin/reload)."""
+    denied = admin_denied(request.headers.get("X-Admin-Token"))
+    if denied:
+        return jsonify(denied[0]), denied[1]
+    st = state
+    if st is not None and st.drift is not None:
+        st.drift.reset()
+    return jsonify({"reset": st is not None and st.drift is not None})
+
+@app.route("/cache", methods=["GET"])
+def cache_stats():
+    """Prediction cache hit/miss/eviction counters."""
+    return jsonify(cache_status())
+
 # add GET so browser tests don't produce 405
 @app.route("/predict_flood", methods=["GET", "POST"])
 def predict_flood():
@@ -125,42 +934,54 @@ def predict_flood():
         )
 
     # POST handling
-    if model is None:
-        return jsonify({"error": "model not available", "details": model_load_err}), 500
+    with stage("parse"):
+        payload = request.get_json(force=True, silent=True)
+    return _json_response(*handle_predict(payload))
 
-    payload = request.get_json(force=True, silent=True)
-    if payload is None:
-        return jsonify({"error": "invalid or empty JSON body"}), 400
+@app.route("/predict_flood/batch", methods=["POST"])
+def predict_flood_batch():
+    """Score many records in one vectorized pass.
 
-    data = payload.get("data") if isinstance(payload, dict) and "data" in payload else payload
-    if not isinstance(data, dict):
-        return jsonify({"error": "Request body must be a JSON object (or {\"data\": {...}})"}), 400
+    Body is a JSON list of feature dicts, or {"data": [...]}. Rows that fail
+    validation are reported in "errors" and get a null prediction; the rest of
+    the batch is still scored. A .npy or Arrow body (by Content-Type) is scored
+    through handle_columnar instead.
+    """
+    if request_format(request.content_type) != "json":
+        return _response(*handle_columnar(request.get_data(), request.content_type, request.headers.get("Accept")))
+    with stage("parse"):
+        payload = request.get_json(force=True, silent=True)
+    return _response(*handle_batch(payload, request.headers.get("Accept")))
 
-    if feature_order is None:
-        return jsonify({"error": "feature_order not loaded"}), 500
+@app.route("/predict_flood/sweep", methods=["POST"])
+def predict_flood_sweep():
+    """What-if sensitivity grid over one or two features (see handle_sweep)."""
+    with stage("parse"):
+        payload = request.get_json(force=True, silent=True)
+    return _json_response(*handle_sweep(payload))
 
-    missing = [f for f in feature_order if f not in data]
-    if missing:
-        return jsonify({"error": "Missing features", "missing": missing}), 400
+@app.route("/predict_flood/stream", methods=["POST"])
+def predict_flood_stream():
+    """Score newline-delimited JSON records as they arrive.
 
-    try:
-        row = pd.DataFrame([{k: data.get(k, None) for k in feature_order}], columns=feature_order)
-        pred = model.predict(row)
+    The body is read incrementally (chunked uploads work) and predictions come back as
+    NDJSON, one {"index": i, "flood_prediction": ...} or {"index": i, "error": ...} line per
+    record, flushed every STREAM_CHUNK_ROWS records.
+    """
+    if state is None:
+        return _json_response({"error": "model not available", "details": model_load_err}, 500)
 
-        if hasattr(pred, "tolist"):
-            return jsonify({"flood_prediction": pred.tolist()})
-        else:
-            # handle numpy scalars too
-            try:
-                val = float(pred)
-            except Exception:
-                val = pred
-            return jsonify({"flood_prediction": val})
+    lines = iter_lines(request.stream, int(STREAM_MAX_LINE_KB * 1024))
 
-    except Exception as e:
-        tb = traceback.format_exc()
-        app.logger.error("Prediction failed:\n%s", tb)
-        return jsonify({"error": "prediction failed", "details": str(e), "traceback": tb}), 500
+    def generate():
+        try:
+            yield from stream_predictions(lines)
+        except Exception as e:
+            # headers are already sent, so report the failure in-band and stop
+            app.logger.error("Streaming prediction failed:\n%s", traceback.format_exc())
+            yield (json.dumps({"error": "stream aborted", "details": str(e)}) + "\n").encode()
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIME)
 
 if __name__ == "__main__":
     # set debug=False in production
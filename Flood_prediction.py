@@ -1,83 +1,281 @@
 # flood_train_pipeline.py
-import pandas as pd
 import numpy as np
 from pathlib import Path
-import joblib, json
+import copy, io, joblib, json, sys, time
 
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import RandomizedSearchCV, train_test_split
 from sklearn.pipeline import Pipeline
 from sklearn.compose import ColumnTransformer
 from sklearn.impute import SimpleImputer
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
-from sklearn.ensemble import RandomForestRegressor
+from sklearn.base import clone
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import RidgeCV
 from sklearn.metrics import mean_squared_error, r2_score
 
-# --- Load ---
-p = Path("flood.csv")
-df = pd.read_csv(p, low_memory=False)
-df.columns = [c.strip().replace(" ", "_") for c in df.columns]
-
-target = "FloodProbability"
-if target not in df.columns:
-    raise ValueError(f"Target '{target}' not found. Columns: {df.columns.tolist()}")
-
-# --- Quick target check ---
-print("Target sample values (unique up to 20):", df[target].dropna().unique()[:20])
-
-# --- Basic cleaning ---
-# numeric median impute, categorical most frequent
-num_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-num_cols = [c for c in num_cols if c != target]
-cat_cols = df.select_dtypes(exclude=[np.number]).columns.tolist()
-
-for c in num_cols:
-    df[c] = df[c].fillna(df[c].median())
-for c in cat_cols:
-    df[c] = df[c].fillna(df[c].mode().iloc[0] if not df[c].mode().empty else "missing")
-
-# --- Outlier winsorize (optional) ---
-for c in num_cols:
-    Q1 = df[c].quantile(0.25)
-    Q3 = df[c].quantile(0.75)
-    IQR = Q3 - Q1
-    lower = Q1 - 1.5 * IQR
-    upper = Q3 + 1.5 * IQR
-    df[c] = df[c].clip(lower, upper)
-
-# --- Features / target ---
-X = df.drop(columns=[target])
-y = df[target].astype(float)
-
-# --- Train/test split ---
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-# --- Preprocessing ---
-num_pipe = Pipeline([("imputer", SimpleImputer(strategy="median")), ("scaler", StandardScaler())])
-cat_pipe = Pipeline([("imputer", SimpleImputer(strategy="most_frequent")), ("ohe", OneHotEncoder(handle_unknown="ignore", sparse_output=False))])
-
-preproc = ColumnTransformer([("num", num_pipe, num_cols), ("cat", cat_pipe, cat_cols)], remainder="drop")
-
-# --- Model pipeline ---
-rf = RandomForestRegressor(n_estimators=200, random_state=42, n_jobs=-1)
-pipe = Pipeline([("preproc", preproc), ("rf", rf)])
-
-# --- Train ---
-print("Training RandomForestRegressor...")
-pipe.fit(X_train, y_train)
-
-# --- Eval ---
-y_pred = pipe.predict(X_test)
-mse = mean_squared_error(y_test, y_pred)
-rmse = mse ** 0.5
-
-r2 = r2_score(y_test, y_pred)
-print(f"Test RMSE: {rmse:.4f}")
-print(f"Test R2:   {r2:.4f}")
-
-# --- Save artifact and feature order ---
-artifact = {"model": pipe, "feature_order": X.columns.tolist(), "num_cols": num_cols, "cat_cols": cat_cols}
-joblib.dump(artifact, "flood_model.pkl")
-with open("feature_order_flood.json", "w") as f:
-    json.dump(X.columns.tolist(), f)
-
-print("Saved flood_model.pkl and feature_order_flood.json")
+from artifacts import dump_shared, shared_path, variant_path, write_manifest
+from data_prep import load_clean
+from drift import build_reference, reference_path, save_reference
+from flood_compiled import compile_flood_pipeline, check_equivalence
+from timing import PhaseTimer
+
+DATA_PATH = "flood.csv"                    # change if different
+MODEL_PATH = "flood_model.pkl"
+FEATURE_PATH = "feature_order_flood.json"
+TARGET = "FloodProbability"
+
+# Cleaning (data_prep.load_clean) and hold-out split; generate_report.py reuses both so it
+# evaluates on exactly the rows training held out.
+PREP_PARAMS = {"exclude": (TARGET,), "winsorize": True, "feature_dtype": "float32"}
+SPLIT_PARAMS = {"test_size": 0.2, "random_state": 42}
+
+# Candidate forests for --search (RandomizedSearchCV samples n_iter of these).
+SEARCH_SPACE = {
+    "rf__n_estimators": [100, 200, 400],
+    "rf__max_depth": [None, 12, 20],
+    "rf__min_samples_leaf": [1, 2, 5],
+    "rf__max_features": [1.0, 0.5, "sqrt"],
+}
+
+
+# Cheaper candidates for --variants, each saved as flood_model.<name>.pkl and selectable in the
+# API with FLOOD_MODEL_VARIANT=<name>.
+PRUNED_TREES = 25          # first trees of the full forest, no refit
+DISTILLED_TREES = 32       # small forest fitted to the full forest's predictions
+VARIANTS_REPORT = "flood_variants.json"
+
+
+def build_variants(pipe, X_train, y_train, n_jobs=-1):
+    """Fit the cheaper candidates next to the full forest `pipe`; returns {name: pipeline}."""
+    preproc = pipe.named_steps["preproc"]
+    variants = {}
+
+    variants["ridge"] = Pipeline([("preproc", clone(preproc)),
+                                  ("ridge", RidgeCV(alphas=np.logspace(-3, 3, 13)))])
+    variants["ridge"].fit(X_train, y_train)
+
+    variants["hgb"] = Pipeline([("preproc", clone(preproc)),
+                                ("hgb", HistGradientBoostingRegressor(max_iter=300, random_state=42))])
+    variants["hgb"].fit(X_train, y_train)
+
+    # pruned: keep the first PRUNED_TREES trees (each is an independent bootstrap fit)
+    pruned = copy.deepcopy(pipe)
+    rf = pruned.named_steps["rf"]
+    rf.estimators_ = rf.estimators_[:PRUNED_TREES]
+    rf.n_estimators = len(rf.estimators_)
+    variants["pruned_rf"] = pruned
+
+    # distilled: a small, shallower forest trained on the teacher's (smoother) predictions
+    teacher = pipe.predict(X_train)
+    student = RandomForestRegressor(n_estimators=DISTILLED_TREES, max_depth=12, min_samples_leaf=5,
+                                    random_state=42, n_jobs=n_jobs)
+    variants["distilled_rf"] = Pipeline([("preproc", clone(preproc)), ("rf", student)])
+    variants["distilled_rf"].fit(X_train, teacher)
+    variants["distilled_rf"].set_params(rf__n_jobs=-1)
+
+    return variants
+
+
+def _percentiles_ms(samples):
+    samples = np.sort(np.asarray(samples)) * 1000
+    return float(np.percentile(samples, 50)), float(np.percentile(samples, 99))
+
+
+def benchmark_variant(pipe, X_test, y_test, repeats=200):
+    """Accuracy, artifact size, single-row / batch latency (sklearn and compiled, if it compiles)."""
+    buf = io.BytesIO()
+    joblib.dump(pipe, buf)
+
+    one = X_test.iloc[:1]
+    pipe.predict(one)  # warm-up
+    single = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        pipe.predict(one)
+        single.append(time.perf_counter() - t0)
+    p50, p99 = _percentiles_ms(single)
+
+    t0 = time.perf_counter()
+    preds = pipe.predict(X_test)
+    batch_s = time.perf_counter() - t0
+
+    stats = {
+        "rmse": float(mean_squared_error(y_test, preds) ** 0.5),
+        "r2": float(r2_score(y_test, preds)),
+        "artifact_bytes": len(buf.getvalue()),
+        "single_row_ms_p50": p50,
+        "single_row_ms_p99": p99,
+        "batch_us_per_row": batch_s / len(X_test) * 1e6,
+        "compiled": False,
+    }
+
+    # the API serves forests through flood_compiled.py, so time that path too
+    try:
+        fast = compile_flood_pipeline(pipe, X_test.columns.tolist())
+        check_equivalence(pipe, fast)
+    except ValueError:
+        return stats
+    row = X_test.iloc[:1].to_numpy(dtype=np.float64)
+    fast.predict(row)
+    single = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fast.predict(row)
+        single.append(time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    fast.predict(X_test)
+    stats["compiled"] = True
+    stats["compiled_single_row_ms_p50"], stats["compiled_single_row_ms_p99"] = _percentiles_ms(single)
+    stats["compiled_batch_us_per_row"] = (time.perf_counter() - t0) / len(X_test) * 1e6
+    return stats
+
+
+def print_variants(report):
+    cols = ["rmse", "r2", "artifact_bytes", "single_row_ms_p50", "single_row_ms_p99", "batch_us_per_row",
+            "compiled_single_row_ms_p50"]
+    print(f"\n{'variant':<14}" + "".join(f"{c:>28}" for c in cols))
+    for name, st in report.items():
+        cells = [st.get(c) for c in cols]
+        print(f"{name:<14}" + "".join(f"{'-':>28}" if v is None else f"{v:>28.6g}" for v in cells))
+
+
+def load_holdout(data_path=DATA_PATH):
+    """(X_test, y_test): the rows train_flood evaluates on, cleaned the same way."""
+    df, _ = load_clean(Path(data_path), **PREP_PARAMS)
+    X = df.drop(columns=[TARGET])
+    y = df[TARGET].astype(float)
+    _, X_test, _, y_test = train_test_split(X, y, **SPLIT_PARAMS)
+    return X_test, y_test
+
+
+def train_flood(data_path=DATA_PATH, n_jobs=-1, search=False, cv=3, n_iter=8, shared_artifact=False,
+                variants=False):
+    """Train, evaluate and save the flood model; returns metrics and per-phase timings.
+
+    n_jobs is the CPU budget for this run: the forest's n_jobs for a plain fit, or the number
+    of parallel CV fits (each forest single-threaded) with search=True, so the two never
+    multiply. shared_artifact also writes the mmap-able compiled forest. variants also fits,
+    benchmarks and saves the cheaper candidates from build_variants.
+    """
+    timer = PhaseTimer()
+
+    # --- Load + clean (data_prep.py) ---
+    # float32 parse (scores are small integers), median impute and IQR winsorize over all feature
+    # columns at once; the cleaned frame is cached on disk keyed by the CSV's sha256.
+    p = Path(data_path)
+    with timer.phase("load"):
+        df, prep = load_clean(p, **PREP_PARAMS)
+    print(f"Loaded {len(df):,} rows in {prep['seconds']:.2f}s (prep cache: {prep['cache']}, "
+          f"{prep['memory_bytes'] / 2**20:.1f} MiB in memory)")
+
+    if TARGET not in df.columns:
+        raise ValueError(f"Target '{TARGET}' not found. Columns: {df.columns.tolist()}")
+
+    with timer.phase("preprocess"):
+        # --- Quick target check ---
+        print("Target sample values (unique up to 20):", df[TARGET].dropna().unique()[:20])
+
+        num_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+        num_cols = [c for c in num_cols if c != TARGET]
+        cat_cols = df.select_dtypes(exclude=[np.number]).columns.tolist()
+
+        # --- Features / target ---
+        X = df.drop(columns=[TARGET])
+        y = df[TARGET].astype(float)
+
+        # --- Train/test split ---
+        X_train, X_test, y_train, y_test = train_test_split(X, y, **SPLIT_PARAMS)
+
+        # --- Preprocessing ---
+        num_pipe = Pipeline([("imputer", SimpleImputer(strategy="median")), ("scaler", StandardScaler())])
+        cat_pipe = Pipeline([("imputer", SimpleImputer(strategy="most_frequent")), ("ohe", OneHotEncoder(handle_unknown="ignore", sparse_output=False))])
+
+        preproc = ColumnTransformer([("num", num_pipe, num_cols), ("cat", cat_pipe, cat_cols)], remainder="drop")
+
+        # --- Model pipeline ---
+        rf = RandomForestRegressor(n_estimators=200, random_state=42, n_jobs=1 if search else n_jobs)
+        pipe = Pipeline([("preproc", preproc), ("rf", rf)])
+
+    # --- Train ---
+    best_params = None
+    with timer.phase("fit"):
+        if search:
+            print(f"Searching {n_iter} RandomForestRegressor configs with {cv}-fold CV...")
+            cv_search = RandomizedSearchCV(pipe, SEARCH_SPACE, n_iter=n_iter, cv=cv, random_state=42,
+                                           scoring="neg_root_mean_squared_error", n_jobs=n_jobs)
+            cv_search.fit(X_train, y_train)
+            pipe = cv_search.best_estimator_
+            best_params = cv_search.best_params_
+            print(f"Best params: {best_params} (CV RMSE {-cv_search.best_score_:.4f})")
+        else:
+            print("Training RandomForestRegressor...")
+            pipe.fit(X_train, y_train)
+        # serve with every core again; the API process owns the whole machine
+        pipe.set_params(rf__n_jobs=-1)
+
+    # --- Eval ---
+    with timer.phase("evaluate"):
+        y_pred = pipe.predict(X_test)
+        mse = mean_squared_error(y_test, y_pred)
+        rmse = mse ** 0.5
+
+        r2 = r2_score(y_test, y_pred)
+    print(f"Test RMSE: {rmse:.4f}")
+    print(f"Test R2:   {r2:.4f}")
+
+    # --- Save artifact and feature order ---
+    with timer.phase("save"):
+        artifact = {"model": pipe, "feature_order": X.columns.tolist(), "num_cols": num_cols, "cat_cols": cat_cols}
+        joblib.dump(artifact, MODEL_PATH)
+        write_manifest(MODEL_PATH, name="flood", feature_order=X.columns.tolist(),
+                       dtypes=X.dtypes.to_dict(), column_groups={"num_cols": num_cols, "cat_cols": cat_cols},
+                       training_data=str(p))
+        with open(FEATURE_PATH, "w") as f:
+            json.dump(X.columns.tolist(), f)
+
+        print(f"Saved {MODEL_PATH} (+ manifest) and {FEATURE_PATH}")
+
+        # reference sketches for the APIs' drift monitor: one bin per score value
+        drift_path = save_reference(build_reference(X_train, histograms=X.columns.tolist()), reference_path(MODEL_PATH))
+        print(f"Saved {drift_path} (drift reference)")
+
+        if shared_artifact:
+            compiled = compile_flood_pipeline(pipe, X.columns.tolist())
+            check_equivalence(pipe, compiled)
+            path = dump_shared({"compiled": compiled.to_state(), "feature_order": X.columns.tolist(),
+                                "num_cols": num_cols, "cat_cols": cat_cols}, shared_path(MODEL_PATH))
+            print(f"Saved {path} (mmap-able compiled forest)")
+
+    variant_report = None
+    if variants:
+        with timer.phase("variants"):
+            candidates = build_variants(pipe, X_train, y_train, n_jobs=n_jobs)
+            variant_report = {"rf": benchmark_variant(pipe, X_test, y_test)}
+            for name, candidate in candidates.items():
+                variant_report[name] = benchmark_variant(candidate, X_test, y_test)
+                path = variant_path(MODEL_PATH, name)
+                joblib.dump({"model": candidate, "feature_order": X.columns.tolist(),
+                             "num_cols": num_cols, "cat_cols": cat_cols, "variant": name}, path)
+                write_manifest(path, name=f"flood-{name}", feature_order=X.columns.tolist(),
+                               dtypes=X.dtypes.to_dict(), column_groups={"num_cols": num_cols, "cat_cols": cat_cols},
+                               training_data=str(p), extra={"variant": name})
+            with open(VARIANTS_REPORT, "w", encoding="utf-8") as f:
+                json.dump(variant_report, f, indent=2)
+        print_variants(variant_report)
+        print(f"Saved {', '.join(variant_path(MODEL_PATH, n) for n in candidates)} and {VARIANTS_REPORT}")
+
+    return {
+        "name": "flood", "artifact": MODEL_PATH, "rows": len(df), "prep_cache": prep["cache"],
+        "metrics": {"rmse": float(rmse), "r2": float(r2)}, "best_params": best_params,
+        "variants": variant_report, "timings": timer.seconds,
+    }
+
+
+if __name__ == "__main__":
+    # --shared-artifact: also write flood_model.shared.joblib, the compiled forest as raw arrays
+    # that the API can memory-map (FLOOD_SHARED_ARTIFACT=1) and share across worker processes.
+    # --search: randomized CV search over SEARCH_SPACE instead of the single fixed fit.
+    # --variants: also build, benchmark and save the cheaper candidates (ridge, hgb, pruned_rf,
+    # distilled_rf); serve one with FLOOD_MODEL_VARIANT=<name>.
+    train_flood(search="--search" in sys.argv, shared_artifact="--shared-artifact" in sys.argv,
+                variants="--variants" in sys.argv)
@@ -0,0 +1,237 @@
+# artifacts.py — model artifact loading shared by the APIs and offline tools
+import hashlib, json, os, warnings
+from datetime import datetime, timezone
+
+import joblib
+
+# keys tried first when the joblib artifact is a dict bundle
+ESTIMATOR_KEYS = ("model", "pipeline", "estimator", "clf")
+
+# Uncompressed artifact whose NumPy arrays can be memory-mapped read-only, so workers of a
+# multi-process server share the pages instead of each holding a private copy.
+SHARED_SUFFIX = ".shared.joblib"
+
+# Small JSON manifest written next to the payload by the training scripts. It names the
+# estimator key and carries the feature order, so services load without walking the
+# unpickled object graph and can't silently drift from a separate feature-order file.
+MANIFEST_SUFFIX = ".manifest.json"
+MANIFEST_VERSION = 1
+USE_MANIFEST = os.environ.get("ARTIFACT_MANIFEST", "1") == "1"
+VERIFY_SHA256 = os.environ.get("ARTIFACT_VERIFY_SHA256", "0") == "1"
+
+
+def find_predictable(obj, _visited=None):
+    """Recursively find and return the first object that has a .predict attribute.
+       Returns the object, or None if not found."""
+    if _visited is None:
+        _visited = set()
+    try:
+        oid = id(obj)
+        if oid in _visited:
+            return None
+        _visited.add(oid)
+    except Exception:
+        pass
+
+    # direct estimator
+    if hasattr(obj, "predict"):
+        return obj
+
+    # dict -> search values
+    if isinstance(obj, dict):
+        for v in obj.values():
+            found = find_predictable(v, _visited)
+            if found is not None:
+                return found
+
+    # list/tuple/set -> iterate
+    if isinstance(obj, (list, tuple, set)):
+        for v in obj:
+            found = find_predictable(v, _visited)
+            if found is not None:
+                return found
+
+    # object with __dict__ maybe contains estimator attributes (rare)
+    try:
+        d = getattr(obj, "__dict__", None)
+        if isinstance(d, dict):
+            for v in d.values():
+                found = find_predictable(v, _visited)
+                if found is not None:
+                    return found
+    except Exception:
+        pass
+
+    return None
+
+
+def file_sha256(path, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _sklearn_version():
+    # read the installed version without importing sklearn itself
+    try:
+        from importlib.metadata import version
+
+        return version("scikit-learn")
+    except Exception:
+        return None
+
+
+def manifest_path(model_path):
+    """flood_model.pkl -> flood_model.manifest.json"""
+    return os.path.splitext(model_path)[0] + MANIFEST_SUFFIX
+
+
+def write_manifest(model_path, name, feature_order, dtypes, column_groups,
+                   training_data=None, estimator_key="model", extra=None):
+    """Write the manifest for an artifact that has just been dumped to model_path."""
+    manifest = {
+        "format_version": MANIFEST_VERSION,
+        "name": name,
+        "payload": os.path.basename(model_path),
+        "payload_bytes": os.path.getsize(model_path),
+        "payload_sha256": file_sha256(model_path),
+        "estimator_key": estimator_key,
+        "feature_order": list(feature_order),
+        "dtypes": {k: str(v) for k, v in dtypes.items()},
+        "column_groups": {k: list(v) for k, v in column_groups.items()},
+        "training_data": None if training_data is None else {
+            "path": os.path.basename(training_data),
+            "sha256": file_sha256(training_data),
+        },
+        "sklearn_version": _sklearn_version(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    if extra:
+        manifest.update(extra)
+    path = manifest_path(model_path)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return path
+
+
+def read_manifest(model_path):
+    """Return the manifest dict for model_path, or None if there isn't one."""
+    path = manifest_path(model_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def validate_manifest(manifest, model_path):
+    """Cheap consistency checks between a manifest and its payload; raises ValueError."""
+    version = manifest.get("format_version")
+    if not isinstance(version, int) or version > MANIFEST_VERSION:
+        raise ValueError(f"Unsupported artifact manifest version {version!r} for {model_path}")
+    if manifest.get("payload") != os.path.basename(model_path):
+        raise ValueError(f"Manifest describes {manifest.get('payload')!r}, not {os.path.basename(model_path)!r}")
+    size = os.path.getsize(model_path)
+    if manifest.get("payload_bytes") != size:
+        raise ValueError(f"{model_path} is {size} bytes but its manifest says {manifest.get('payload_bytes')}; "
+                         "the payload was rewritten without updating the manifest")
+    if VERIFY_SHA256 and manifest.get("payload_sha256") != file_sha256(model_path):
+        raise ValueError(f"{model_path} does not match the sha256 recorded in its manifest")
+    trained_with, installed = manifest.get("sklearn_version"), _sklearn_version()
+    if trained_with and installed and trained_with != installed:
+        warnings.warn(f"{model_path} was trained with scikit-learn {trained_with}, running {installed}")
+
+
+def artifact_version(model_path):
+    """Short identifier of the artifact: manifest sha256 prefix, else size+mtime."""
+    manifest = read_manifest(model_path) if USE_MANIFEST else None
+    if manifest and manifest.get("payload_sha256"):
+        return manifest["payload_sha256"][:12]
+    st = os.stat(model_path)
+    return f"{st.st_size}-{st.st_mtime_ns}"
+
+
+def shared_path(model_path):
+    """flood_model.pkl -> flood_model.shared.joblib"""
+    return os.path.splitext(model_path)[0] + SHARED_SUFFIX
+
+
+def variant_path(model_path, variant):
+    """flood_model.pkl, "hgb" -> flood_model.hgb.pkl (empty variant -> model_path itself)"""
+    if not variant:
+        return model_path
+    stem, ext = os.path.splitext(model_path)
+    return f"{stem}.{variant}{ext}"
+
+
+def dump_shared(artifact, path):
+    """Write an artifact in the mmap-able format (no compression, arrays stored raw)."""
+    joblib.dump(artifact, path, compress=0)
+    return path
+
+
+def load_shared(path):
+    """Load an artifact written by dump_shared with its arrays memory-mapped read-only."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Shared artifact not found: {path}")
+    return joblib.load(path, mmap_mode="r")
+
+
+def load_artifact(model_path, feature_path, mmap_mode=None):
+    """Load a joblib model artifact plus its feature-order JSON.
+
+    If a manifest sits next to the payload it is validated and used directly (estimator key,
+    feature order); otherwise falls back to the legacy search + feature-order JSON.
+    mmap_mode="r" memory-maps the arrays of an uncompressed artifact (see dump_shared).
+    Returns (model, feature_order, bundle). Raises FileNotFoundError / ValueError with a
+    readable message if either file is missing or no estimator can be found.
+    """
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model file not found: {model_path}")
+
+    manifest = read_manifest(model_path) if USE_MANIFEST else None
+    if manifest is not None:
+        return _load_with_manifest(model_path, feature_path, manifest, mmap_mode)
+
+    if not os.path.exists(feature_path):
+        raise FileNotFoundError(f"Feature-order file not found: {feature_path}")
+
+    bundle = joblib.load(model_path, mmap_mode=mmap_mode)
+    model = None
+    # try common keys first
+    if isinstance(bundle, dict):
+        for k in ESTIMATOR_KEYS:
+            if k in bundle and hasattr(bundle[k], "predict"):
+                model = bundle[k]
+                break
+
+    if model is None:
+        # recursive search
+        model = find_predictable(bundle)
+
+    if model is None:
+        raise ValueError("No estimator with .predict found inside the loaded joblib object.")
+
+    with open(feature_path, "r", encoding="utf-8") as f:
+        feature_order = json.load(f)
+
+    return model, feature_order, bundle
+
+
+def _load_with_manifest(model_path, feature_path, manifest, mmap_mode):
+    validate_manifest(manifest, model_path)
+    feature_order = manifest["feature_order"]
+    if os.path.exists(feature_path):
+        with open(feature_path, "r", encoding="utf-8") as f:
+            on_disk = json.load(f)
+        if on_disk != feature_order:
+            raise ValueError(f"{feature_path} has drifted from {manifest_path(model_path)}; "
+                             "retrain or regenerate the feature-order file")
+
+    bundle = joblib.load(model_path, mmap_mode=mmap_mode)
+    key = manifest.get("estimator_key")
+    model = bundle[key] if key else bundle
+    if not hasattr(model, "predict"):
+        raise ValueError(f"Manifest estimator_key {key!r} does not point at an estimator with .predict")
+    return model, feature_order, bundle
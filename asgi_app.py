@@ -0,0 +1,309 @@
+# asgi_app.py — async entry point serving both models from one process
+#
+#   uvicorn asgi_app:app --host 0.0.0.0 --port 8000
+#
+# Same routes and JSON contracts as Flood_api_fixed.py / Earthquake_api_fixed.py: the request
+# body is read and parsed on the event loop, then the shared handle_predict / handle_batch
+# functions (validation, cache, model.predict) run on a bounded thread pool. When more than
+# ASGI_MAX_PENDING requests are queued or running, new ones get HTTP 429 straight away instead
+# of piling up behind slow predicts. Keep-alive connections cost nothing while idle.
+# Batch routes also take .npy / Arrow bodies by Content-Type (handle_columnar, wire_format.py);
+# /stream routes read NDJSON as it arrives and send each scored chunk back before reading on.
+# GET /cache and /drift report both models ({"flood": ..., "earthquake": ...}); /memory is the
+# one process. Request timings go to the same prediction_request_seconds / _requests_total
+# metrics as the Flask apps, labelled with the Flask endpoint names.
+import asyncio, functools, json, os, time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+import Earthquake_api_fixed as earthquake_api
+import Flood_api_fixed as flood_api
+from memstats import process_memory
+from metrics import CONTENT_TYPE, REGISTRY
+from wire_format import NDJSON_MIME, LineSplitter, ndjson_records, request_format
+
+ASGI_THREADS = int(os.environ.get("ASGI_THREADS", str(min(32, (os.cpu_count() or 1) + 4))))
+ASGI_MAX_PENDING = int(os.environ.get("ASGI_MAX_PENDING", "256"))
+ASGI_MAX_BODY_MB = float(os.environ.get("ASGI_MAX_BODY_MB", "32"))
+
+ROUTES = {
+    "/predict_flood": (flood_api, flood_api.handle_predict),
+    "/predict_flood/batch": (flood_api, flood_api.handle_batch),
+    "/predict_flood/sweep": (flood_api, flood_api.handle_sweep),
+    "/predict_earthquake": (earthquake_api, earthquake_api.handle_predict),
+    "/predict_earthquake/batch": (earthquake_api, earthquake_api.handle_batch),
+    "/nearest_earthquakes": (earthquake_api, earthquake_api.handle_nearest),
+}
+# ROUTES take POST only, except these
+ROUTE_METHODS = {"/nearest_earthquakes": ("GET", "POST")}
+STREAM_ROUTES = {
+    "/predict_flood/stream": flood_api,
+    "/predict_earthquake/stream": earthquake_api,
+}
+# hot reload (api.reload_model), one route per model since each has its own artifact and token
+RELOAD_ROUTES = {
+    "/admin/reload/flood": flood_api,
+    "/admin/reload/earthquake": earthquake_api,
+}
+
+_pool = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix="asgi-predict")
+_pending = 0
+REJECTED_TOTAL = REGISTRY.counter("asgi_rejected_total", "Requests refused with 429 (queue full)")
+# the Flask apps' request metrics (same registry entries)
+REQUEST_SECONDS = REGISTRY.histogram("prediction_request_seconds", "Request handling time", ["service", "endpoint"])
+REQUESTS_TOTAL = REGISTRY.counter("prediction_requests_total", "HTTP requests handled", ["service", "endpoint", "status"])
+
+
+def _flask_endpoints():
+    """path -> (service, endpoint) with the names the Flask apps use for the same routes."""
+    names = {}
+    for api in (flood_api, earthquake_api):
+        for rule in api.app.url_map.iter_rules():
+            names[rule.rule] = (api.SERVICE, rule.endpoint)
+    for path, api in RELOAD_ROUTES.items():
+        names[path] = (api.SERVICE, "admin_reload")
+    for path in ("/", "/metrics", "/cache", "/drift", "/memory"):
+        names[path] = ("asgi", path.strip("/") or "root")
+    return names
+
+
+ENDPOINTS = _flask_endpoints()
+
+
+def _collect_pool_stats():
+    return [
+        ("asgi_pending_requests", "gauge", "Predict jobs queued or running on the thread pool", [({}, _pending)]),
+        ("asgi_max_pending", "gauge", "Pending-job limit before 429", [({}, ASGI_MAX_PENDING)]),
+    ]
+
+
+REGISTRY.add_collector(_collect_pool_stats)
+
+
+async def _read_body(receive, limit):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > limit:
+            raise ValueError(f"request body larger than {limit} bytes")
+        chunks.append(chunk)
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+async def _send(send, status, body, content_type="application/json", headers=None):
+    raw = body if isinstance(body, bytes) else json.dumps(body).encode()
+    hdrs = [(b"content-type", content_type.encode()), (b"content-length", str(len(raw)).encode())]
+    for k, v in (headers or {}).items():
+        hdrs.append((k.lower().encode(), str(v).encode()))
+    await send({"type": "http.response.start", "status": status, "headers": hdrs})
+    await send({"type": "http.response.body", "body": raw})
+
+
+async def _stream(api, receive, send):
+    """NDJSON in, NDJSON out: score api.STREAM_CHUNK_ROWS records at a time on the pool."""
+    loop = asyncio.get_running_loop()
+    splitter = LineSplitter(int(api.STREAM_MAX_LINE_KB * 1024))
+    started = False
+    chunk, next_index, more = [], 0, True
+
+    async def flush():
+        nonlocal started, chunk
+        items, chunk = chunk, []
+        raw = await loop.run_in_executor(_pool, api.score_stream_chunk, items)
+        if not started:
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", NDJSON_MIME.encode())]})
+            started = True
+        await send({"type": "http.response.body", "body": raw, "more_body": True})
+
+    while more:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+        more = message.get("more_body", False)
+        lines = splitter.feed(message.get("body", b""))
+        if not more:
+            lines += splitter.close()
+        for item in ndjson_records(lines, start=next_index):
+            chunk.append(item)
+            next_index = item[0] + 1
+            if len(chunk) >= api.STREAM_CHUNK_ROWS:
+                await flush()
+    if chunk or not started:
+        await flush()
+    await send({"type": "http.response.body", "body": b""})
+
+
+def _status():
+    posts = [p for p in list(ROUTES) + list(STREAM_ROUTES) + list(RELOAD_ROUTES) if p not in ROUTE_METHODS]
+    return {
+        "service": "Disaster prediction API (async)",
+        "models": {"flood": flood_api.service_status(), "earthquake": earthquake_api.service_status()},
+        "pool": {"threads": ASGI_THREADS, "pending": _pending, "max_pending": ASGI_MAX_PENDING},
+        "endpoints": [f"{path} (POST)" for path in posts]
+                     + [f"{path} ({', '.join(methods)})" for path, methods in ROUTE_METHODS.items()]
+                     + [f"{path} (GET)" for path in ("/cache", "/drift", "/memory", "/metrics")],
+    }
+
+
+def _reserve():
+    """Take a pool slot, or False when ASGI_MAX_PENDING are taken (the caller answers 429).
+
+    Check and increment happen with no await in between, so concurrent requests on the event
+    loop can't both pass the check; the caller releases the slot with _release() in finally.
+    """
+    global _pending
+    if _pending >= ASGI_MAX_PENDING:
+        REJECTED_TOTAL.inc()
+        return False
+    _pending += 1
+    return True
+
+
+def _release():
+    global _pending
+    _pending -= 1
+
+
+async def _busy(send):
+    await _send(send, 429, {"error": "server busy", "details": f"{_pending} requests pending"},
+                headers={"Retry-After": "1"})
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                _pool.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    path = scope["path"].rstrip() or "/"  # same trailing-whitespace tolerance as the Flask app
+    if not REGISTRY.enabled:
+        return await _handle(scope, path, receive, send)
+
+    status = []
+
+    async def send_and_record(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+        await send(message)
+
+    t0 = time.perf_counter()
+    try:
+        await _handle(scope, path, receive, send_and_record)
+    finally:
+        service, endpoint = ENDPOINTS.get(path, ("asgi", "unknown"))
+        REQUEST_SECONDS.observe(time.perf_counter() - t0, service=service, endpoint=endpoint)
+        REQUESTS_TOTAL.inc(service=service, endpoint=endpoint, status=status[0] if status else 499)
+
+
+async def _handle(scope, path, receive, send):
+    method = scope["method"]
+
+    if method == "GET":
+        if path == "/":
+            return await _send(send, 200, _status())
+        if path == "/metrics":
+            return await _send(send, 200, REGISTRY.render().encode(), content_type=CONTENT_TYPE)
+        if path == "/memory":
+            return await _send(send, 200, dict(process_memory(), model_source={
+                "flood": flood_api.model_source, "earthquake": earthquake_api.model_source}))
+        if path in ("/cache", "/drift"):
+            report = "cache_status" if path == "/cache" else "drift_report"
+            # drift reports flush the sketch buffers (NumPy work), so build them off the loop
+            body = await asyncio.get_running_loop().run_in_executor(
+                _pool, lambda: {"flood": getattr(flood_api, report)(),
+                                "earthquake": getattr(earthquake_api, report)()})
+            return await _send(send, 200, body)
+
+    if path in RELOAD_ROUTES:
+        if method != "POST":
+            return await _send(send, 405, {"error": "method not allowed"}, headers={"Allow": "POST"})
+        api = RELOAD_ROUTES[path]
+        token = dict(scope.get("headers", [])).get(b"x-admin-token", b"").decode("latin-1")
+        denied = api.admin_denied(token)
+        if denied:
+            return await _send(send, denied[1], denied[0])
+        # load + warm-up run off the event loop; predicts keep using the old model until the swap
+        report = await asyncio.get_running_loop().run_in_executor(_pool, api.reload_model, "admin")
+        return await _send(send, 200 if report["ok"] else 500, report)
+
+    if path in STREAM_ROUTES:
+        if method != "POST":
+            return await _send(send, 405, {"error": "method not allowed"}, headers={"Allow": "POST"})
+        api = STREAM_ROUTES[path]
+        if api.state is None:
+            return await _send(send, 500, {"error": "model not available", "details": api.model_load_err})
+        # one slot for the whole stream; its chunks run on the pool one after another
+        if not _reserve():
+            return await _busy(send)
+        try:
+            return await _stream(api, receive, send)
+        finally:
+            _release()
+
+    route = ROUTES.get(path)
+    if route is None:
+        return await _send(send, 404, {"error": "not found"})
+    methods = ROUTE_METHODS.get(path, ("POST",))
+    if method not in methods:
+        return await _send(send, 405, {"error": "method not allowed"}, headers={"Allow": ", ".join(methods)})
+
+    api, handler = route
+    headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+    columnar = path.endswith("/batch") and request_format(headers.get("content-type")) != "json"
+    if path.endswith("/batch") and not columnar:
+        # JSON batches can still ask for a binary response
+        handler = functools.partial(handler, accept=headers.get("accept"))
+    if not _reserve():
+        return await _busy(send)
+    try:
+        return await _dispatch(scope, method, api, handler, headers, columnar, receive, send)
+    finally:
+        _release()
+
+
+async def _dispatch(scope, method, api, handler, headers, columnar, receive, send):
+    """Read the body and run the handler on the pool; the caller holds a _pending slot."""
+    if method == "GET":
+        # query-string parameters (only /nearest_earthquakes takes GET), like request.args
+        body, payload = None, dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+    else:
+        try:
+            body = await _read_body(receive, int(ASGI_MAX_BODY_MB * 1024 * 1024))
+        except ValueError as e:
+            return await _send(send, 413, {"error": str(e)})
+        if body is None:
+            return
+
+    loop = asyncio.get_running_loop()
+    if columnar:
+        # decoding is vectorized NumPy/Arrow work, so it runs on the pool with the predict
+        result, status, out_headers = await loop.run_in_executor(
+            _pool, api.handle_columnar, body, headers.get("content-type"), headers.get("accept"))
+    else:
+        if body is not None:
+            with api.stage("parse"):
+                try:
+                    payload = json.loads(body) if body else None
+                except ValueError:
+                    payload = None
+        result, status, out_headers = await loop.run_in_executor(_pool, handler, payload)
+
+    if isinstance(result, bytes):
+        out_headers = dict(out_headers)
+        return await _send(send, status, result, content_type=out_headers.pop("Content-Type"), headers=out_headers)
+    with api.stage("serialize"):
+        raw = json.dumps(result).encode()
+    await _send(send, status, raw, headers=out_headers)
@@ -0,0 +1,200 @@
+# audit_log.py — asynchronous prediction audit log (rotated, gzip-compressed JSONL)
+#
+# The APIs hand each scored request to AuditLog.log(), which only puts a reference on a
+# queue bounded by the feature rows it holds: no serialization, no disk I/O on the request path. A background thread
+# drains the queue in batches, turns each entry into one JSON line and appends it to
+# <dir>/<prefix>-<start time>-<pid>-<n>.jsonl.gz, rotating when a file reaches max_mb of JSON or
+# has been open rotate_s seconds. When an entry would take the queue past max_rows rows it is
+# dropped and counted (entries and rows) instead of blocking the request, so a few huge
+# batches can't hold an unbounded amount of memory. The pid in the name keeps workers from sharing a file.
+#
+# Each line: {"ts", "service", "endpoint", "model_version", "latency_ms", "n",
+#             "features": [{feature: value, ...}, ...], "predictions": [...]}
+# replay_audit.py reads these files back (a file cut short by a crash is read up to its last
+# complete batch; undecodable lines are skipped and counted).
+import atexit, glob, gzip, json, os, queue, threading, time
+
+_STOP = object()
+
+
+def _json_default(obj):
+    # NumPy scalars / arrays reach the writer unconverted; convert them here, off the request path
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    return str(obj)
+
+
+def _feature_rows(features):
+    """Normalise what a handler logged to a list of feature dicts.
+
+    Accepts a list of dicts (JSON requests), a (columns, matrix) pair (.npy / Arrow bodies)
+    or a DataFrame.
+    """
+    if isinstance(features, tuple):
+        columns, matrix = features
+        return [dict(zip(columns, row)) for row in matrix.tolist()]
+    if hasattr(features, "to_dict"):
+        return features.to_dict(orient="records")
+    return features
+
+
+def _row_count(features):
+    """Rows in what a handler logged, without converting it."""
+    if isinstance(features, tuple):
+        return len(features[1])
+    try:
+        return len(features)
+    except TypeError:
+        return 1
+
+
+class AuditLog:
+    """Bounded queue + background writer; see the module comment for the file layout."""
+
+    def __init__(self, directory, prefix, service, max_rows=100000, batch_size=500, flush_s=1.0,
+                 max_mb=64.0, rotate_s=3600.0, compresslevel=6):
+        self.directory = directory
+        self.prefix = prefix
+        self.service = service
+        self.batch_size = batch_size
+        self.flush_s = flush_s
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.rotate_s = rotate_s
+        self.compresslevel = compresslevel
+        self.max_rows = int(max_rows)
+        self.stats = {"logged": 0, "written": 0, "dropped": 0, "dropped_rows": 0, "files": 0, "bytes": 0,
+                      "errors": 0}
+        self._lock = threading.Lock()   # guards the request-side counters and _queued_rows
+        self._queued_rows = 0
+        self._queue = queue.Queue()     # bounded by _queued_rows, not by entries
+        self._file = None
+        self._path = None
+        self._file_bytes = 0
+        self._opened_at = 0.0
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name=f"{prefix}-audit-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, endpoint, model_version, latency_ms, features, predictions):
+        """Queue one scored request; returns False (and counts a drop) if it would exceed max_rows."""
+        n = _row_count(features)
+        with self._lock:
+            if self._queued_rows + n > self.max_rows:
+                self.stats["dropped"] += 1
+                self.stats["dropped_rows"] += n
+                return False
+            self._queued_rows += n
+            self.stats["logged"] += 1
+        self._queue.put_nowait((time.time(), endpoint, model_version, latency_ms, features, predictions, n))
+        return True
+
+    # ---- writer thread ----
+    def _run(self):
+        while True:
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_s))
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            stop = any(e is _STOP for e in batch)
+            batch = [e for e in batch if e is not _STOP]
+            if batch:
+                with self._lock:
+                    self._queued_rows -= sum(e[-1] for e in batch)
+                self._write(batch)
+            elif self._file is not None and time.time() - self._opened_at >= self.rotate_s:
+                self._close_file()
+            if stop:
+                self._close_file()
+                return
+
+    def _line(self, entry):
+        ts, endpoint, version, latency_ms, features, predictions, _ = entry
+        rows = _feature_rows(features)
+        if hasattr(predictions, "tolist"):
+            predictions = predictions.tolist()
+        return json.dumps({"ts": ts, "service": self.service, "endpoint": endpoint, "model_version": version,
+                           "latency_ms": round(latency_ms, 3), "n": len(rows), "features": rows,
+                           "predictions": predictions}, default=_json_default)
+
+    def _write(self, batch):
+        lines = []
+        for entry in batch:
+            try:
+                lines.append(self._line(entry))
+            except Exception:
+                self.stats["errors"] += 1
+        if not lines:
+            return
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        if self._file is not None and (self._file_bytes >= self.max_bytes
+                                       or time.time() - self._opened_at >= self.rotate_s):
+            self._close_file()
+        if self._file is None:
+            self._open_file()
+        try:
+            self._file.write(data)
+            # sync flush: everything written so far can be decompressed even if the process dies
+            self._file.flush()
+        except OSError:
+            self.stats["errors"] += len(lines)
+            self._close_file()
+            return
+        self._file_bytes += len(data)
+        self.stats["written"] += len(lines)
+        self.stats["bytes"] += len(data)
+
+    def _open_file(self):
+        stamp = time.strftime("%Y%m%dT%H%M%S")
+        self._path = os.path.join(self.directory, f"{self.prefix}-{stamp}-{os.getpid()}-{self.stats['files']:04d}.jsonl.gz")
+        self._file = gzip.open(self._path, "ab", compresslevel=self.compresslevel)
+        self._file_bytes = 0
+        self._opened_at = time.time()
+        self.stats["files"] += 1
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # ---- lifecycle ----
+    def close(self, timeout=5.0):
+        """Write what is queued, close the current file and stop the writer."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def snapshot(self):
+        return dict(self.stats, queued=self._queue.qsize(), queued_rows=self._queued_rows, max_rows=self.max_rows,
+                    current_file=self._path if self._file is not None else None, directory=self.directory)
+
+
+def audit_files(directory, prefix="*"):
+    """Audit files in write order (start time, then pid and sequence)."""
+    return sorted(glob.glob(os.path.join(directory, f"{prefix}-*.jsonl.gz")))
+
+
+def read_audit(paths, stats=None):
+    """Yield decoded lines from audit files, tolerating a truncated tail on the last batch.
+
+    Lines that aren't valid JSON are skipped; pass a dict as stats to get their count under
+    "bad_lines".
+    """
+    stats = {} if stats is None else stats
+    stats.setdefault("bad_lines", 0)
+    for path in paths:
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        stats["bad_lines"] += 1
+        except (EOFError, gzip.BadGzipFile):
+            # file still open in a running API, or cut short by a crash
+            continue
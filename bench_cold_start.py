@@ -0,0 +1,78 @@
+# bench_cold_start.py — time from process start to first successful prediction
+#
+# Each run starts a fresh interpreter that imports the API module (which loads the model)
+# and POSTs one record through Flask's test client. Wall time is measured by this parent
+# process, so interpreter start-up, imports, artifact load and the first predict all count.
+#
+#   python bench_cold_start.py                      # both services, manifest vs legacy load
+#   python bench_cold_start.py --service flood --runs 10 --out cold_start.json
+#
+# "legacy" sets ARTIFACT_MANIFEST=0 (recursive find_predictable + feature-order JSON, the
+# pre-manifest behaviour); "manifest" uses the *.manifest.json written by the training scripts.
+import argparse, json, os, statistics, subprocess, sys, time
+
+SERVICES = {
+    "flood": {"module": "Flood_api_fixed", "route": "/predict_flood", "features": "feature_order_flood.json"},
+    "earthquake": {"module": "Earthquake_api_fixed", "route": "/predict_earthquake", "features": "feature_order_earthquake.json"},
+}
+
+CHILD = """
+import json, sys
+import {module} as api
+resp = api.app.test_client().post("{route}", json=json.loads(sys.argv[1]))
+if resp.status_code != 200:
+    sys.stderr.write(resp.get_data(as_text=True))
+    sys.exit(1)
+"""
+
+MODES = {
+    "legacy": {"ARTIFACT_MANIFEST": "0"},
+    "manifest": {"ARTIFACT_MANIFEST": "1"},
+}
+
+
+def sample_record(features_path):
+    with open(features_path, "r", encoding="utf-8") as f:
+        features = json.load(f)
+    # mid-range integer scores are valid for flood; the earthquake pipeline imputes anything odd
+    return {k: 5 for k in features}
+
+
+def run_once(service, env_overrides):
+    cfg = SERVICES[service]
+    env = dict(os.environ, **env_overrides)
+    code = CHILD.format(module=cfg["module"], route=cfg["route"])
+    record = json.dumps(sample_record(cfg["features"]))
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", code, record], env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - t0
+    if proc.returncode != 0:
+        raise RuntimeError(f"{service} cold start failed:\n{proc.stderr[-2000:]}")
+    return elapsed
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Cold-start benchmark: time to first successful prediction.")
+    ap.add_argument("--service", choices=sorted(SERVICES), action="append")
+    ap.add_argument("--mode", choices=sorted(MODES), action="append")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--out", default="cold_start.json", help="machine-readable results")
+    args = ap.parse_args(argv)
+
+    results = []
+    for service in args.service or sorted(SERVICES):
+        for mode in args.mode or ["legacy", "manifest"]:
+            times = [run_once(service, MODES[mode]) for _ in range(args.runs)]
+            row = {"service": service, "mode": mode, "runs": args.runs,
+                   "median_s": statistics.median(times), "min_s": min(times), "max_s": max(times)}
+            results.append(row)
+            print(f"{service:<11}{mode:<10} median {row['median_s']:.3f}s  "
+                  f"min {row['min_s']:.3f}s  max {row['max_s']:.3f}s")
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"python": sys.version.split()[0], "results": results}, f, indent=2)
+    print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
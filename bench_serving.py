@@ -0,0 +1,318 @@
+# bench_serving.py — end-to-end load test + in-process stage microbenchmarks for both APIs
+#
+#   python bench_serving.py                                   # both services, default settings
+#   python bench_serving.py --service flood --concurrency 1,8,32 --requests 2000
+#   python bench_serving.py --record bench_requests.jsonl     # save generated traffic
+#   python bench_serving.py --replay bench_requests.jsonl     # replay it against the APIs
+#   python bench_serving.py --micro-only --out bench.json
+#   python bench_serving.py --server flask,asgi             # Flask vs asgi_app.py, same traffic
+#   python bench_serving.py --cache                         # keep the APIs' prediction cache on
+#
+# Each service is started locally in a subprocess: the threaded Flask dev server (no reloader)
+# or, with --server asgi, asgi_app.py under uvicorn (one process serving both models).
+# Every concurrency level gets its own generated traffic and a freshly started server, so levels
+# don't share a warm cache.
+# The prediction cache is off unless --cache is given (every request then measures a real
+# predict); each result row reports the fraction of responses answered from the cache.
+# Results (throughput and p50/p95/p99 latency per endpoint and concurrency, plus per-stage
+# timings: JSON parse, DataFrame build, preproc.transform, estimator predict, jsonify) are
+# written to --out as JSON so runs can be diffed between model versions.
+import argparse, csv, json, os, platform, random, socket, subprocess, sys, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+SERVICES = {
+    "flood": {
+        "module": "Flood_api_fixed", "port": 5100, "route": "/predict_flood",
+        "features": "feature_order_flood.json",
+    },
+    "earthquake": {
+        "module": "Earthquake_api_fixed", "port": 5101, "route": "/predict_earthquake",
+        "features": "feature_order_earthquake.json", "sample_csv": "earthquake_1995-2023.csv",
+    },
+}
+
+SERVER = """
+import sys
+import {module} as api
+api.app.run(host="127.0.0.1", port=int(sys.argv[1]), threaded=True, debug=False, use_reloader=False)
+"""
+
+ASGI_PORT = 5102
+ASGI_SERVER = """
+import sys, uvicorn
+uvicorn.run("asgi_app:app", host="127.0.0.1", port=int(sys.argv[1]), log_level="warning")
+"""
+
+# environment for servers started without --cache (asgi_app.py loads both models)
+NO_CACHE_ENV = {"FLOOD_CACHE_SIZE": "0", "EQ_CACHE_SIZE": "0"}
+
+
+# ---- traffic ----
+def load_features(service):
+    with open(SERVICES[service]["features"], "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def generate_records(service, n, seed=0):
+    """Synthetic flood rows (integer scores 0-16) or rows sampled from the earthquake CSV."""
+    rng = random.Random(seed)
+    features = load_features(service)
+    if service == "flood":
+        return [{k: rng.randint(0, 16) for k in features} for _ in range(n)]
+    with open(SERVICES[service]["sample_csv"], "r", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    out = []
+    for _ in range(n):
+        row = rng.choice(rows)
+        rec = {}
+        for k in features:
+            v = row.get(k, "")
+            try:
+                rec[k] = float(v) if v != "" else None
+            except ValueError:
+                rec[k] = v
+        out.append(rec)
+    return out
+
+
+def build_requests(service, n, batch_size, seed=0):
+    """[(endpoint, body)] for single-row requests and, if batch_size, batch requests."""
+    route = SERVICES[service]["route"]
+    records = generate_records(service, n, seed)
+    reqs = [(route, rec) for rec in records]
+    if batch_size:
+        reqs += [(route + "/batch", records[i:i + batch_size])
+                 for i in range(0, len(records), batch_size)]
+    return reqs
+
+
+def record_traffic(path, service, reqs, concurrency):
+    with open(path, "a", encoding="utf-8") as f:
+        for i, (endpoint, body) in enumerate(reqs):
+            f.write(json.dumps({"request_id": f"{service}-c{concurrency}-{i:06d}", "service": service,
+                                "concurrency": concurrency, "endpoint": endpoint, "body": body}) + "\n")
+
+
+def replay_traffic(path, service, concurrency):
+    """Recorded requests for one service and level (items without a level replay at every level)."""
+    reqs = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                if item.get("service") == service and item.get("concurrency", concurrency) == concurrency:
+                    reqs.append((item["endpoint"], item["body"]))
+    return reqs
+
+
+# ---- servers ----
+def wait_for_port(port, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not come up within {timeout}s")
+
+
+def start_server(service, server="flask", env=None):
+    """Start the service; returns (process, port)."""
+    if server == "asgi":
+        code, port = ASGI_SERVER, ASGI_PORT
+    else:
+        code, port = SERVER.format(module=SERVICES[service]["module"]), SERVICES[service]["port"]
+    # stderr (one access-log line per request) goes to a file: an undrained pipe fills up
+    # after a few hundred requests and blocks the server mid-run
+    log = tempfile.TemporaryFile()
+    proc = subprocess.Popen([sys.executable, "-c", code, str(port)],
+                            env=dict(os.environ, **(env or {})),
+                            stdout=subprocess.DEVNULL, stderr=log)
+    try:
+        wait_for_port(port)
+    except RuntimeError:
+        proc.kill()
+        proc.wait()
+        log.seek(0)
+        raise RuntimeError(log.read().decode(errors="replace")[-2000:])
+    finally:
+        log.close()   # the child keeps its own handle
+    return proc, port
+
+
+# ---- load test ----
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[idx]
+
+
+def summarize(latencies, rows, errors, elapsed, cache_hits=0):
+    lat = sorted(latencies)
+    return {
+        "requests": len(latencies), "errors": errors, "rows": rows, "elapsed_s": elapsed,
+        "cache_hit_rate": cache_hits / len(latencies) if latencies else None,
+        "requests_per_s": len(latencies) / elapsed if elapsed else None,
+        "rows_per_s": rows / elapsed if elapsed else None,
+        "p50_ms": percentile(lat, 50) * 1000 if lat else None,
+        "p95_ms": percentile(lat, 95) * 1000 if lat else None,
+        "p99_ms": percentile(lat, 99) * 1000 if lat else None,
+        "max_ms": lat[-1] * 1000 if lat else None,
+    }
+
+
+def load_test(base_url, reqs, concurrency):
+    """Fire reqs at base_url with `concurrency` keep-alive clients; returns stats per endpoint.
+
+    cache_hit_rate counts responses whose X-Prediction-Cache header is HIT (every row cached).
+    """
+    import requests
+    from prediction_cache import CACHE_HEADER
+
+    local = threading.local()
+
+    def send(item):
+        endpoint, body = item
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        t0 = time.perf_counter()
+        resp = session.post(base_url + endpoint, json=body)
+        latency = time.perf_counter() - t0
+        hit = resp.headers.get(CACHE_HEADER) == "HIT"
+        return endpoint, latency, resp.status_code == 200, len(body) if isinstance(body, list) else 1, hit
+
+    per_endpoint = {}
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for endpoint, latency, ok, rows, hit in pool.map(send, reqs):
+            stats = per_endpoint.setdefault(endpoint, {"lat": [], "rows": 0, "errors": 0, "hits": 0})
+            stats["lat"].append(latency)
+            stats["rows"] += rows
+            stats["errors"] += 0 if ok else 1
+            stats["hits"] += hit
+    elapsed = time.perf_counter() - t0
+    # endpoints share the wall clock, so per-endpoint throughput is relative to the whole run
+    return {ep: summarize(s["lat"], s["rows"], s["errors"], elapsed, s["hits"]) for ep, s in per_endpoint.items()}
+
+
+# ---- in-process stage microbenchmarks ----
+def time_call(fn, repeat):
+    fn()  # warm-up
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return {"p50_us": percentile(samples, 50) * 1e6, "p99_us": percentile(samples, 99) * 1e6}
+
+
+def micro_benchmarks(service, repeat=500, batch_size=256):
+    """Per-stage cost of the serving path, measured in this process for 1 row and a batch."""
+    import importlib
+    import pandas as pd
+
+    api = importlib.import_module(SERVICES[service]["module"])
+    if api.model is None:
+        raise RuntimeError(f"{service} model not loaded:\n{api.model_load_err}")
+    fo = api.feature_order
+    model = api.model
+    records = generate_records(service, batch_size, seed=1)
+    out = {}
+    for label, recs in (("single", records[:1]), ("batch", records)):
+        body = json.dumps(recs[0] if label == "single" else recs).encode()
+        rows = [[r.get(k) for k in fo] for r in recs]
+        frame = pd.DataFrame(rows, columns=fo)
+        stages = {
+            "json_parse": lambda: json.loads(body),
+            "dataframe_build": lambda: pd.DataFrame(rows, columns=fo),
+        }
+        if hasattr(model, "steps"):
+            preproc, est = model[:-1], model[-1]
+            Xt = preproc.transform(frame)
+            stages["preproc_transform"] = lambda: preproc.transform(frame)
+            stages["estimator_predict"] = lambda: est.predict(Xt)
+        stages["pipeline_predict"] = lambda: model.predict(frame)
+        compiled = getattr(api, "compiled", None)
+        if compiled is not None:
+            stages["compiled_predict"] = lambda: compiled.predict(rows)
+        preds = model.predict(frame).tolist()
+        with api.app.app_context():
+            stages["jsonify"] = lambda: api.jsonify({"prediction": preds})
+            out[label] = {"rows": len(recs), **{name: time_call(fn, repeat) for name, fn in stages.items()}}
+    return out
+
+
+def git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Load-test and micro-benchmark the flood / earthquake APIs.")
+    ap.add_argument("--service", choices=sorted(SERVICES), action="append")
+    ap.add_argument("--concurrency", default="1,8,32", help="comma-separated client counts")
+    ap.add_argument("--requests", type=int, default=1000, help="single-row requests per run")
+    ap.add_argument("--batch-size", type=int, default=100, help="rows per /batch request (0 = no batch traffic)")
+    ap.add_argument("--record", default=None, help="append generated traffic to this JSONL file")
+    ap.add_argument("--replay", default=None, help="replay traffic from a JSONL file instead of generating")
+    ap.add_argument("--server", default="flask", help="comma-separated: flask, asgi")
+    ap.add_argument("--cache", action="store_true", help="leave the APIs' prediction cache on (default: off)")
+    ap.add_argument("--micro-only", action="store_true", help="skip the HTTP load test")
+    ap.add_argument("--repeat", type=int, default=500, help="iterations per microbenchmark stage")
+    ap.add_argument("--out", default="bench_results.json")
+    args = ap.parse_args(argv)
+
+    results = {
+        "meta": {"timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                 "git_rev": git_rev(), "python": platform.python_version(), "host": platform.node(),
+                 "cpu_count": os.cpu_count(), "cache": args.cache},
+        "load": [], "micro": {},
+    }
+    levels = [int(c) for c in args.concurrency.split(",") if c]
+    env = None if args.cache else NO_CACHE_ENV
+
+    for service in args.service or sorted(SERVICES):
+        results["micro"][service] = micro_benchmarks(service, repeat=args.repeat)
+        if args.micro_only:
+            continue
+
+        # fresh traffic per level (seeded, so every server gets the same requests at a level)
+        traffic = {}
+        for i, c in enumerate(levels):
+            if args.replay:
+                traffic[c] = replay_traffic(args.replay, service, c)
+            else:
+                traffic[c] = build_requests(service, args.requests, args.batch_size, seed=i)
+                if args.record:
+                    record_traffic(args.record, service, traffic[c], c)
+
+        for server in [x for x in args.server.split(",") if x]:
+            for c in levels:
+                # a fresh process per level: nothing cached or warmed by the previous level
+                proc, port = start_server(service, server, env)
+                try:
+                    stats_by_endpoint = load_test(f"http://127.0.0.1:{port}", traffic[c], c)
+                finally:
+                    proc.terminate()
+                    proc.wait()
+                for endpoint, stats in stats_by_endpoint.items():
+                    results["load"].append({"service": service, "server": server, "endpoint": endpoint,
+                                            "concurrency": c, **stats})
+                    print(f"{server:<6}{endpoint:<28}c={c:<4}{stats['requests_per_s']:>9.1f} req/s  "
+                          f"p50 {stats['p50_ms']:.2f}ms  p95 {stats['p95_ms']:.2f}ms  "
+                          f"p99 {stats['p99_ms']:.2f}ms  cache hits {stats['cache_hit_rate']:.0%}  "
+                          f"errors {stats['errors']}")
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
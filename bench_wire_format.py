@@ -0,0 +1,134 @@
+# bench_wire_format.py — bytes on the wire and rows/s for JSON vs .npy vs Arrow batch bodies
+#
+#   python bench_wire_format.py                               # in-process Flask test client
+#   python bench_wire_format.py --rows 100000 --batch-size 5000
+#   python bench_wire_format.py --url http://127.0.0.1:5000    # against a running Flood API
+#
+# Each format sends the same synthetic flood rows to /predict_flood/batch and asks for the
+# same format back. Timings include client-side encoding and decoding, so they show what a
+# producer actually pays per row. Arrow is skipped when pyarrow is not installed.
+import argparse, io, json, time
+
+import numpy as np
+
+import bench_serving
+from wire_format import ARROW_MIME, JSON_MIME, NPY_MIME
+
+ROUTE = "/predict_flood/batch"
+
+
+def encode(fmt, X, feature_order):
+    """(body bytes, Content-Type) for a float matrix in feature_order."""
+    if fmt == "json":
+        records = [dict(zip(feature_order, row)) for row in X.tolist()]
+        return json.dumps(records).encode(), JSON_MIME
+    if fmt == "npy":
+        buf = io.BytesIO()
+        np.save(buf, X, allow_pickle=False)
+        return buf.getvalue(), NPY_MIME
+    import pyarrow as pa
+
+    table = pa.table({name: X[:, i] for i, name in enumerate(feature_order)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes(), ARROW_MIME
+
+
+def decode(fmt, raw):
+    if fmt == "json":
+        return np.asarray(json.loads(raw)["flood_predictions"], dtype=np.float64)
+    if fmt == "npy":
+        return np.load(io.BytesIO(raw), allow_pickle=False)
+    import pyarrow as pa
+
+    return pa.ipc.open_stream(pa.BufferReader(raw)).read_all().column(0).to_numpy()
+
+
+def make_poster(url):
+    """post(body, content_type) -> (status, response bytes) via HTTP or the in-process test client."""
+    if url:
+        import requests
+
+        session = requests.Session()
+
+        def post(body, content_type):
+            resp = session.post(url.rstrip("/") + ROUTE, data=body,
+                                headers={"Content-Type": content_type, "Accept": content_type})
+            return resp.status_code, resp.content
+        return post
+
+    import Flood_api_fixed as api
+
+    if api.model is None:
+        raise SystemExit(f"flood model not loaded:\n{api.model_load_err}")
+    client = api.app.test_client()
+
+    def post(body, content_type):
+        resp = client.post(ROUTE, data=body, headers={"Content-Type": content_type, "Accept": content_type})
+        return resp.status_code, resp.get_data()
+    return post
+
+
+def run(fmt, X, feature_order, batch_size, post):
+    req_bytes = resp_bytes = 0
+    preds = []
+    t0 = time.perf_counter()
+    for start in range(0, len(X), batch_size):
+        body, content_type = encode(fmt, X[start:start + batch_size], feature_order)
+        status, raw = post(body, content_type)
+        if status != 200:
+            raise RuntimeError(f"{fmt}: HTTP {status}: {raw[:500]!r}")
+        preds.append(decode(fmt, raw))
+        req_bytes += len(body)
+        resp_bytes += len(raw)
+    elapsed = time.perf_counter() - t0
+    return {
+        "format": fmt, "rows": len(X), "batch_size": batch_size, "elapsed_s": elapsed,
+        "rows_per_s": len(X) / elapsed if elapsed else None,
+        "request_bytes": req_bytes, "response_bytes": resp_bytes,
+        "request_bytes_per_row": req_bytes / len(X), "response_bytes_per_row": resp_bytes / len(X),
+    }, np.concatenate(preds)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Compare JSON, .npy and Arrow batch bodies on the Flood API.")
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--batch-size", type=int, default=1000)
+    ap.add_argument("--formats", default="json,npy,arrow")
+    ap.add_argument("--url", default=None, help="base URL of a running Flood API (default: in-process)")
+    ap.add_argument("--out", default="bench_wire_format.json")
+    args = ap.parse_args(argv)
+
+    feature_order = bench_serving.load_features("flood")
+    records = bench_serving.generate_records("flood", args.rows)
+    X = np.array([[r[k] for k in feature_order] for r in records], dtype=np.float64)
+    post = make_poster(args.url)
+
+    formats = [f for f in args.formats.split(",") if f]
+    if "arrow" in formats:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print("pyarrow not installed, skipping arrow")
+            formats.remove("arrow")
+
+    results, reference = [], None
+    for fmt in formats:
+        run(fmt, X[:args.batch_size], feature_order, args.batch_size, post)  # warm-up
+        stats, preds = run(fmt, X, feature_order, args.batch_size, post)
+        if reference is None:
+            reference = preds
+        stats["max_abs_diff_vs_first"] = float(np.max(np.abs(preds - reference)))
+        results.append(stats)
+        print(f"{fmt:<6}{stats['rows_per_s']:>12,.0f} rows/s  "
+              f"req {stats['request_bytes_per_row']:>7.1f} B/row  resp {stats['response_bytes_per_row']:>6.1f} B/row")
+
+    out = {"meta": {"git_rev": bench_serving.git_rev(), "url": args.url or "in-process"}, "results": results}
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(out, f, indent=2)
+    print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
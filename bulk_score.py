@@ -0,0 +1,177 @@
+# bulk_score.py — chunked, multi-process offline scoring of large CSV exports
+#
+# Usage:
+#   python bulk_score.py flood flood.csv Flood_Predictions.csv --chunksize 100000 --workers 4
+#   python bulk_score.py earthquake earthquake_1995-2023.csv eq_preds.parquet --format parquet
+#   python bulk_score.py flood big_export.csv.gz preds.csv --resume
+#
+# The input is streamed with pd.read_csv(chunksize=...), chunks are scored in a process pool
+# (each worker loads the model once, same loader as the APIs) and written back in input order.
+# At most `--max-inflight` chunks are held in memory. A progress file next to the output
+# records the last completed chunk so an interrupted run can continue with --resume.
+import argparse, json, os, sys, time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from artifacts import load_artifact
+from data_prep import normalize_columns
+
+MODELS = {
+    "flood": {
+        "model_path": "flood_model.pkl",
+        "feature_path": "feature_order_flood.json",
+        "prediction_col": "Predicted_FloodProbability",
+    },
+    "earthquake": {
+        "model_path": "Earthquake_model.pkl",
+        "feature_path": "feature_order_earthquake.json",
+        "prediction_col": "Predicted_Tsunami",
+    },
+}
+
+# per-worker state, filled by _init_worker
+_model = None
+_feature_order = None
+
+
+def _init_worker(kind, model_path, feature_path):
+    global _model, _feature_order
+    _model, _feature_order, _ = load_artifact(model_path, feature_path)
+    if kind == "flood":
+        try:
+            from flood_compiled import compile_flood_pipeline, check_equivalence
+
+            fast = compile_flood_pipeline(_model, _feature_order)
+            check_equivalence(_model, fast)
+            _model = fast
+        except Exception:
+            pass  # fall back to the sklearn pipeline
+
+
+def _score_chunk(chunk, first_row, prediction_col, include_input):
+    chunk.columns = normalize_columns(chunk.columns)
+    preds = _model.predict(chunk[_feature_order])
+    out = chunk if include_input else pd.DataFrame(index=chunk.index)
+    out.insert(0, "row", range(first_row, first_row + len(chunk)))
+    out[prediction_col] = preds
+    return out.reset_index(drop=True)
+
+
+class Progress:
+    """Checkpoint of completed chunks, written atomically next to the output."""
+
+    def __init__(self, path, input_path, chunksize):
+        self.path = path
+        self.state = {"input": os.path.abspath(input_path), "chunksize": chunksize,
+                      "chunks_done": 0, "rows_done": 0, "output_bytes": 0}
+
+    def load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        for k in ("input", "chunksize"):
+            if saved.get(k) != self.state[k]:
+                raise SystemExit(f"--resume: {k} differs from the interrupted run ({saved.get(k)!r})")
+        self.state = saved
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.path)
+
+
+def _write(out, output, fmt, chunk_index, progress):
+    if fmt == "parquet":
+        os.makedirs(output, exist_ok=True)
+        out.to_parquet(os.path.join(output, f"part-{chunk_index:05d}.parquet"), index=False)
+    else:
+        header = progress.state["output_bytes"] == 0
+        with open(output, "a", encoding="utf-8", newline="") as f:
+            out.to_csv(f, index=False, header=header)
+            f.flush()
+            progress.state["output_bytes"] = f.tell()
+    progress.state["chunks_done"] = chunk_index + 1
+    progress.state["rows_done"] += len(out)
+    progress.save()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Score a large CSV with the flood or earthquake model.")
+    ap.add_argument("kind", choices=sorted(MODELS))
+    ap.add_argument("input", help="input CSV (may be compressed, e.g. .csv.gz)")
+    ap.add_argument("output", help="output .csv file, or directory of part files for --format parquet")
+    ap.add_argument("--format", choices=["csv", "parquet"], default=None,
+                    help="output format (default: from the output extension)")
+    ap.add_argument("--chunksize", type=int, default=100_000)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--max-inflight", type=int, default=None,
+                    help="chunks queued or in memory at once (default: 2 x workers)")
+    ap.add_argument("--model-path", default=None)
+    ap.add_argument("--feature-path", default=None)
+    ap.add_argument("--include-input", action="store_true", help="copy input columns into the output")
+    ap.add_argument("--resume", action="store_true", help="continue after the last completed chunk")
+    args = ap.parse_args(argv)
+
+    cfg = MODELS[args.kind]
+    model_path = args.model_path or cfg["model_path"]
+    feature_path = args.feature_path or cfg["feature_path"]
+    fmt = args.format or ("parquet" if args.output.endswith(".parquet") else "csv")
+    max_inflight = args.max_inflight or 2 * args.workers
+
+    with open(feature_path, "r", encoding="utf-8") as f:
+        feature_order = json.load(f)
+    header = normalize_columns(pd.read_csv(args.input, nrows=0).columns)
+    missing = [c for c in feature_order if c not in header]
+    if missing:
+        raise SystemExit(f"Input is missing feature columns: {missing}")
+
+    progress = Progress(args.output + ".progress.json", args.input, args.chunksize)
+    if args.resume and os.path.exists(progress.path):
+        progress.load()
+        if fmt == "csv" and os.path.exists(args.output):
+            # drop anything written after the last checkpoint
+            with open(args.output, "r+b") as f:
+                f.truncate(progress.state["output_bytes"])
+        print(f"Resuming after chunk {progress.state['chunks_done']} "
+              f"({progress.state['rows_done']:,} rows)", file=sys.stderr)
+    elif fmt == "csv" and os.path.exists(args.output):
+        os.remove(args.output)
+
+    start_chunk = progress.state["chunks_done"]
+    first_row = progress.state["rows_done"]
+    skip = range(1, first_row + 1) if first_row else None
+    reader = pd.read_csv(args.input, chunksize=args.chunksize, skiprows=skip, low_memory=False)
+
+    t0 = time.perf_counter()
+    rows_this_run = 0
+
+    def drain(fut, chunk_index):
+        nonlocal rows_this_run
+        out = fut.result()
+        _write(out, args.output, fmt, chunk_index, progress)
+        rows_this_run += len(out)
+        elapsed = time.perf_counter() - t0
+        print(f"chunk {chunk_index}: {progress.state['rows_done']:,} rows done, "
+              f"{rows_this_run / elapsed:,.0f} rows/s", file=sys.stderr)
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(args.kind, model_path, feature_path)) as pool:
+        pending = deque()
+        for chunk_index, chunk in enumerate(reader, start=start_chunk):
+            pending.append((pool.submit(_score_chunk, chunk, first_row, cfg["prediction_col"], args.include_input),
+                            chunk_index))
+            first_row += len(chunk)
+            if len(pending) >= max_inflight:
+                drain(*pending.popleft())
+        while pending:
+            drain(*pending.popleft())
+
+    elapsed = time.perf_counter() - t0
+    print(f"Scored {rows_this_run:,} rows in {elapsed:.1f}s "
+          f"({rows_this_run / elapsed if elapsed else 0:,.0f} rows/s) -> {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
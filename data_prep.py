@@ -0,0 +1,135 @@
+# data_prep.py — shared load + clean step for the training scripts, with an on-disk cache
+#
+# load_clean() reads a training CSV with compact dtypes, imputes and (optionally) winsorizes
+# every numeric column in one vectorized pass, and stores the cleaned frame under
+# DATA_PREP_CACHE_DIR keyed by the sha256 of the CSV plus the cleaning parameters. A rerun on
+# the same file with the same parameters reads the cached frame instead of re-parsing the CSV.
+#
+#   DATA_PREP_CACHE=0          always re-parse (nothing read from or written to the cache)
+#   DATA_PREP_CACHE_DIR=dir    cache location (default .prep_cache)
+#
+# The cache is Parquet when pyarrow is installed, otherwise a pandas pickle; both keep the
+# compact dtypes. Delete the directory to clear it.
+import hashlib, json, os, time
+
+import numpy as np
+import pandas as pd
+
+from artifacts import file_sha256
+
+USE_CACHE = os.environ.get("DATA_PREP_CACHE", "1") == "1"
+CACHE_DIR = os.environ.get("DATA_PREP_CACHE_DIR", ".prep_cache")
+
+# bump when the cleaning logic changes so old cache entries are ignored
+PREP_VERSION = 1
+
+
+def normalize_columns(columns):
+    """Same column-name normalisation the training scripts and bulk_score.py apply."""
+    return [c.strip().replace(" ", "_") for c in columns]
+
+
+def _read(path, feature_dtype, exclude):
+    """read_csv with feature_dtype for every column not in exclude (names after normalisation)."""
+    dtype = None
+    if feature_dtype is not None:
+        raw = pd.read_csv(path, nrows=0).columns
+        dtype = {r: feature_dtype for r, c in zip(raw, normalize_columns(raw)) if c not in exclude}
+    df = pd.read_csv(path, dtype=dtype, low_memory=False)
+    df.columns = normalize_columns(df.columns)
+    return df
+
+
+def downcast_integral(df, cols):
+    """Store numeric columns whose values are all whole numbers as the smallest int type.
+
+    Lossless: columns with NaN or fractional values are left alone.
+    """
+    for c in cols:
+        s = df[c]
+        if s.dtype.kind == "f" and not s.isna().any() and np.array_equal(s, np.round(s)):
+            df[c] = pd.to_numeric(s, downcast="integer")
+        elif s.dtype.kind in "iu":
+            df[c] = pd.to_numeric(s, downcast="integer")
+    return df
+
+
+def clean(df, exclude=(), mode_cols=None, winsorize=False, iqr_k=1.5):
+    """Impute (numeric median, categorical mode) and optionally IQR-clip, column-vectorized.
+
+    exclude: columns left untouched (usually the target).
+    mode_cols: categorical columns to fill with their mode (None = every non-numeric column).
+    winsorize: clip numeric columns to [Q1 - k*IQR, Q3 + k*IQR].
+    """
+    num_cols = [c for c in df.select_dtypes(include=[np.number]).columns if c not in exclude]
+    if mode_cols is None:
+        mode_cols = [c for c in df.select_dtypes(exclude=[np.number]).columns if c not in exclude]
+
+    if num_cols:
+        num = df[num_cols]
+        num = num.fillna(num.median())
+        if winsorize:
+            q = num.quantile([0.25, 0.75])
+            iqr = q.loc[0.75] - q.loc[0.25]
+            num = num.clip(q.loc[0.25] - iqr_k * iqr, q.loc[0.75] + iqr_k * iqr, axis=1)
+        df[num_cols] = num
+
+    for c in mode_cols:
+        if c in df.columns:
+            mode = df[c].mode()
+            df[c] = df[c].fillna(mode.iloc[0] if not mode.empty else "missing")
+
+    return downcast_integral(df, num_cols)
+
+
+def _cache_path(path, params):
+    key = hashlib.sha256(json.dumps({"source": file_sha256(path), "version": PREP_VERSION, **params},
+                                    sort_keys=True).encode()).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(CACHE_DIR, f"{stem}-{key}")
+
+
+def _parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def load_clean(path, exclude=(), mode_cols=None, winsorize=False, iqr_k=1.5, feature_dtype=None, use_cache=None):
+    """Load and clean a training CSV, reusing the cached result when the inputs are unchanged.
+
+    feature_dtype: parse every column not in exclude with this dtype (e.g. "float32" for the
+    all-numeric flood scores); otherwise pandas infers, and whole-number columns are
+    downcast after cleaning. Returns (df, info) where info has the cache status, cache file,
+    elapsed seconds and in-memory size of the frame.
+    """
+    use_cache = USE_CACHE if use_cache is None else use_cache
+    params = {"exclude": sorted(exclude), "mode_cols": None if mode_cols is None else list(mode_cols),
+              "winsorize": winsorize, "iqr_k": iqr_k, "feature_dtype": feature_dtype}
+    t0 = time.perf_counter()
+    base = _cache_path(path, params) if use_cache else None
+    fmt = "parquet" if _parquet_available() else "pkl"
+    cache_file = f"{base}.{fmt}" if base else None
+
+    if cache_file and os.path.exists(cache_file):
+        df = pd.read_parquet(cache_file) if fmt == "parquet" else pd.read_pickle(cache_file)
+        status = "hit"
+    else:
+        df = clean(_read(path, feature_dtype, set(exclude)), exclude, mode_cols, winsorize, iqr_k)
+        status = "off"
+        if cache_file:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp = cache_file + ".tmp"
+            if fmt == "parquet":
+                df.to_parquet(tmp, index=False)
+            else:
+                df.to_pickle(tmp)
+            os.replace(tmp, cache_file)
+            status = "miss"
+
+    return df, {
+        "cache": status, "cache_file": cache_file, "seconds": time.perf_counter() - t0,
+        "memory_bytes": int(df.memory_usage(deep=True).sum()),
+    }
@@ -0,0 +1,290 @@
+# drift.py — constant-memory input-drift sketches for the serving APIs
+#
+# The training scripts summarise the training features into a reference file next to the
+# model (flood_model.drift.json / Earthquake_model.drift.json). The APIs keep empty copies of
+# the same sketches, feed every scored row into them, and compare against the reference on
+# GET /drift with the population stability index (PSI) per feature:
+#
+#   Histogram     fixed bins (bounded flood scores) or bins at the reference quantiles
+#                 (earthquake magnitude / depth / sig); counts per bin + missing
+#   HeavyHitters  SpaceSaving top-k counts for categoricals (fixed capacity)
+#
+# Memory is fixed by the bin count / capacity, whatever the traffic. Rows are buffered and
+# folded into the sketches FLUSH_ROWS at a time with vectorized NumPy, so a request only
+# pays for a list append.
+import json, math, os, threading
+
+import numpy as np
+
+FLUSH_ROWS = int(os.environ.get("DRIFT_FLUSH_ROWS", "256"))
+MIN_ROWS = int(os.environ.get("DRIFT_MIN_ROWS", "500"))   # live rows before a status is given
+
+# conventional PSI bands: < 0.1 stable, 0.1-0.25 moderate shift, > 0.25 significant shift
+PSI_WARN = 0.1
+PSI_ALERT = 0.25
+
+FORMAT_VERSION = 1
+
+
+def reference_path(model_path):
+    """flood_model.pkl -> flood_model.drift.json"""
+    return os.path.splitext(model_path)[0] + ".drift.json"
+
+
+def _to_float(values):
+    """float64 array; anything that isn't a number becomes NaN."""
+    try:
+        return np.asarray(values, dtype=np.float64).ravel()
+    except (TypeError, ValueError):
+        out = np.empty(len(values))
+        for i, v in enumerate(values):
+            try:
+                out[i] = float(v)
+            except (TypeError, ValueError):
+                out[i] = np.nan
+        return out
+
+
+def psi(expected, actual, eps=1e-4):
+    """Population stability index between two count vectors over the same buckets."""
+    p = np.asarray(expected, dtype=np.float64)
+    q = np.asarray(actual, dtype=np.float64)
+    if p.sum() == 0 or q.sum() == 0:
+        return None
+    p = np.maximum(p / p.sum(), eps)
+    q = np.maximum(q / q.sum(), eps)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+class Histogram:
+    """Counts per bin for a numeric feature; bin i holds edges[i-1] <= v < edges[i].
+
+    Bin 0 and the last bin catch values outside the edges, so nothing is dropped.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, edges, counts=None, missing=0, kind=None):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.counts = np.zeros(len(self.edges) + 1, dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+        self.missing = int(missing)
+        if kind:
+            self.kind = kind
+
+    @classmethod
+    def fixed(cls, lo, hi, width=1.0):
+        """Equal-width bins centred on lo, lo + width, ..., hi (one per integer score by default)."""
+        return cls(np.arange(lo - width / 2, hi + width, width))
+
+    @classmethod
+    def quantiles(cls, values, n_bins=20):
+        """Bins at the n_bins-quantiles of the reference values (roughly equal mass each)."""
+        v = _to_float(values)
+        v = v[~np.isnan(v)]
+        edges = np.unique(np.quantile(v, np.linspace(0, 1, n_bins + 1)[1:-1])) if len(v) else []
+        return cls(edges, kind="quantile")
+
+    def update(self, values):
+        v = _to_float(values)
+        nan = np.isnan(v)
+        self.missing += int(nan.sum())
+        idx = np.searchsorted(self.edges, v[~nan], side="right")
+        self.counts += np.bincount(idx, minlength=len(self.counts))
+
+    def empty_copy(self):
+        return Histogram(self.edges, kind=self.kind)
+
+    def rows(self):
+        return int(self.counts.sum()) + self.missing
+
+    def compare(self, live):
+        return psi(np.append(self.counts, self.missing), np.append(live.counts, live.missing))
+
+    def to_dict(self):
+        return {"kind": self.kind, "edges": self.edges.tolist(), "counts": self.counts.tolist(), "missing": self.missing}
+
+
+class HeavyHitters:
+    """SpaceSaving top-k counter: at most `capacity` values tracked, counts over-estimate by
+    at most rows / capacity. Exact while a feature has no more than `capacity` distinct values."""
+
+    kind = "heavy_hitters"
+
+    def __init__(self, capacity=64, counts=None, missing=0, total=0):
+        self.capacity = capacity
+        self.counts = dict(counts or {})
+        self.missing = int(missing)
+        self.total = int(total)
+
+    def update(self, values):
+        c = self.counts
+        for v in values:
+            if v is None or (isinstance(v, float) and v != v) or (isinstance(v, str) and not v):
+                self.missing += 1
+                continue
+            v = str(v)
+            self.total += 1
+            if v in c:
+                c[v] += 1
+            elif len(c) < self.capacity:
+                c[v] = 1
+            else:
+                # replace the smallest counter and inherit its count (SpaceSaving)
+                smallest = min(c, key=c.get)
+                c[v] = c.pop(smallest) + 1
+
+    def empty_copy(self):
+        return HeavyHitters(self.capacity)
+
+    def rows(self):
+        return self.total + self.missing
+
+    def _buckets(self, keys):
+        counts = [self.counts.get(k, 0) for k in keys]
+        return counts + [max(0, self.total - sum(counts)), self.missing]
+
+    def compare(self, live):
+        # buckets: the reference's tracked values, "everything else", missing
+        keys = sorted(self.counts)
+        return psi(self._buckets(keys), live._buckets(keys))
+
+    def unseen(self, live, top=5):
+        """Live heavy hitters the reference never tracked (new categories)."""
+        new = sorted(((n, k) for k, n in live.counts.items() if k not in self.counts), reverse=True)
+        return [k for _, k in new[:top]]
+
+    def to_dict(self):
+        return {"kind": self.kind, "capacity": self.capacity, "counts": self.counts,
+                "missing": self.missing, "total": self.total}
+
+
+def _sketch_from_dict(d):
+    d = dict(d)
+    kind = d.pop("kind")
+    if kind == HeavyHitters.kind:
+        return HeavyHitters(**d)
+    return Histogram(kind=kind, **d)
+
+
+class DriftMonitor:
+    """Per-feature sketches plus the row buffer; thread-safe.
+
+    feature_order maps the positions of observed rows to feature names.
+    """
+
+    def __init__(self, sketches, feature_order, reference=None):
+        self.sketches = sketches
+        self.reference = reference
+        self.feature_order = list(feature_order)
+        self._pos = {name: self.feature_order.index(name) for name in sketches if name in self.feature_order}
+        self._pending = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_reference(cls, reference, feature_order):
+        """Empty live monitor with the same bins / capacities as a reference monitor."""
+        return cls({k: s.empty_copy() for k, s in reference.sketches.items()}, feature_order, reference)
+
+    def observe(self, rows):
+        """Record rows given as lists in feature_order (no conversion on the request path)."""
+        with self._lock:
+            self._pending.extend(rows)
+            if len(self._pending) >= FLUSH_ROWS:
+                self._flush()
+
+    def observe_columns(self, columns):
+        """Record a columnar batch: a mapping (dict, DataFrame) of feature name -> values."""
+        with self._lock:
+            for name, sketch in self.sketches.items():
+                if name in columns:
+                    sketch.update(columns[name])
+
+    def _flush(self):
+        rows, self._pending = self._pending, []
+        if not rows:
+            return
+        for name, sketch in self.sketches.items():
+            i = self._pos.get(name)
+            if i is not None:
+                sketch.update([r[i] for r in rows])
+
+    def reset(self):
+        with self._lock:
+            self._pending = []
+            for name in self.sketches:
+                self.sketches[name] = self.sketches[name].empty_copy()
+
+    def report(self):
+        """Per-feature PSI against the reference, with a stable / moderate / significant status."""
+        with self._lock:
+            self._flush()
+            features = {}
+            for name, live in self.sketches.items():
+                ref = self.reference.sketches.get(name) if self.reference is not None else None
+                n = live.rows()
+                entry = {"kind": live.kind, "rows": n,
+                         "missing_rate": round(live.missing / n, 6) if n else None}
+                score = ref.compare(live) if ref is not None else None
+                entry["psi"] = None if score is None else round(score, 6)
+                if score is None or n < MIN_ROWS:
+                    entry["status"] = "insufficient_data"
+                else:
+                    entry["status"] = "significant" if score > PSI_ALERT else ("moderate" if score > PSI_WARN else "stable")
+                if isinstance(live, HeavyHitters) and ref is not None:
+                    entry["unseen"] = ref.unseen(live)
+                features[name] = entry
+        scored = [f["psi"] for f in features.values() if f["status"] != "insufficient_data"]
+        return {
+            "rows": max((f["rows"] for f in features.values()), default=0),
+            "max_psi": max(scored) if scored else None,
+            "drifted": sorted(k for k, f in features.items() if f["status"] == "significant"),
+            "thresholds": {"moderate": PSI_WARN, "significant": PSI_ALERT, "min_rows": MIN_ROWS},
+            "features": features,
+        }
+
+    def to_dict(self):
+        with self._lock:
+            self._flush()
+            return {"format_version": FORMAT_VERSION, "feature_order": self.feature_order,
+                    "sketches": {k: s.to_dict() for k, s in self.sketches.items()}}
+
+
+def build_reference(df, histograms=(), quantiles=(), categoricals=(), n_quantiles=20, capacity=64):
+    """Reference sketches over a training frame.
+
+    histograms: bounded numeric columns, one unit-width bin per value between min and max.
+    quantiles: unbounded numeric columns, n_quantiles bins at the training quantiles.
+    categoricals: SpaceSaving heavy hitters with `capacity` counters.
+    """
+    sketches = {}
+    for c in histograms:
+        v = _to_float(df[c])
+        v = v[~np.isnan(v)]
+        sketches[c] = Histogram.fixed(math.floor(v.min()), math.ceil(v.max())) if len(v) else Histogram([])
+    for c in quantiles:
+        sketches[c] = Histogram.quantiles(df[c], n_quantiles)
+    for c in categoricals:
+        sketches[c] = HeavyHitters(capacity)
+    monitor = DriftMonitor(sketches, list(df.columns))
+    monitor.observe_columns({c: df[c].tolist() if c in categoricals else df[c].to_numpy() for c in sketches})
+    return monitor
+
+
+def save_reference(monitor, path):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(monitor.to_dict(), f)
+    os.replace(tmp, path)
+    return path
+
+
+def load_monitor(path, feature_order):
+    """Live DriftMonitor for feature_order against the reference at path, or None if absent."""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"{path}: unsupported drift reference format {data.get('format_version')!r}")
+    reference = DriftMonitor({k: _sketch_from_dict(d) for k, d in data["sketches"].items()}, data["feature_order"])
+    return DriftMonitor.from_reference(reference, feature_order)
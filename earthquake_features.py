@@ -0,0 +1,70 @@
+# earthquake_features.py — feature helpers referenced by the pickled earthquake pipeline
+#
+# Kept in its own module (like Pipeline.py) so Earthquake_model.pkl can be unpickled by the
+# API without importing the training script.
+import zlib
+
+import numpy as np
+import pandas as pd
+
+DATE_COL = "date_time"
+DATE_FORMAT = "%d-%m-%Y %H:%M"
+DATE_PARTS = ["year", "month", "day", "hour"]
+
+# near-unique free text: title repeats magnitude + location, so it is dropped outright;
+# location is hashed into a fixed number of buckets and treated as a categorical
+DROP_TEXT_COLS = ["title"]
+HASH_TEXT_COLS = ["location"]
+N_HASH_BUCKETS = 64
+
+
+def stable_hash_bucket(value, n_buckets=N_HASH_BUCKETS):
+    """Bucket a string with crc32 (Python's hash() is salted per process)."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return np.nan
+    return zlib.crc32(str(value).encode("utf-8")) % n_buckets
+
+
+def compact_features(X, num_cols, cat_cols, hash_cols, n_hash_buckets=N_HASH_BUCKETS):
+    """Raw earthquake frame -> compact frame for the ordinal/native-categorical pipeline.
+
+    date_time becomes numeric year/month/day/hour, hash_cols become crc32 buckets,
+    cat_cols stay as strings (missing -> NaN) and everything else listed in num_cols is
+    coerced to float. Columns not listed (e.g. title) are dropped.
+    """
+    out = {}
+    for c in num_cols:
+        if c in DATE_PARTS:
+            continue
+        out[c] = pd.to_numeric(X[c], errors="coerce") if c in X else np.nan
+
+    if DATE_COL in X:
+        ts = pd.to_datetime(X[DATE_COL], format=DATE_FORMAT, errors="coerce")
+        out["year"] = ts.dt.year.astype(float)
+        out["month"] = ts.dt.month.astype(float)
+        out["day"] = ts.dt.day.astype(float)
+        out["hour"] = ts.dt.hour.astype(float)
+    else:
+        for part in DATE_PARTS:
+            out[part] = np.nan
+
+    for c in hash_cols:
+        col = X[c] if c in X else pd.Series([None] * len(X), index=X.index)
+        out[c] = col.map(lambda v: stable_hash_bucket(v, n_hash_buckets)).astype(float)
+
+    for c in cat_cols:
+        col = X[c] if c in X else pd.Series([None] * len(X), index=X.index)
+        col = col.astype(object)
+        out[c] = col.where(col.notna() & (col != ""), np.nan)
+
+    return pd.DataFrame(out, index=X.index)
+
+
+def compact_column_groups(X):
+    """Split a raw training frame into (num_cols, cat_cols, hash_cols) for compact_features."""
+    num_cols = [c for c in X.select_dtypes(include=[np.number]).columns if c != DATE_COL]
+    num_cols += DATE_PARTS
+    hash_cols = [c for c in HASH_TEXT_COLS if c in X.columns]
+    skip = set(DROP_TEXT_COLS) | set(hash_cols) | {DATE_COL}
+    cat_cols = [c for c in X.select_dtypes(exclude=[np.number]).columns if c not in skip]
+    return num_cols, cat_cols, hash_cols
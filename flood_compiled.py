@@ -0,0 +1,228 @@
+# flood_compiled.py — pandas-free inference for the fitted flood pipeline
+#
+# Flood_prediction.py saves Pipeline([("preproc", ColumnTransformer), ("rf", RandomForestRegressor)])
+# where every feature is numeric (median SimpleImputer -> StandardScaler). This module flattens
+# that into plain NumPy arrays: imputer medians, scaler mean/scale, and all trees packed into
+# one set of contiguous node arrays, so a prediction is a float64 fill plus an array traversal.
+import numpy as np
+
+LEAF = -1  # sklearn's TREE_LEAF marker in children_left / children_right
+CHUNK_ROWS = 4096  # rows traversed at once; bounds the (rows x trees) node-index arrays
+# Above this many rows sklearn's Cython traversal beats the per-depth NumPy loop (the measured
+# crossover is ~1,000 rows for the full forest and its variants), so callers should use the pipeline.
+MAX_ROWS = 512
+
+
+class CompiledFloodModel:
+    """Flat NumPy equivalent of the flood preprocessing + forest pipeline.
+
+    Outputs are bit-identical to a single-threaded `pipe.predict`: inputs are imputed and
+    scaled in float64, rounded to float32 like sklearn does before tree traversal, and tree
+    outputs are summed in estimator order before dividing by the number of trees.
+    (With n_jobs=-1 sklearn sums trees in thread completion order, so it can differ from
+    itself in the last ulp.)
+    """
+
+    def __init__(self, feature_order, columns, fill, mean, scale,
+                 left, right, feature, threshold, value, roots):
+        self.feature_order = list(feature_order)
+        self.columns = np.asarray(columns, dtype=np.intp)   # feature_order index for each model input
+        self.fill = np.asarray(fill, dtype=np.float64)      # imputer statistics_
+        self.mean = None if mean is None else np.asarray(mean, dtype=np.float64)
+        self.scale = None if scale is None else np.asarray(scale, dtype=np.float64)
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.value = value
+        self.roots = roots
+        self.n_trees = len(roots)
+
+    # ---- persistence ----
+    _ARRAYS = ("columns", "fill", "mean", "scale", "left", "right", "feature", "threshold", "value", "roots")
+
+    def to_state(self):
+        """Plain dict of NumPy arrays (+ feature_order) for saving with joblib.
+
+        Saved uncompressed, the arrays can be memory-mapped back with joblib.load(mmap_mode="r")
+        so every worker process shares one copy of the packed trees.
+        """
+        state = {name: getattr(self, name) for name in self._ARRAYS}
+        state["feature_order"] = list(self.feature_order)
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(state["feature_order"], *(state[name] for name in cls._ARRAYS))
+
+    # ---- input handling ----
+    def rows_to_array(self, rows):
+        """Convert rows (lists in feature_order, or a DataFrame) to a float64 matrix."""
+        if hasattr(rows, "columns"):
+            return rows[self.feature_order].to_numpy(dtype=np.float64)
+        X = np.asarray(rows, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        return X
+
+    # ---- pipeline stages ----
+    def transform(self, X):
+        """Impute + scale; equivalent of preproc.transform on a feature_order matrix."""
+        X = X[:, self.columns]  # fancy indexing copies, so the caller's array is untouched
+        nan = np.isnan(X)
+        if nan.any():
+            X[nan] = np.take(self.fill, np.nonzero(nan)[1])
+        if self.mean is not None:
+            X -= self.mean
+        if self.scale is not None:
+            X /= self.scale
+        return X
+
+    def _leaf_values(self, Xt):
+        n = Xt.shape[0]
+        T = self.n_trees
+        node = np.tile(self.roots, n)
+        row = np.repeat(np.arange(n), T)
+        active = np.flatnonzero(self.left[node] != LEAF)
+        while active.size:
+            nd = node[active]
+            go_left = Xt[row[active], self.feature[nd]] <= self.threshold[nd]
+            nd = np.where(go_left, self.left[nd], self.right[nd])
+            node[active] = nd
+            active = active[self.left[nd] != LEAF]
+        return self.value[node].reshape(n, T)
+
+    def predict_transformed(self, Xt, chunk_rows=CHUNK_ROWS):
+        """Forest prediction on an already preprocessed matrix."""
+        # sklearn traverses trees on float32 inputs compared against float64 thresholds
+        Xt = Xt.astype(np.float32).astype(np.float64)
+        out = np.empty(Xt.shape[0], dtype=np.float64)
+        for start in range(0, Xt.shape[0], chunk_rows):
+            leaves = self._leaf_values(Xt[start:start + chunk_rows])
+            acc = np.zeros(leaves.shape[0], dtype=np.float64)
+            for t in range(self.n_trees):
+                acc += leaves[:, t]
+            out[start:start + chunk_rows] = acc / self.n_trees
+        return out
+
+    def predict(self, X):
+        """Drop-in for pipe.predict: accepts a DataFrame, list of rows or 2-D array."""
+        return self.predict_transformed(self.transform(self.rows_to_array(X)))
+
+
+def _unsupported(msg):
+    return ValueError(f"cannot compile flood pipeline: {msg}")
+
+
+def _numeric_steps(trans):
+    """Return (imputer, scaler) from a num pipeline, allowing either step to be absent."""
+    steps = [est for _, est in trans.steps] if hasattr(trans, "steps") else [trans]
+    imputer = scaler = None
+    for est in steps:
+        kind = type(est).__name__
+        if kind == "SimpleImputer" and imputer is None and scaler is None:
+            if getattr(est, "add_indicator", False):
+                raise _unsupported("SimpleImputer with add_indicator")
+            if not (isinstance(est.missing_values, float) and np.isnan(est.missing_values)):
+                raise _unsupported("SimpleImputer with non-NaN missing_values")
+            imputer = est
+        elif kind == "StandardScaler" and scaler is None:
+            scaler = est
+        elif est == "passthrough" or est is None:
+            continue
+        else:
+            raise _unsupported(f"unsupported preprocessing step {kind}")
+    return imputer, scaler
+
+
+def compile_flood_pipeline(pipe, feature_order):
+    """Compile a fitted Pipeline(ColumnTransformer, forest regressor) into a CompiledFloodModel.
+
+    Raises ValueError if the pipeline contains anything this module cannot reproduce exactly
+    (categorical columns, other transformers, non-tree estimators, multi-output targets).
+    """
+    if not hasattr(pipe, "steps") or len(pipe.steps) != 2:
+        raise _unsupported("expected Pipeline([preproc, forest])")
+    preproc, forest = pipe.steps[0][1], pipe.steps[1][1]
+
+    columns, fill, mean, scale = [], [], [], []
+    any_mean = any_scale = False
+    for name, trans, cols in getattr(preproc, "transformers_", []):
+        if trans == "drop" or len(cols) == 0:
+            continue
+        if name == "remainder" and trans == "passthrough":
+            raise _unsupported("remainder='passthrough'")
+        if trans == "passthrough":
+            imputer, scaler = None, None
+        else:
+            imputer, scaler = _numeric_steps(trans)
+        idx = [c if isinstance(c, (int, np.integer)) else feature_order.index(c) for c in cols]
+        n = len(idx)
+        stats = np.full(n, np.nan) if imputer is None else np.asarray(imputer.statistics_, dtype=np.float64)
+        if np.isnan(stats).any() and imputer is not None:
+            raise _unsupported("imputer dropped an all-missing column")
+        has_mean = scaler is not None and scaler.mean_ is not None and scaler.with_mean
+        has_scale = scaler is not None and scaler.scale_ is not None and scaler.with_std
+        any_mean |= bool(has_mean)
+        any_scale |= bool(has_scale)
+        columns.extend(idx)
+        fill.extend(stats)
+        mean.extend(scaler.mean_ if has_mean else np.zeros(n))
+        scale.extend(scaler.scale_ if has_scale else np.ones(n))
+    if not columns:
+        raise _unsupported("no numeric columns found in preprocessor")
+
+    estimators = getattr(forest, "estimators_", None)
+    if estimators is None and hasattr(forest, "tree_"):
+        estimators = [forest]
+    if not estimators or not all(hasattr(e, "tree_") for e in estimators):
+        raise _unsupported(f"final step {type(forest).__name__} is not a tree ensemble")
+    if getattr(forest, "n_outputs_", 1) != 1:
+        raise _unsupported("multi-output regressor")
+
+    lefts, rights, feats, thresholds, values, roots = [], [], [], [], [], []
+    offset = 0
+    for est in estimators:
+        t = est.tree_
+        left = t.children_left.astype(np.int64)
+        right = t.children_right.astype(np.int64)
+        is_leaf = left == LEAF
+        lefts.append(np.where(is_leaf, LEAF, left + offset))
+        rights.append(np.where(is_leaf, LEAF, right + offset))
+        feats.append(np.where(is_leaf, 0, t.feature).astype(np.intp))
+        thresholds.append(t.threshold.astype(np.float64))
+        values.append(t.value[:, 0, 0].astype(np.float64))
+        roots.append(offset)
+        offset += t.node_count
+
+    return CompiledFloodModel(
+        feature_order, columns, fill,
+        np.asarray(mean) if any_mean else None,
+        np.asarray(scale) if any_scale else None,
+        np.concatenate(lefts), np.concatenate(rights), np.concatenate(feats),
+        np.concatenate(thresholds), np.concatenate(values), np.asarray(roots, dtype=np.int64),
+    )
+
+
+def check_equivalence(pipe, compiled, n_rows=64, seed=0, atol=1e-12):
+    """Compare compiled vs pipe.predict on synthetic rows around the training distribution.
+
+    Rows are drawn from the scaler's mean/scale, rounded to integer scores, with a few NaNs
+    to exercise imputation. Returns the max absolute difference; raises ValueError above atol.
+    """
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    d = len(compiled.feature_order)
+    mean = np.zeros(d)
+    scale = np.ones(d)
+    mean[compiled.columns] = compiled.mean if compiled.mean is not None else 0.0
+    scale[compiled.columns] = compiled.scale if compiled.scale is not None else 1.0
+    X = np.round(mean + scale * rng.standard_normal((n_rows, d)))
+    X[rng.random((n_rows, d)) < 0.05] = np.nan
+    frame = pd.DataFrame(X, columns=compiled.feature_order)
+
+    diff = float(np.max(np.abs(np.asarray(pipe.predict(frame), dtype=np.float64) - compiled.predict(X))))
+    if diff > atol:
+        raise ValueError(f"compiled flood model disagrees with pipeline (max abs diff {diff:g})")
+    return diff
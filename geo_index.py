@@ -0,0 +1,137 @@
+# geo_index.py — spatial index over the historical earthquake catalogue
+#
+# EarthQuake_detection.py builds an EventIndex over earthquake_1995-2023.csv and stores it in
+# Earthquake_model.pkl under "geo_index"; the API answers k-nearest queries from it without
+# scanning the catalogue. NeighbourFeatures turns the same lookup into engineered features
+# for the pipeline. Kept in its own module (like earthquake_features.py) so the pickled
+# artifact can be loaded without importing the training script.
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.neighbors import BallTree
+
+EARTH_RADIUS_KM = 6371.0088
+
+# extra columns appended by NeighbourFeatures (numeric, so both pipelines treat them as such)
+NEIGHBOUR_COLS = ["nb_tsunami_rate", "nb_mean_magnitude", "nb_mean_km"]
+
+
+def _missing_to_none(value):
+    """NaN / NaT (missing catalogue text) -> None, so results stay valid JSON."""
+    return None if pd.isna(value) else value
+
+
+def _coords(lat, lon):
+    """(n, 2) float array of [lat, lon] in radians; unparseable values become NaN."""
+    lat = pd.to_numeric(pd.Series(np.asarray(lat, dtype=object).ravel()), errors="coerce").to_numpy(float)
+    lon = pd.to_numeric(pd.Series(np.asarray(lon, dtype=object).ravel()), errors="coerce").to_numpy(float)
+    return np.radians(np.column_stack([lat, lon]))
+
+
+class EventIndex:
+    """Ball tree (haversine metric) over historical events, plus the per-event values we report.
+
+    Query cost is O(log n) per point, so a single lookup is well under a millisecond.
+    """
+
+    def __init__(self, lat, lon, tsunami, magnitude, title=None, date_time=None, leaf_size=40):
+        coords = _coords(lat, lon)
+        keep = ~np.isnan(coords).any(axis=1)
+        self.tree = BallTree(coords[keep], metric="haversine", leaf_size=leaf_size)
+        self.latitude = np.degrees(coords[keep, 0])
+        self.longitude = np.degrees(coords[keep, 1])
+        self.tsunami = np.asarray(tsunami, dtype=np.int8)[keep]
+        self.magnitude = np.asarray(magnitude, dtype=np.float32)[keep]
+        self.title = None if title is None else np.asarray(title, dtype=object)[keep]
+        self.date_time = None if date_time is None else np.asarray(date_time, dtype=object)[keep]
+        self.row = np.flatnonzero(keep)   # position of each indexed event in the input
+
+    @classmethod
+    def from_frame(cls, df, target="tsunami"):
+        """Index a cleaned catalogue frame (data_prep.load_clean output)."""
+        return cls(df["latitude"], df["longitude"], df[target], df["magnitude"],
+                   title=df.get("title"), date_time=df.get("date_time"))
+
+    def __len__(self):
+        return len(self.tsunami)
+
+    def query(self, lat, lon, k):
+        """(distance_km, index) arrays of shape (n, k); rows with missing coordinates get -1 / NaN."""
+        coords = _coords(lat, lon)
+        k = min(k, len(self))
+        dist = np.full((len(coords), k), np.nan)
+        idx = np.full((len(coords), k), -1, dtype=np.int64)
+        ok = ~np.isnan(coords).any(axis=1)
+        if ok.any():
+            d, i = self.tree.query(coords[ok], k=k)
+            dist[ok], idx[ok] = d * EARTH_RADIUS_KM, i
+        return dist, idx
+
+    def nearest(self, lat, lon, k=10):
+        """The k events closest to one point, nearest first, with their tsunami rate."""
+        dist, idx = self.query([lat], [lon], k)
+        if idx[0, 0] < 0:
+            raise ValueError("latitude and longitude must be numbers")
+        events = []
+        for d, i in zip(dist[0], idx[0]):
+            event = {"distance_km": round(float(d), 3), "latitude": float(self.latitude[i]),
+                     "longitude": float(self.longitude[i]), "magnitude": float(self.magnitude[i]),
+                     "tsunami": int(self.tsunami[i])}
+            if self.title is not None:
+                event["title"] = _missing_to_none(self.title[i])
+            if self.date_time is not None:
+                event["date_time"] = _missing_to_none(self.date_time[i])
+            events.append(event)
+        return {"k": len(events), "tsunami_rate": float(self.tsunami[idx[0]].mean()), "events": events}
+
+    def neighbour_stats(self, lat, lon, k, exclude=None):
+        """(n, 3) array of NEIGHBOUR_COLS for each point.
+
+        exclude: for each point, the indexed event to leave out (its own row when the points
+        are the indexed events themselves), so a training row never sees its own label.
+        """
+        if exclude is None:
+            dist, idx = self.query(lat, lon, k)
+        else:
+            dist, idx = self.query(lat, lon, k + 1)
+            hit = (idx == np.asarray(exclude)[:, None]) & (idx >= 0)
+            keep = ~hit
+            # if the point itself wasn't among the k + 1 (ties), drop the farthest instead
+            keep[~hit.any(axis=1), -1] = False
+            order = np.argsort(~keep, axis=1, kind="stable")[:, :idx.shape[1] - 1]
+            dist, idx = np.take_along_axis(dist, order, 1), np.take_along_axis(idx, order, 1)
+
+        out = np.full((len(idx), len(NEIGHBOUR_COLS)), np.nan)
+        ok = idx[:, 0] >= 0
+        if ok.any():
+            out[ok, 0] = self.tsunami[idx[ok]].mean(axis=1)
+            out[ok, 1] = self.magnitude[idx[ok]].mean(axis=1)
+            out[ok, 2] = dist[ok].mean(axis=1)
+        return out
+
+
+class NeighbourFeatures(BaseEstimator, TransformerMixin):
+    """Pipeline step appending NEIGHBOUR_COLS from the k nearest training events.
+
+    fit indexes the training rows with their labels; during fit_transform each row is
+    excluded from its own neighbourhood so the tsunami rate carries no target leakage.
+    """
+
+    def __init__(self, k=10):
+        self.k = k
+
+    def fit(self, X, y):
+        self.index_ = EventIndex(X["latitude"], X["longitude"], y, X["magnitude"])
+        return self
+
+    def transform(self, X):
+        stats = self.index_.neighbour_stats(X["latitude"], X["longitude"], self.k)
+        return X.assign(**{c: stats[:, j] for j, c in enumerate(NEIGHBOUR_COLS)})
+
+    def fit_transform(self, X, y=None, **fit_params):
+        self.fit(X, y)
+        # map every training row to its slot in the index (-1 if it had no coordinates)
+        slot = np.full(len(X), -1, dtype=np.int64)
+        slot[self.index_.row] = np.arange(len(self.index_))
+        stats = self.index_.neighbour_stats(X["latitude"], X["longitude"], self.k, exclude=slot)
+        return X.assign(**{c: stats[:, j] for j, c in enumerate(NEIGHBOUR_COLS)})
@@ -0,0 +1,43 @@
+# memstats.py — per-process resident vs shared memory, for multi-worker deployments
+import os
+
+
+def process_memory():
+    """Return RSS / shared / private / PSS bytes for the current process.
+
+    Reads /proc/self/smaps_rollup on Linux (shared = pages also mapped by other processes,
+    e.g. a memory-mapped model artifact or pre-fork pages). Falls back to psutil if it is
+    installed, otherwise to peak RSS from resource.
+    """
+    out = {"pid": os.getpid()}
+    try:
+        fields = {}
+        with open("/proc/self/smaps_rollup", "r", encoding="ascii") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+        out.update({
+            "rss_bytes": fields.get("Rss", 0),
+            "pss_bytes": fields.get("Pss", 0),
+            "shared_bytes": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+            "private_bytes": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+            "source": "smaps_rollup",
+        })
+        return out
+    except OSError:
+        pass
+
+    try:
+        import psutil
+
+        info = psutil.Process().memory_info()
+        out.update({"rss_bytes": info.rss, "shared_bytes": getattr(info, "shared", None), "source": "psutil"})
+        return out
+    except ImportError:
+        pass
+
+    import resource
+
+    out.update({"max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024, "source": "resource"})
+    return out
@@ -0,0 +1,210 @@
+# metrics.py — minimal in-process counters/histograms rendered in Prometheus text format
+#
+# No prometheus_client dependency: the APIs only need a handful of series, a cheap
+# `with stage("predict"):` timer, and a /metrics endpoint. With METRICS_ENABLED=0 every
+# timer is a shared no-op context manager and nothing is recorded.
+import os, threading, time
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+# seconds; tuned for sub-millisecond stages up to multi-second batch predicts
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _fmt_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=(), enabled=True):
+        self.enabled = enabled
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _key(self, labels):
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._series.items())
+        return self.header() + [f"{self.name}{_fmt_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._series[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), enabled=True, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames, enabled)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        if not self.enabled:
+            return
+        self._observe(self._key(labels), value)
+
+    def _observe(self, key, value):
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        with self._lock:
+            items = [(k, list(s[0]), s[1], s[2]) for k, s in self._series.items()]
+        lines = self.header()
+        for key, counts, total, n in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, ('le', repr(bound)))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, ('le', '+Inf'))} {n}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {n}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("hist", "key", "t0")
+
+    def __init__(self, hist, key):
+        self.hist = hist
+        self.key = key
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist._observe(self.key, time.perf_counter() - self.t0)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class Registry:
+    """Process-wide set of metrics plus scrape-time collectors."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, labelnames, **kw):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labelnames, enabled=self.enabled, **kw)
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._get(Counter, name, help, labelnames)
+
+    def gauge(self, name, help, labelnames=()):
+        return self._get(Gauge, name, help, labelnames)
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help, labelnames, buckets=buckets)
+
+    def stage_timer(self, hist, **fixed):
+        """Return stage(name) -> context manager timing into hist with a `stage` label.
+
+        When the registry is disabled the returned function hands back one shared no-op
+        context manager, so instrumented code pays only a function call.
+        """
+        if not self.enabled:
+            return lambda name: NULL_TIMER
+        names = hist.labelnames
+        keys = {}
+
+        def stage(name):
+            key = keys.get(name)
+            if key is None:
+                labels = dict(fixed, stage=name)
+                key = keys[name] = tuple(labels.get(n, "") for n in names)
+            return _Timer(hist, key)
+        return stage
+
+    def add_collector(self, fn):
+        """Register fn() -> iterable of (name, kind, help, [(labels_dict, value), ...]).
+
+        Collectors run at scrape time, for stats that already live elsewhere (cache,
+        micro-batcher). Samples from several collectors with the same name are merged.
+        """
+        if self.enabled:
+            self._collectors.append(fn)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for m in metrics:
+            lines.extend(m.render())
+        collected = {}
+        for fn in self._collectors:
+            for name, kind, help, samples in fn():
+                collected.setdefault(name, (kind, help, []))[2].extend(samples)
+        for name, (kind, help, samples) in collected.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_fmt_labels(tuple(labels), tuple(labels.values()))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry(enabled=METRICS_ENABLED)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
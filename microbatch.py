@@ -0,0 +1,136 @@
+# microbatch.py — dynamic micro-batching for single-row prediction requests
+import queue, threading, time
+from concurrent.futures import Future
+
+_STOP = object()
+
+
+class QueueFullError(RuntimeError):
+    """Raised by MicroBatcher.submit when the pending-row queue is full."""
+
+
+class MicroBatcher:
+    """Merge rows submitted concurrently by request threads into one predict call.
+
+    A background thread blocks until the first row arrives, then keeps collecting
+    until either `max_batch_size` rows are pending or `max_wait_ms` has passed since
+    that first row. The stacked rows go to `score_fn(rows)` in a single call and each
+    caller gets its own value back through a Future.
+
+    A row may be submitted with a context (the APIs pass the ModelState the request was
+    validated against); rows are then scored with `score_fn(rows, context)`, and rows with
+    different contexts never share a call, so a model swap mid-batch can't score a row
+    with a model it wasn't built for.
+
+    Tunables:
+      max_batch_size  upper bound on rows per predict call (throughput ceiling)
+      max_wait_ms     how long the first row of a batch may wait for company; this is
+                      added to every request's latency, so it bounds the p99 cost.
+                      0 still merges rows that are already queued, without waiting.
+      max_queue       pending rows allowed before submit() starts rejecting (backpressure)
+    """
+
+    def __init__(self, score_fn, max_batch_size=64, max_wait_ms=2.0, max_queue=10000, name="microbatch"):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.score_fn = score_fn
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait_ms = float(max_wait_ms)
+        self.max_queue = int(max_queue)
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._lock = threading.Lock()
+        self.stats = {"batches": 0, "rows": 0, "max_batch": 0, "fallbacks": 0, "rejected": 0}
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def config(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "max_queue": self.max_queue,
+        }
+
+    def snapshot(self):
+        """Return a copy of the counters plus the current queue depth."""
+        with self._lock:
+            out = dict(self.stats)
+        out["queue_depth"] = self._queue.qsize()
+        out["mean_batch"] = (out["rows"] / out["batches"]) if out["batches"] else 0.0
+        return out
+
+    def submit(self, row, context=None):
+        """Queue one row and return a Future that resolves to its prediction."""
+        fut = Future()
+        try:
+            self._queue.put_nowait((row, context, fut))
+        except queue.Full:
+            with self._lock:
+                self.stats["rejected"] += 1
+            raise QueueFullError(f"micro-batch queue full ({self.max_queue} pending rows)")
+        return fut
+
+    def predict(self, row, timeout=None, context=None):
+        """Blocking helper: submit a row and wait for its prediction."""
+        return self.submit(row, context).result(timeout)
+
+    def stop(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # put it back so the run loop exits after this batch
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = self._collect(item)
+            self._dispatch(batch)
+
+    def _score(self, rows, context):
+        preds = self.score_fn(rows) if context is None else self.score_fn(rows, context)
+        return preds.tolist() if hasattr(preds, "tolist") else list(preds)
+
+    def _dispatch(self, batch):
+        groups = {}   # id(context) -> (context, [(row, fut), ...]), in arrival order
+        for row, context, fut in batch:
+            groups.setdefault(id(context), (context, []))[1].append((row, fut))
+
+        fallback = False
+        for context, items in groups.values():
+            try:
+                values = self._score([row for row, _ in items], context)
+                for (_, fut), val in zip(items, values):
+                    fut.set_result(val)
+            except Exception:
+                # one bad row must not fail everyone else in the batch
+                fallback = True
+                for row, fut in items:
+                    try:
+                        fut.set_result(self._score([row], context)[0])
+                    except Exception as e:
+                        fut.set_exception(e)
+
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["rows"] += len(batch)
+            self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+            if fallback:
+                self.stats["fallbacks"] += 1
@@ -0,0 +1,127 @@
+# prediction_cache.py — bounded in-process LRU/TTL cache for model predictions
+import math, os, sys, threading, time
+from collections import OrderedDict
+
+CACHE_HEADER = "X-Prediction-Cache"
+
+# rough per-entry bookkeeping (OrderedDict link + (expires, value) tuple) on top of key/value sizes
+_ENTRY_OVERHEAD = 120
+
+
+def canonical_key(row):
+    """Hashable cache key for a row of feature values already in feature_order.
+
+    Numbers are normalised to float so 3, 3.0 and numpy scalars share an entry; NaN and
+    None both mean "missing". Booleans (Python or NumPy) are tagged with their type, so True
+    and 1 get different entries. Strings are kept as-is (no numeric parsing, since "7" and 7
+    may encode differently for categorical columns). Returns None if a value can't be keyed.
+    """
+    key = []
+    for v in row:
+        if v is None or isinstance(v, str):
+            key.append(v)
+        elif isinstance(v, bool) or getattr(getattr(v, "dtype", None), "kind", None) == "b":
+            key.append((bool, bool(v)))
+        elif isinstance(v, (int, float)) or hasattr(v, "__float__"):
+            f = float(v)
+            key.append(None if math.isnan(f) else f)
+        else:
+            return None
+    return tuple(key)
+
+
+def file_fingerprint(path):
+    """Cheap identity for a model artifact: size + mtime. Changes whenever the file is rewritten."""
+    st = os.stat(path)
+    return f"{st.st_size}-{st.st_mtime_ns}"
+
+
+def _sizeof(key, value, nbytes=None):
+    value_bytes = sys.getsizeof(value) if nbytes is None else nbytes
+    return sys.getsizeof(key) + sum(sys.getsizeof(k) for k in key) + value_bytes + _ENTRY_OVERHEAD
+
+
+class PredictionCache:
+    """Thread-safe LRU cache bounded by entry count and approximate memory, with optional TTL.
+
+    The cache is bound to a model version (see bind); binding a different version drops every
+    entry, so a reloaded artifact can never be answered from the previous model's results.
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=16 * 1024 * 1024, ttl_s=None):
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(max_bytes)
+        self.ttl_s = float(ttl_s) if ttl_s else None
+        self.version = None
+        self._data = OrderedDict()  # key -> (expires_at, value, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def bind(self, version):
+        """Associate the cache with a model version, clearing it if the version changed."""
+        with self._lock:
+            if version != self.version:
+                if self._data:
+                    self.stats["invalidations"] += 1
+                self._data.clear()
+                self._bytes = 0
+                self.version = version
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def get(self, key):
+        """Return (hit, value). Expired entries count as a miss."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return False, None
+            expires_at, value, nbytes = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                self._bytes -= nbytes
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.stats["hits"] += 1
+            return True, value
+
+    def put(self, key, value, version=None, nbytes=None):
+        """Store value; with `version`, only if the cache is still bound to that version.
+
+        Passing the version the value was computed under keeps a request that was still
+        running on the old model during a reload from caching a stale prediction.
+        nbytes: size of value when sys.getsizeof can't see it (containers, arrays).
+        """
+        nbytes = _sizeof(key, value, nbytes)
+        if nbytes > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl_s if self.ttl_s else None
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._data[key] = (expires_at, value, nbytes)
+            self._bytes += nbytes
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, _, evicted) = self._data.popitem(last=False)
+                self._bytes -= evicted
+                self.stats["evictions"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            out = dict(self.stats)
+            out["entries"] = len(self._data)
+            out["bytes"] = self._bytes
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = out["hits"] / lookups if lookups else 0.0
+        out.update({"max_entries": self.max_entries, "max_bytes": self.max_bytes,
+                    "ttl_s": self.ttl_s, "model_version": self.version})
+        return out
@@ -0,0 +1,157 @@
+# replay_audit.py — feed captured audit logs back through the batch scoring path
+#
+#   python replay_audit.py --service flood                              # audit_logs/flood, in-process API
+#   FLOOD_MODEL_VARIANT=hgb python replay_audit.py --service flood      # a candidate model vs what was served
+#   python replay_audit.py --service earthquake --url http://127.0.0.1:5001 --batch-size 500
+#
+# Reads every row from the audit files (audit_log.py), re-scores the logged features in batches
+# through /predict_<service>/batch (the Flask test client in-process, or a running API with
+# --url), and compares the result with the prediction that was served. Reports, per served
+# model_version, how many rows were compared and the mean / p99 / max absolute difference
+# (flood) or label agreement (earthquake), plus replay throughput and batch latency. The
+# in-process API never audits itself while replaying and runs without its prediction cache,
+# so every row is actually re-scored.
+import argparse, json, os, time
+
+import bench_serving
+from audit_log import audit_files, read_audit
+
+SERVICES = {
+    "flood": {"module": "Flood_api_fixed", "env": "FLOOD", "route": "/predict_flood/batch",
+              "key": "flood_predictions"},
+    "earthquake": {"module": "Earthquake_api_fixed", "env": "EQ", "route": "/predict_earthquake/batch",
+                   "key": "predictions"},
+}
+
+
+def iter_rows(paths, limit=None, stats=None):
+    """(features, served prediction, served model_version) for every logged row."""
+    n = 0
+    for rec in read_audit(paths, stats):
+        for features, served in zip(rec["features"], rec["predictions"]):
+            if not isinstance(features, dict):
+                continue
+            yield features, served, rec.get("model_version")
+            n += 1
+            if limit and n >= limit:
+                return
+
+
+def make_scorer(service, url):
+    """(score(records) -> predictions, model_version of the replaying model)."""
+    cfg = SERVICES[service]
+    if url:
+        import requests
+
+        session = requests.Session()
+        base = url.rstrip("/")
+        version = session.get(base + "/").json().get("model_version")
+
+        def score(records):
+            resp = session.post(base + cfg["route"], json=records)
+            resp.raise_for_status()
+            return resp.json()[cfg["key"]]
+        return score, version
+
+    os.environ[f"{cfg['env']}_AUDIT"] = "0"        # don't log the replay into the audit log
+    os.environ[f"{cfg['env']}_CACHE_SIZE"] = "0"   # re-score every row, don't answer from the cache
+    import importlib
+
+    api = importlib.import_module(cfg["module"])
+    if api.model is None:
+        raise SystemExit(f"{service} model not loaded:\n{api.model_load_err}")
+    client = api.app.test_client()
+
+    def score(records):
+        resp = client.post(cfg["route"], json=records)
+        if resp.status_code != 200:
+            raise RuntimeError(f"HTTP {resp.status_code}: {resp.get_data()[:500]!r}")
+        return resp.get_json()[cfg["key"]]
+    return score, api.model_version
+
+
+def compare(service, by_version):
+    """Per served model_version: rows compared and the difference / agreement figures."""
+    out = {}
+    for version, pairs in by_version.items():
+        both = [(s, r) for s, r in pairs if s is not None and r is not None]
+        entry = {"rows": len(pairs), "compared": len(both)}
+        if both and service == "flood":
+            diffs = sorted(abs(r - s) for s, r in both)
+            entry.update(mean_abs_diff=sum(diffs) / len(diffs), p99_abs_diff=bench_serving.percentile(diffs, 99),
+                         max_abs_diff=diffs[-1])
+        elif both:
+            agree = sum(1 for s, r in both if s == r)
+            entry.update(agreement=agree / len(both), changed=len(both) - agree)
+        out[version or "unknown"] = entry
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Replay audit logs through the batch endpoint and compare predictions.")
+    ap.add_argument("--service", choices=sorted(SERVICES), required=True)
+    ap.add_argument("--dir", default=None, help="audit directory (default audit_logs/<service>)")
+    ap.add_argument("--url", default=None, help="base URL of a running API (default: in-process)")
+    ap.add_argument("--batch-size", type=int, default=1000)
+    ap.add_argument("--limit", type=int, default=None, help="replay at most this many rows")
+    ap.add_argument("--out", default="replay_audit.json")
+    args = ap.parse_args(argv)
+
+    paths = audit_files(args.dir or os.path.join("audit_logs", args.service))
+    if not paths:
+        raise SystemExit("no audit files found")
+    score, replay_version = make_scorer(args.service, args.url)
+
+    by_version, latencies, rows = {}, [], 0
+    chunk = []
+
+    def flush():
+        nonlocal rows
+        t0 = time.perf_counter()
+        replayed = score([f for f, _, _ in chunk])
+        latencies.append(time.perf_counter() - t0)
+        for (_, served, version), new in zip(chunk, replayed):
+            by_version.setdefault(version, []).append((served, new))
+        rows += len(chunk)
+        chunk.clear()
+
+    read_stats = {}
+    t0 = time.perf_counter()
+    for item in iter_rows(paths, args.limit, read_stats):
+        chunk.append(item)
+        if len(chunk) >= args.batch_size:
+            flush()
+    if chunk:
+        flush()
+    elapsed = time.perf_counter() - t0
+
+    throughput = bench_serving.summarize(latencies, rows, 0, sum(latencies))
+    results = compare(args.service, by_version)
+    print(f"Replayed {rows:,} rows from {len(paths)} file(s) against model {replay_version}: "
+          f"{throughput['rows_per_s'] or 0:,.0f} rows/s, batch p50 {throughput['p50_ms'] or 0:.1f} ms, "
+          f"p95 {throughput['p95_ms'] or 0:.1f} ms")
+    if read_stats["bad_lines"]:
+        print(f"  skipped {read_stats['bad_lines']:,} undecodable line(s)")
+    for version, entry in results.items():
+        if "agreement" in entry:
+            detail = f"agreement {entry['agreement']:.4f} ({entry['changed']} changed)"
+        elif "mean_abs_diff" in entry:
+            detail = f"mean |diff| {entry['mean_abs_diff']:.6f}  p99 {entry['p99_abs_diff']:.6f}  max {entry['max_abs_diff']:.6f}"
+        else:
+            detail = "nothing to compare"
+        print(f"  served by {version}: {entry['compared']:,}/{entry['rows']:,} rows  {detail}")
+
+    report = {
+        "meta": {"git_rev": bench_serving.git_rev(), "service": args.service, "url": args.url or "in-process",
+                 "replay_model_version": replay_version, "files": paths, "batch_size": args.batch_size,
+                 "wall_seconds": elapsed, "bad_lines": read_stats["bad_lines"]},
+        "throughput": throughput,
+        "by_served_version": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# audit_log.AuditLog writes what replay_audit.py reads back: write -> read -> replay round trip.
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+import replay_audit
+from audit_log import AuditLog, audit_files, read_audit
+
+FEATURES = ["a", "b"]
+
+
+def write_log(directory, **kwargs):
+    log = AuditLog(str(directory), "flood", "flood", flush_s=0.05, **kwargs)
+    assert log.log("batch", "v1", 1.5, [{"a": 1, "b": 2}, {"a": 3, "b": None}], [0.25, 0.5])
+    # binary bodies are logged as (columns, matrix) and NumPy predictions
+    assert log.log("columnar", "v1", 2.0, (FEATURES, np.array([[5.0, 6.0]])), np.array([0.75]))
+    assert log.log("predict", "v2", 0.5, [{"a": 7, "b": 8}], [np.float64(1.0)])
+    log.close()
+    return log
+
+
+def test_written_lines_read_back(tmp_path):
+    log = write_log(tmp_path)
+    assert log.snapshot()["written"] == 3
+    assert log.snapshot()["queued_rows"] == 0
+
+    paths = audit_files(str(tmp_path))
+    assert len(paths) == 1
+    records = list(read_audit(paths))
+    assert [r["endpoint"] for r in records] == ["batch", "columnar", "predict"]
+    assert records[0]["features"] == [{"a": 1, "b": 2}, {"a": 3, "b": None}]
+    assert records[1]["features"] == [{"a": 5.0, "b": 6.0}]
+    assert [r["n"] for r in records] == [2, 1, 1]
+    assert records[2]["predictions"] == [1.0]
+    assert {r["service"] for r in records} == {"flood"}
+
+    rows = list(replay_audit.iter_rows(paths))
+    assert rows[0] == ({"a": 1, "b": 2}, 0.25, "v1")
+    assert len(rows) == 4
+    assert len(list(replay_audit.iter_rows(paths, limit=3))) == 3
+
+
+def test_request_over_row_budget_is_dropped(tmp_path):
+    log = AuditLog(str(tmp_path), "flood", "flood", max_rows=2)
+    assert not log.log("batch", "v1", 1.0, [{"a": i, "b": i} for i in range(3)], [0.0] * 3)
+    log.close()
+    snap = log.snapshot()
+    assert (snap["dropped"], snap["dropped_rows"], snap["written"]) == (1, 3, 0)
+
+
+def test_truncated_and_bad_lines_are_skipped(tmp_path):
+    write_log(tmp_path)
+    path = audit_files(str(tmp_path))[0]
+    with gzip.open(path, "ab") as f:
+        f.write(b"not json\n" + json.dumps({"features": [], "predictions": []}).encode()[:10])
+    stats = {}
+    records = list(read_audit([path], stats))
+    assert len(records) == 3
+    assert stats["bad_lines"] == 1
+
+
+def test_replay_compares_per_served_version(tmp_path, monkeypatch):
+    write_log(tmp_path)
+    # replaying model: a + b, against which v1's 0.25 / 0.5 / 0.75 and v2's 1.0 are compared
+    scorer = lambda records: [float(r["a"] + (r["b"] or 0)) for r in records]
+    monkeypatch.setattr(replay_audit, "make_scorer", lambda service, url: (scorer, "v3"))
+    out = tmp_path / "replay.json"
+    replay_audit.main(["--service", "flood", "--dir", str(tmp_path), "--batch-size", "2", "--out", str(out)])
+
+    report = json.loads(out.read_text())
+    assert report["meta"]["replay_model_version"] == "v3"
+    assert report["throughput"]["rows"] == 4
+    v1, v2 = report["by_served_version"]["v1"], report["by_served_version"]["v2"]
+    assert (v1["rows"], v1["compared"]) == (3, 3)
+    assert v1["max_abs_diff"] == pytest.approx(10.25)
+    assert v1["mean_abs_diff"] == pytest.approx((2.75 + 2.5 + 10.25) / 3)
+    assert v2["max_abs_diff"] == pytest.approx(14.0)
+
+
+def test_compare_earthquake_agreement():
+    out = replay_audit.compare("earthquake", {"v1": [(1, 1), (0, 1), (1, 1), (None, 0)], None: [(0, 0)]})
+    assert out["v1"] == {"rows": 4, "compared": 3, "agreement": 2 / 3, "changed": 1}
+    assert out["unknown"]["agreement"] == 1.0
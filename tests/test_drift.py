@@ -0,0 +1,68 @@
+# PSI and the drift sketches in drift.py, including a save / load round trip of the reference.
+import numpy as np
+import pandas as pd
+import pytest
+
+import drift
+from drift import DriftMonitor, HeavyHitters, Histogram, build_reference, load_monitor, psi, save_reference
+
+
+def test_psi_is_zero_for_identical_distributions():
+    assert psi([10, 20, 30, 0], [10, 20, 30, 0]) == 0.0
+    # same proportions at a different volume
+    assert psi([10, 20, 30, 0], [100, 200, 300, 0]) == pytest.approx(0.0, abs=1e-12)
+
+
+def test_psi_grows_with_shift():
+    ref = [25, 25, 25, 25]
+    small, large = psi(ref, [30, 25, 25, 20]), psi(ref, [70, 10, 10, 10])
+    assert 0 < small < drift.PSI_WARN < drift.PSI_ALERT < large
+    assert psi(ref, [0, 0, 0, 0]) is None
+
+
+def test_histogram_bins_and_missing():
+    h = Histogram.fixed(0, 3)  # bins centred on 0, 1, 2, 3 plus two overflow bins
+    h.update([0, 1, 1, 3, -5, 99, None, "x", np.nan])
+    assert h.counts.tolist() == [1, 1, 2, 0, 1, 1]
+    assert h.missing == 3
+    assert h.rows() == 9
+    assert h.compare(h) == 0.0
+
+
+def test_heavy_hitters_stay_bounded():
+    hh = HeavyHitters(capacity=3)
+    hh.update(["a"] * 5 + ["b"] * 3 + ["c", "d", "e", None, ""])
+    assert len(hh.counts) == 3
+    assert hh.counts["a"] == 5 and hh.counts["b"] == 3
+    assert hh.total == 11 and hh.missing == 2
+
+
+def test_monitor_reports_stable_on_training_distribution(tmp_path, monkeypatch):
+    monkeypatch.setattr(drift, "MIN_ROWS", 100)
+    rng = np.random.default_rng(0)
+    n = 2000
+    df = pd.DataFrame({"score": rng.integers(0, 10, n), "depth": rng.exponential(30, n),
+                       "net": rng.choice(["us", "ak", "ci"], n)})
+    path = save_reference(build_reference(df, histograms=["score"], quantiles=["depth"], categoricals=["net"]),
+                          str(tmp_path / "model.drift.json"))
+
+    monitor = load_monitor(path, list(df.columns))
+    monitor.observe(df.to_numpy().tolist())
+    report = monitor.report()
+    assert report["rows"] == n
+    assert report["drifted"] == []
+    for name, entry in report["features"].items():
+        assert entry["psi"] == 0.0, name
+        assert entry["status"] == "stable"
+
+    monitor.reset()
+    shifted = df.assign(score=9, net="nc")
+    monitor.observe(shifted.to_numpy().tolist())
+    report = monitor.report()
+    assert report["drifted"] == ["net", "score"]
+    assert report["features"]["net"]["unseen"] == ["nc"]
+    assert report["features"]["depth"]["status"] == "stable"
+
+
+def test_load_monitor_without_reference(tmp_path):
+    assert load_monitor(str(tmp_path / "missing.drift.json"), ["a"]) is None
@@ -0,0 +1,49 @@
+# Compiled flood forest (flood_compiled.py) must match the sklearn pipeline it was built from.
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from flood_compiled import CHUNK_ROWS, compile_flood_pipeline
+
+FEATURES = [f"f{i}" for i in range(6)]
+
+
+@pytest.fixture(scope="module")
+def fitted():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.integers(0, 15, size=(600, len(FEATURES))).astype(float), columns=FEATURES)
+    X[rng.random(X.shape) < 0.05] = np.nan
+    y = np.nansum(X.to_numpy(), axis=1) / 100 + rng.normal(0, 0.01, len(X))
+    num = Pipeline([("imputer", SimpleImputer(strategy="median")), ("scaler", StandardScaler())])
+    # n_jobs=1: the compiled model sums trees in estimator order, like single-threaded sklearn
+    pipe = Pipeline([("preproc", ColumnTransformer([("num", num, FEATURES)], remainder="drop")),
+                     ("rf", RandomForestRegressor(n_estimators=12, max_depth=8, random_state=0, n_jobs=1))])
+    pipe.fit(X, y)
+    return pipe, compile_flood_pipeline(pipe, FEATURES)
+
+
+@pytest.mark.parametrize("n_rows", [1, 7, CHUNK_ROWS + 905])
+def test_compiled_matches_pipeline(fitted, n_rows):
+    pipe, compiled = fitted
+    rng = np.random.default_rng(n_rows)
+    X = rng.integers(-2, 18, size=(n_rows, len(FEATURES))).astype(float)
+    X[rng.random(X.shape) < 0.1] = np.nan
+    expected = pipe.predict(pd.DataFrame(X, columns=FEATURES))
+    np.testing.assert_array_equal(compiled.predict(X), expected)
+
+
+def test_compiled_accepts_frames_and_rows(fitted):
+    pipe, compiled = fitted
+    X = pd.DataFrame([[3, np.nan, 7, 1, 0, 12], [5, 5, 5, 5, 5, 5]], columns=FEATURES, dtype=float)
+    expected = pipe.predict(X)
+    np.testing.assert_array_equal(compiled.predict(X), expected)
+    np.testing.assert_array_equal(compiled.predict(X.to_numpy().tolist()), expected)
+    # the caller's matrix is not modified by imputation / scaling
+    before = X.to_numpy().copy()
+    compiled.predict(before)
+    np.testing.assert_array_equal(before, X.to_numpy())
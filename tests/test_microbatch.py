@@ -0,0 +1,106 @@
+# microbatch.MicroBatcher: merged calls must still hand every caller its own result.
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from microbatch import MicroBatcher, QueueFullError
+
+
+def scaled(rows, context=None):
+    scale = 1 if context is None else context["scale"]
+    return np.asarray([r[0] * scale for r in rows], dtype=float)
+
+
+class Gate:
+    """score_fn that blocks until released, so rows submitted meanwhile pile up in the queue."""
+
+    def __init__(self, score=scaled):
+        self.score = score
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.calls = []
+
+    def __call__(self, rows, context=None):
+        self.calls.append((list(rows), context))
+        self.entered.set()
+        self.release.wait(5)
+        return self.score(rows) if context is None else self.score(rows, context)
+
+
+def test_concurrent_callers_get_their_own_rows():
+    def score(rows):
+        time.sleep(0.005)
+        return np.asarray(rows, dtype=float).sum(axis=1)
+
+    batcher = MicroBatcher(score, max_batch_size=16, max_wait_ms=5)
+    n = 64
+    results = [None] * n
+    start = threading.Barrier(n)
+
+    def call(i):
+        start.wait()
+        results[i] = batcher.predict([i, 0.5], timeout=5)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    batcher.stop()
+
+    assert results == [i + 0.5 for i in range(n)]
+    snap = batcher.snapshot()
+    assert snap["rows"] == n
+    assert snap["batches"] < n  # rows really were merged
+    assert snap["max_batch"] <= 16
+
+
+def test_rows_with_different_contexts_never_share_a_call():
+    gate = Gate()
+    batcher = MicroBatcher(gate, max_batch_size=8, max_wait_ms=0)
+    old, new = {"scale": 1}, {"scale": 10}
+    first = batcher.submit([1], old)
+    assert gate.entered.wait(5)
+    # queued while the first call is blocked, so they are collected into one batch
+    futs = [batcher.submit([2], old), batcher.submit([3], new), batcher.submit([4], old)]
+    gate.release.set()
+    assert first.result(5) == 1
+    assert [f.result(5) for f in futs] == [2, 30, 4]
+    batcher.stop()
+
+    assert gate.calls[1:] == [([[2], [4]], old), ([[3]], new)]
+
+
+def test_failed_batch_falls_back_to_single_rows():
+    def score(rows):
+        if any(r[0] < 0 for r in rows):
+            raise ValueError("negative input")
+        return [r[0] * 2 for r in rows]
+
+    gate = Gate(score)
+    batcher = MicroBatcher(gate, max_batch_size=8, max_wait_ms=0)
+    batcher.submit([0])
+    assert gate.entered.wait(5)
+    good, bad, other = batcher.submit([1]), batcher.submit([-1]), batcher.submit([3])
+    gate.release.set()
+    assert good.result(5) == 2
+    assert other.result(5) == 6
+    with pytest.raises(ValueError):
+        bad.result(5)
+    batcher.stop()
+    assert batcher.snapshot()["fallbacks"] == 1
+
+
+def test_full_queue_rejects():
+    gate = Gate()
+    batcher = MicroBatcher(gate, max_batch_size=1, max_wait_ms=0, max_queue=1)
+    batcher.submit([0])
+    assert gate.entered.wait(5)  # first row is being scored, the queue is empty again
+    batcher.submit([1])
+    with pytest.raises(QueueFullError):
+        batcher.submit([2])
+    assert batcher.snapshot()["rejected"] == 1
+    gate.release.set()
+    batcher.stop()
@@ -0,0 +1,62 @@
+# LRU bounds, version binding and key normalisation of prediction_cache.PredictionCache.
+import numpy as np
+
+from prediction_cache import PredictionCache, _sizeof, canonical_key
+
+
+def test_evicts_least_recently_used_by_entry_count():
+    cache = PredictionCache(max_entries=3, max_bytes=1 << 20)
+    for i in range(3):
+        cache.put((float(i),), i)
+    assert cache.get((0.0,)) == (True, 0)  # 0 is now the most recently used
+    cache.put((3.0,), 3)
+    assert cache.get((1.0,)) == (False, None)
+    assert [cache.get((float(i),))[0] for i in (0, 2, 3)] == [True, True, True]
+    snap = cache.snapshot()
+    assert snap["entries"] == 3
+    assert snap["evictions"] == 1
+
+
+def test_evicts_by_bytes():
+    entry = _sizeof((0.0,), 0.5)
+    cache = PredictionCache(max_entries=100, max_bytes=3 * entry)
+    for i in range(5):
+        cache.put((float(i),), 0.5)
+    snap = cache.snapshot()
+    assert snap["entries"] == 3
+    assert snap["bytes"] <= 3 * entry
+    assert snap["evictions"] == 2
+    assert cache.get((0.0,)) == (False, None)
+    assert cache.get((4.0,)) == (True, 0.5)
+
+
+def test_value_larger_than_budget_is_not_cached():
+    cache = PredictionCache(max_entries=100, max_bytes=1000)
+    cache.put((1.0,), np.zeros(10), nbytes=5000)
+    assert cache.snapshot()["entries"] == 0
+
+
+def test_bind_to_new_fingerprint_invalidates():
+    cache = PredictionCache(max_entries=10)
+    cache.bind("100-1")
+    cache.put((1.0,), 0.25, version="100-1")
+    cache.bind("100-1")  # same artifact: entries survive
+    assert cache.get((1.0,)) == (True, 0.25)
+
+    cache.bind("100-2")
+    assert cache.get((1.0,)) == (False, None)
+    assert cache.snapshot()["invalidations"] == 1
+    # a prediction computed on the old model arrives after the swap: dropped
+    cache.put((1.0,), 0.25, version="100-1")
+    assert cache.get((1.0,)) == (False, None)
+    cache.put((1.0,), 0.5, version="100-2")
+    assert cache.get((1.0,)) == (True, 0.5)
+
+
+def test_canonical_key():
+    assert canonical_key([3, 3.0]) == canonical_key([np.float32(3), np.int64(3)])
+    assert canonical_key([None]) == canonical_key([float("nan")])
+    assert canonical_key([True]) != canonical_key([1])
+    assert canonical_key([np.bool_(True)]) == canonical_key([True])
+    assert canonical_key(["7"]) != canonical_key([7])
+    assert canonical_key([[1, 2]]) is None
@@ -0,0 +1,47 @@
+# Request validation for the flood what-if sweep (Flood_api_fixed.handle_sweep).
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression
+
+import Flood_api_fixed as api
+
+with open(api.FEATURE_PATH, "r", encoding="utf-8") as f:
+    FEATURES = json.load(f)
+BASE = {k: 5 for k in FEATURES}
+
+
+@pytest.fixture
+def live(monkeypatch):
+    """A small fitted model installed as the live state, so the tests don't need flood_model.pkl."""
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.integers(0, 15, size=(200, len(FEATURES))).astype(float), columns=FEATURES)
+    model = LinearRegression().fit(X, X.sum(axis=1) / 100)
+    monkeypatch.setattr(api, "state", api.ModelState(model, None, FEATURES, "test", "test", None, 0.0, None))
+    monkeypatch.setattr(api, "pd_cache", None)
+    return model
+
+
+def test_sweep_scores_grid(live):
+    feature = FEATURES[0]
+    body, status, _ = api.handle_sweep({"base": BASE, "sweep": {feature: [1, 2.5, 8]}})
+    assert status == 200
+    assert body["shape"] == [1, 3]
+    X = pd.DataFrame([dict(BASE, **{feature: v}) for v in (1, 2.5, 8)], columns=FEATURES)
+    np.testing.assert_allclose(body["predictions"][0], live.predict(X))
+
+
+@pytest.mark.parametrize("values", [[[1, 2], [3, 4]], [[1], [2]], [1, [2, 3]]])
+def test_nested_values_are_rejected(live, values):
+    body, status, _ = api.handle_sweep({"base": BASE, "sweep": {FEATURES[0]: values}})
+    assert status == 400
+    assert body["details"] == "values must be a flat list of numbers"
+
+
+@pytest.mark.parametrize("values", [["a", 2], ["3"], [True, 2], [None], [{"v": 1}], [1, float("nan")]])
+def test_non_numeric_values_are_rejected(live, values):
+    body, status, _ = api.handle_sweep({"base": BASE, "sweep": {FEATURES[0]: values}})
+    assert status == 400
+    assert body["error"] == "invalid sweep"
@@ -0,0 +1,105 @@
+# Content negotiation and NDJSON line splitting in wire_format.py.
+import io
+
+import numpy as np
+import pytest
+
+from wire_format import (LineSplitter, UnsupportedFormat, encode_predictions, iter_lines, ndjson_records,
+                         read_npy, request_format, response_format)
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, "json"),
+    ("", "json"),
+    ("application/x-npy", "npy"),
+    ("application/vnd.apache.arrow.stream; q=0.9, application/json; q=0.5", "arrow"),
+    ("application/json; q=0.5, application/x-npy", "npy"),            # higher q wins over order
+    ("application/x-npy, application/vnd.apache.arrow.stream", "npy"),  # tie: header order
+    ("text/html, */*; q=0.1", "json"),                                 # unsupported types skipped
+    ("*/*", "json"),
+    ("application/*", "json"),
+    ("application/json; q=0, */*", "npy"),        # wildcard falls back to the next allowed format
+    ("application/json; q=0, application/x-npy; q=0, */*", "arrow"),
+    ("application/octet-stream; q=0, application/x-npy", "npy"),  # refusing an alias keeps the MIME
+    ("application/json; q=abc", "json"),          # unparseable q counts as 1
+])
+def test_response_format(accept, expected):
+    assert response_format(accept) == expected
+
+
+def test_response_format_default_follows_request():
+    assert response_format("*/*", default="arrow") == "arrow"
+    assert response_format("application/*", default="npy") == "npy"
+    assert response_format("application/x-npy; q=0, */*", default="npy") == "json"
+
+
+@pytest.mark.parametrize("accept", [
+    "text/html",
+    "application/json; q=0",
+    "application/json; q=0, application/x-npy; q=0, application/vnd.apache.arrow.stream; q=0, */*",
+])
+def test_response_format_refuses(accept):
+    with pytest.raises(UnsupportedFormat):
+        response_format(accept)
+
+
+def test_request_format():
+    assert request_format("application/x-npy") == "npy"
+    assert request_format("Application/Vnd.Apache.Arrow.Stream; charset=binary") == "arrow"
+    assert request_format("application/octet-stream") == "npy"
+    assert request_format("text/plain") == "json"
+    assert request_format(None) == "json"
+
+
+def test_line_splitter_joins_lines_across_chunks():
+    splitter = LineSplitter(max_bytes=64)
+    out = []
+    for chunk in (b'{"a": ', b'1}\n{"a"', b": 2}\n\n", b'{"a": 3}'):
+        out += splitter.feed(chunk)
+    out += splitter.close()
+    assert out == [b'{"a": 1}', b'{"a": 2}', b"", b'{"a": 3}']
+
+
+def test_line_splitter_drops_oversize_lines():
+    splitter = LineSplitter(max_bytes=4)
+    # a line that overflows before its newline is reported once, then skipped to the newline
+    assert splitter.feed(b"ok\n12345") == [b"ok", None]
+    assert splitter.feed(b"6789") == []
+    assert splitter.feed(b"0\nabcd\n") == [b"abcd"]
+    # an oversize line that arrives complete in one chunk
+    assert splitter.feed(b"toolong\nend") == [None]
+    assert splitter.close() == [b"end"]
+
+
+def test_oversize_last_line_without_newline_is_dropped():
+    splitter = LineSplitter(max_bytes=4)
+    assert splitter.feed(b"x\n123456") == [b"x", None]
+    assert splitter.close() == []
+
+
+def test_ndjson_records_from_a_chunked_stream():
+    body = b'{"a": 1}\n\n   \nnot json\n' + b'{"b": "' + b"x" * 100 + b'"}\n{"a": 2}'
+    records = list(ndjson_records(iter_lines(io.BytesIO(body), max_line_bytes=64, read_size=5), start=10))
+    assert [(i, rec) for i, rec, err in records] == [(10, {"a": 1}), (11, None), (12, None), (13, {"a": 2})]
+    assert records[1][2].startswith("invalid JSON")
+    assert records[2][2] == "record exceeds the maximum line size"
+
+
+def test_npy_round_trip():
+    order = ["a", "b", "c"]
+    X = np.arange(6, dtype=np.int32).reshape(2, 3)
+    buf = io.BytesIO()
+    np.save(buf, X)
+    np.testing.assert_array_equal(read_npy(buf.getvalue(), order), X.astype(np.float64))
+
+    structured = np.zeros(2, dtype=[("c", "f4"), ("a", "f8"), ("b", "i2"), ("extra", "f8")])
+    structured["a"], structured["b"], structured["c"] = [1, 2], [3, 4], [5, 6]
+    buf = io.BytesIO()
+    np.save(buf, structured)
+    np.testing.assert_array_equal(read_npy(buf.getvalue(), order), [[1, 3, 5], [2, 4, 6]])
+
+    body, mime = encode_predictions([0.5, np.nan], "npy", "prediction")
+    assert mime == "application/x-npy"
+    np.testing.assert_array_equal(np.load(io.BytesIO(body)), [0.5, np.nan])
+    with pytest.raises(ValueError):
+        read_npy(body, order)
@@ -0,0 +1,21 @@
+# timing.py — wall-clock breakdown of the training phases
+import time
+from contextlib import contextmanager
+
+
+class PhaseTimer:
+    """Accumulates seconds per named phase: `with timer.phase("fit"): ...`."""
+
+    def __init__(self):
+        self.seconds = {}
+
+    @contextmanager
+    def phase(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - t0
+
+    def total(self):
+        return sum(self.seconds.values())
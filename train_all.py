@@ -0,0 +1,117 @@
+# train_all.py — retrain both models concurrently with a shared CPU budget
+#
+#   python train_all.py                              # flood + earthquake in parallel
+#   python train_all.py --search --cv 5 --n-iter 20  # randomized CV search for both
+#   python train_all.py --only flood --shared-artifact
+#   python train_all.py --sequential                 # one after the other, each with all cores
+#
+# Each model trains in its own process. The machine's cores are split between them
+# (--flood-jobs / --eq-jobs override the split), and each run spends its share either on the
+# forest's / booster's threads or on parallel CV fits, never both, so the total thread count
+# stays at the core count. Prints a per-phase timing table (load, preprocess, fit, evaluate,
+# save) and writes it with the metrics to --out.
+import argparse, json, os, platform, time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+# Share of the cores each model gets when both train at once: the 50k-row forest is the
+# long pole, the 1k-row booster finishes in seconds.
+WEIGHTS = {"flood": 3, "earthquake": 1}
+
+
+def split_cores(names, cores, overrides=None):
+    """{name: n_jobs} summing to at most `cores` (at least 1 each), weighted by WEIGHTS."""
+    overrides = {k: v for k, v in (overrides or {}).items() if v}
+    budget = {n: overrides[n] for n in names if n in overrides}
+    rest = [n for n in names if n not in budget]
+    free = max(len(rest), cores - sum(budget.values()))
+    total = sum(WEIGHTS[n] for n in rest)
+    for n in rest:
+        budget[n] = max(1, free * WEIGHTS[n] // total)
+    return budget
+
+
+def _train(name, kwargs):
+    """Process-pool entry point; imports lazily so each worker only loads what it trains."""
+    from threadpoolctl import threadpool_limits
+
+    # cap BLAS / OpenMP pools at this run's share as well (HGB and numpy respect it)
+    with threadpool_limits(limits=kwargs["n_jobs"]):
+        if name == "flood":
+            from Flood_prediction import train_flood
+            result = train_flood(**kwargs)
+        else:
+            from EarthQuake_detection import train_earthquake
+            result = train_earthquake(**kwargs)
+    result["pid"] = os.getpid()
+    result["n_jobs"] = kwargs["n_jobs"]
+    return result
+
+
+def print_table(results, wall_s):
+    phases = ["load", "preprocess", "fit", "evaluate", "save"]
+    print(f"\n{'model':<12}" + "".join(f"{p:>12}" for p in phases) + f"{'total':>12}{'n_jobs':>8}")
+    for r in results:
+        t = r["timings"]
+        print(f"{r['name']:<12}" + "".join(f"{t.get(p, 0.0):>11.2f}s" for p in phases)
+              + f"{sum(t.values()):>11.2f}s{r['n_jobs']:>8}")
+    print(f"wall clock: {wall_s:.2f}s")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Retrain the flood and earthquake models.")
+    ap.add_argument("--only", choices=sorted(WEIGHTS), action="append", help="train just this model (repeatable)")
+    ap.add_argument("--search", action="store_true", help="randomized CV hyperparameter search")
+    ap.add_argument("--cv", type=int, default=3)
+    ap.add_argument("--n-iter", type=int, default=8, help="search candidates per model")
+    ap.add_argument("--sequential", action="store_true", help="train one model at a time with all cores")
+    ap.add_argument("--cores", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--flood-jobs", type=int, default=None)
+    ap.add_argument("--eq-jobs", type=int, default=None)
+    ap.add_argument("--compact", action="store_true", help="earthquake: compact-feature pipeline")
+    ap.add_argument("--neighbours", action="store_true", help="earthquake: nearest-event features")
+    ap.add_argument("--flood-variants", action="store_true", help="flood: also build the cheaper candidate models")
+    ap.add_argument("--shared-artifact", action="store_true", help="also write the mmap-able artifacts")
+    ap.add_argument("--out", default="train_timings.json")
+    args = ap.parse_args(argv)
+
+    names = args.only or ["flood", "earthquake"]
+    overrides = {"flood": args.flood_jobs, "earthquake": args.eq_jobs}
+    if args.sequential:
+        budget = {n: overrides.get(n) or args.cores for n in names}
+    else:
+        budget = split_cores(names, args.cores, overrides)
+
+    jobs = {}
+    for name in names:
+        kwargs = {"n_jobs": budget[name], "search": args.search, "cv": args.cv, "n_iter": args.n_iter,
+                  "shared_artifact": args.shared_artifact}
+        if name == "earthquake":
+            kwargs["compact"] = args.compact
+            kwargs["neighbours"] = args.neighbours
+        else:
+            kwargs["variants"] = args.flood_variants
+        jobs[name] = kwargs
+    print("CPU budget:", ", ".join(f"{n}={budget[n]}" for n in names), f"(of {args.cores} cores)")
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=1 if args.sequential else len(jobs)) as pool:
+        futures = {name: pool.submit(_train, name, kwargs) for name, kwargs in jobs.items()}
+        results = [futures[name].result() for name in names]
+    wall_s = time.perf_counter() - t0
+
+    print_table(results, wall_s)
+    report = {
+        "meta": {"timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                 "host": platform.node(), "cores": args.cores, "sequential": args.sequential,
+                 "search": args.search},
+        "wall_seconds": wall_s,
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
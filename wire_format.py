@@ -0,0 +1,246 @@
+# wire_format.py — binary columnar request/response bodies for the batch endpoints
+#
+# JSON batches cost a Python dict per row on the way in and a float object per value on the
+# way out. These helpers read and write the same data as one matrix instead:
+#
+#   application/x-npy                    a .npy file: 2-D float array with columns in
+#                                        feature_order, or a structured array with one field
+#                                        per feature (any order). Responses: 1-D float64.
+#   application/vnd.apache.arrow.stream  Arrow IPC stream with one column per feature
+#                                        (needs pyarrow). Responses: one prediction column.
+#
+# The request format comes from Content-Type, the response format from Accept (q-values
+# honoured, defaulting to the request format), so a client can send Arrow and ask for JSON
+# back, or send JSON and ask for Arrow. Rows a JSON batch couldn't score come back as NaN in a
+# binary response, with their count in the X-Batch-Errors header.
+#
+# The /stream endpoints read newline-delimited JSON (one record per line) incrementally with
+# LineSplitter / iter_lines / ndjson_records, so only one chunk of records is held at a time.
+import io, json
+
+import numpy as np
+
+JSON_MIME = "application/json"
+NDJSON_MIME = "application/x-ndjson"
+NPY_MIME = "application/x-npy"
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+
+FORMATS = {"json": JSON_MIME, "npy": NPY_MIME, "arrow": ARROW_MIME}
+_BY_MIME = {mime: name for name, mime in FORMATS.items()}
+_BY_MIME["application/vnd.apache.arrow.file"] = "arrow"   # reader handles both IPC flavours
+_BY_MIME["application/octet-stream"] = "npy"
+_WILDCARDS = ("*/*", "application/*", "")
+
+BATCH_ERRORS_HEADER = "X-Batch-Errors"
+
+
+class UnsupportedFormat(ValueError):
+    """Body or Accept type this server can't handle (maps to HTTP 415 / 406)."""
+
+
+def _mime(header):
+    return (header or "").split(";", 1)[0].strip().lower()
+
+
+def request_format(content_type):
+    """'json', 'npy' or 'arrow' for a Content-Type header; unknown types are treated as JSON."""
+    return _BY_MIME.get(_mime(content_type), "json")
+
+
+def _quality(part):
+    """q-value of one Accept media range (1 when absent or unparseable)."""
+    for param in part.split(";")[1:]:
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "q":
+            try:
+                return min(max(float(value), 0.0), 1.0)
+            except ValueError:
+                return 1.0
+    return 1.0
+
+
+def response_format(accept, default="json"):
+    """Pick a response format from an Accept header.
+
+    Media ranges are tried by descending q-value, ties in header order; q=0 rules a type out,
+    and a wildcard (*/*, application/*) picks the default unless that was ruled out.
+    """
+    if not accept:
+        return default
+    ranges, refused = [], set()
+    for i, part in enumerate(accept.split(",")):
+        mime, q = _mime(part), _quality(part)
+        if q == 0:
+            refused.add(mime)
+        else:
+            ranges.append((-q, i, mime))
+    for _, _, mime in sorted(ranges):
+        if mime in _WILDCARDS:
+            allowed = [f for f in [default] + list(FORMATS) if FORMATS[f] not in refused]
+            if allowed:
+                return allowed[0]
+        elif mime in _BY_MIME:
+            return _BY_MIME[mime]
+    raise UnsupportedFormat(f"none of {accept!r} is supported; use one of {sorted(FORMATS.values())}")
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc  # noqa: F401
+    except ImportError:
+        raise UnsupportedFormat("Arrow bodies need pyarrow installed on the server (pip install pyarrow)")
+    return pa
+
+
+# ---- requests ----
+def read_npy(body, feature_order):
+    """Decode a .npy body into a float64 (n_rows, len(feature_order)) matrix."""
+    try:
+        arr = np.load(io.BytesIO(body), allow_pickle=False)
+    except ValueError as e:
+        raise ValueError(f"invalid .npy body: {e}")
+    if arr.dtype.names:
+        missing = [f for f in feature_order if f not in arr.dtype.names]
+        if missing:
+            raise ValueError(f"Missing features: {missing}")
+        return np.column_stack([arr[f].astype(np.float64, copy=False) for f in feature_order])
+    if arr.ndim == 1 and arr.shape[0] == len(feature_order):
+        arr = arr.reshape(1, -1)
+    if arr.ndim != 2 or arr.shape[1] != len(feature_order):
+        raise ValueError(f"expected a 2-D array with {len(feature_order)} columns in feature_order, got shape {arr.shape}")
+    if arr.dtype.kind not in "biuf":
+        raise ValueError(f"expected a numeric array, got dtype {arr.dtype}")
+    return arr.astype(np.float64, copy=False)
+
+
+def read_arrow_table(body, feature_order):
+    """Decode an Arrow IPC stream (or file) body and select feature_order columns."""
+    pa = _pyarrow()
+    try:
+        try:
+            table = pa.ipc.open_stream(pa.BufferReader(body)).read_all()
+        except pa.ArrowInvalid:
+            table = pa.ipc.open_file(pa.BufferReader(body)).read_all()
+    except pa.ArrowInvalid as e:
+        raise ValueError(f"invalid Arrow body: {e}")
+    missing = [f for f in feature_order if f not in table.column_names]
+    if missing:
+        raise ValueError(f"Missing features: {missing}")
+    return table.select(feature_order)
+
+
+def arrow_to_matrix(table):
+    """float64 matrix from an all-numeric Arrow table (nulls become NaN), one column at a time."""
+    pa = _pyarrow()
+    cols = []
+    for name in table.column_names:
+        col = table.column(name)
+        try:
+            col = col.cast(pa.float64())
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            raise ValueError(f"column {name!r} is not numeric ({col.type})")
+        cols.append(col.to_numpy())
+    return np.column_stack(cols) if cols else np.empty((table.num_rows, 0))
+
+
+# ---- responses ----
+def write_npy(values):
+    buf = io.BytesIO()
+    np.save(buf, np.asarray(values, dtype=np.float64), allow_pickle=False)
+    return buf.getvalue()
+
+
+def write_arrow(values, name):
+    pa = _pyarrow()
+    table = pa.table({name: pa.array(np.asarray(values, dtype=np.float64))})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_predictions(values, fmt, name):
+    """(body bytes, Content-Type) for a 1-D prediction vector in a binary format."""
+    if fmt == "npy":
+        return write_npy(values), NPY_MIME
+    if fmt == "arrow":
+        return write_arrow(values, name), ARROW_MIME
+    raise UnsupportedFormat(f"not a binary format: {fmt}")
+
+
+# ---- NDJSON streams ----
+class LineSplitter:
+    """Split a byte stream fed in arbitrary pieces into lines, with a per-line size cap.
+
+    feed() returns the complete lines seen so far (without the newline); a line longer than
+    max_bytes is returned as None and the rest of it is discarded, so the buffer never grows
+    past max_bytes plus one read.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._buf = bytearray()
+        self._skipping = False
+
+    def feed(self, data):
+        buf = self._buf
+        buf += data
+        out, start = [], 0
+        while True:
+            nl = buf.find(b"\n", start)
+            if nl < 0:
+                break
+            if self._skipping:
+                self._skipping = False
+            elif nl - start > self.max_bytes:
+                out.append(None)
+            else:
+                out.append(bytes(buf[start:nl]))
+            start = nl + 1
+        del buf[:start]
+        if self._skipping:
+            buf.clear()
+        elif len(buf) > self.max_bytes:
+            out.append(None)
+            self._skipping = True
+            buf.clear()
+        return out
+
+    def close(self):
+        """Flush a final line that had no trailing newline."""
+        rest = b"" if self._skipping else bytes(self._buf)
+        self._buf.clear()
+        self._skipping = False
+        return [rest] if rest.strip() else []
+
+
+def iter_lines(stream, max_line_bytes, read_size=64 * 1024):
+    """Lines from a file-like byte stream (e.g. request.stream), read read_size bytes at a time."""
+    splitter = LineSplitter(max_line_bytes)
+    while True:
+        data = stream.read(read_size)
+        if not data:
+            break
+        yield from splitter.feed(data)
+    yield from splitter.close()
+
+
+def ndjson_records(lines, start=0):
+    """(index, record, error) for each non-blank line; error is None or a message.
+
+    index counts records from `start`, skipping blank lines, so it matches the position a
+    producer would assign. Lines that are too long (None) or not valid JSON become errors.
+    """
+    i = start
+    for line in lines:
+        if line is None:
+            yield i, None, "record exceeds the maximum line size"
+        elif not line.strip():
+            continue
+        else:
+            try:
+                yield i, json.loads(line), None
+            except ValueError as e:
+                yield i, None, f"invalid JSON: {e}"
+        i += 1